@@ -0,0 +1,358 @@
+# ==============================================================================
+# api.py - FastAPI Application
+#
+# The HTTP API. It lives apart from the Cloud Functions in main.py so that the
+# background functions do not import FastAPI or the generation stack; main.py
+# exposes `app` from here on first access.
+# ==============================================================================
+
+# --- 1. IMPORTS ---
+import hashlib
+import hmac
+import json
+import time
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response, status
+from pydantic import BaseModel
+from typing import List, AsyncGenerator, Optional
+from datetime import datetime
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+
+# Refactored services
+from services.firebase_service import firebase_service
+from services.vector_db_service import vector_db_service
+from services.ingestion_service import ingestion_service
+from services.retrieval_service import retrieval_service
+from services.ai_service import ai_service
+from services.generation_cache import generation_cache
+from services.export_service import export_service
+from services.generation_scheduler import generation_scheduler
+from services.feedback_buffer import feedback_buffer, FeedbackBufferFullError
+from services.context_builder import select_passages, build_context
+from services.text_processing import content_hash, estimate_tokens
+from services.telemetry import telemetry
+import config
+from services.executor import shutdown_executor
+from auth import get_current_user, get_auth_stats
+
+# --- 2. FASTAPI APPLICATION ---
+app = FastAPI()
+# The browser only lets the client read response headers listed in expose_headers.
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=config.CORS_ALLOWED_ORIGINS,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
+)
+
+@app.on_event("startup")
+async def on_startup():
+    await export_service.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await export_service.stop()
+    if feedback_buffer.initialized:
+        await feedback_buffer.stop()
+    shutdown_executor(wait=False)
+
+# Service statistics exported alongside the latency histograms at /metrics. Services that
+# have not been built yet report nothing rather than being built for a scrape.
+telemetry.add_collector("auth", get_auth_stats)
+telemetry.add_collector("generation_cache", generation_cache.get_stats)
+telemetry.add_collector("generation_scheduler", generation_scheduler.get_stats)
+telemetry.add_collector(
+    "embedding_cache",
+    lambda: ai_service.embedding_cache.get_stats() if ai_service.initialized and ai_service.embedding_cache else {}
+)
+telemetry.add_collector("export", lambda: export_service.get_stats() if export_service.initialized else {})
+telemetry.add_collector("feedback", lambda: feedback_buffer.get_stats() if feedback_buffer.initialized else {})
+
+class GenerationRequest(BaseModel):
+    job_description: str
+    # Optional restrictions on which of the user's documents are used as examples
+    document_types: Optional[List[str]] = None
+    uploaded_after: Optional[datetime] = None
+    # Set to False to force a fresh generation even if an identical one is cached
+    use_cache: bool = True
+
+class GenerationContent(BaseModel):
+    job_description: str
+    cover_letter: str
+    resume: str
+
+class FeedbackRequest(BaseModel):
+    feedback: str
+    # The `content_hashes` of the generation's final_result, and the texts they are hashes of
+    content_hashes: GenerationContent
+    texts: GenerationContent
+
+class DocumentResponse(BaseModel):
+    id: str
+    original_storage_path: str
+    created_at: str
+
+class ExportStatusResponse(BaseModel):
+    id: str
+    status: str
+    document_url: Optional[str] = None
+    error: Optional[str] = None
+
+async def stream_export_result(user_id: str, export_id: str) -> AsyncGenerator[str, None]:
+    """Waits briefly for a background export and reports its outcome as an SSE event."""
+    if config.EXPORT_STREAM_WAIT_SECONDS <= 0:
+        return
+    export_status = await export_service.wait_for(user_id, export_id, config.EXPORT_STREAM_WAIT_SECONDS)
+    if export_status is not None:
+        yield f"event: export_result\ndata: {json.dumps(export_status)}\n\n"
+
+async def generate_and_stream(
+    job_description: str,
+    user: dict,
+    metadata_filter: Optional[dict] = None,
+    use_cache: bool = True
+) -> AsyncGenerator[str, None]:
+    """Generator function for the streaming response."""
+    started = time.perf_counter()
+    try:
+        yield "event: message\ndata: Starting RAG workflow...\n\n"
+        user_id = user.get("uid")
+
+        # 1. Retrieve candidate passages from the user's own corpus (vector and lexical
+        # search, fused) and pack the best into the budget
+        with telemetry.span("generate.retrieval"):
+            candidates, corpus_version = await retrieval_service.retrieve_async(
+                job_description, user_id=user_id, k=config.RETRIEVAL_CANDIDATES, filter=metadata_filter
+            )
+        with telemetry.span("generate.context"):
+            retrieved_docs = select_passages(candidates, config.CONTEXT_TOKEN_BUDGET)
+            context_docs_text = build_context(retrieved_docs)
+            prompt_tokens = estimate_tokens(ai_service.build_prompt(job_description, context_docs_text))
+        telemetry.record_tokens("prompt", prompt_tokens)
+        print(f"Packed {len(retrieved_docs)} of {len(candidates)} passages; prompt is ~{prompt_tokens} tokens.")
+        yield (
+            f"event: message\ndata: Retrieved {len(retrieved_docs)} relevant passages "
+            f"(~{prompt_tokens} prompt tokens).\n\n"
+        )
+
+        # Chunk IDs are content-addressed, so the same IDs mean the same prompt.
+        cache_key = generation_cache.make_key(
+            user_id, job_description, [doc["id"] for doc in retrieved_docs],
+            config.PROMPT_VERSION, ai_service.generator_name
+        )
+        cached_result = generation_cache.get(cache_key, corpus_version) if use_cache else None
+        if cached_result is not None:
+            partial_data = {
+                "cover_letter_chunk": cached_result["cover_letter_text"],
+                "resume_chunk": cached_result["resume_text"]
+            }
+            yield f"event: partial_result\ndata: {json.dumps(partial_data)}\n\n"
+            yield "event: message\ndata: Content generation complete.\n\n"
+            export_status = await export_service.get_status(user_id, cached_result["export_id"])
+            final_data = {**cached_result, "document_url": export_status and export_status["document_url"]}
+            telemetry.observe("generate.time_to_final_result", time.perf_counter() - started)
+            yield f"event: final_result\ndata: {json.dumps(final_data)}\n\n"
+            if not final_data["document_url"]:
+                async for event in stream_export_result(user_id, cached_result["export_id"]):
+                    yield event
+            return
+
+        # 2. Generate content stream, admitted by the scheduler. An identical request
+        # already in flight is joined rather than sent to the model again.
+        async def produce():
+            content_generator = ai_service.generate_document_content_stream(
+                job_description=job_description,
+                context_docs_text=context_docs_text
+            )
+
+            cover_letter_parts = []
+            resume_parts = []
+            # Timed by hand: a span cannot stay open across the yields to the client.
+            model_started = time.perf_counter()
+            first_chunk = True
+            async for chunk in content_generator:
+                if first_chunk:
+                    telemetry.observe("generate.first_token", time.perf_counter() - model_started)
+                    first_chunk = False
+                yield "partial_result", chunk
+                if chunk.get("cover_letter_chunk"):
+                    cover_letter_parts.append(chunk["cover_letter_chunk"])
+                if chunk.get("resume_chunk"):
+                    resume_parts.append(chunk["resume_chunk"])
+            cover_letter_text = "".join(cover_letter_parts)
+            resume_text = "".join(resume_parts)
+            telemetry.observe("generate.model", time.perf_counter() - model_started)
+            telemetry.record_tokens("response", estimate_tokens(cover_letter_text) + estimate_tokens(resume_text))
+
+            yield "message", "Content generation complete."
+
+            # 3. Queue the Google Doc export; the text is returned without waiting for it
+            doc_title = f"Application for {job_description[:50]}"
+            with telemetry.span("generate.export_submit"):
+                export_id = await export_service.submit(
+                    user_id,
+                    title=doc_title,
+                    cover_letter=cover_letter_text,
+                    resume_summary=resume_text
+                )
+
+            # 4. Send final result. The document URL follows in an export_result event,
+            # or from GET /documents/exports/{export_id}. Feedback refers to the texts by
+            # their content hashes, so they are only stored if feedback is given.
+            final_data = {
+                "cover_letter_text": cover_letter_text,
+                "resume_text": resume_text,
+                "document_url": None,
+                "export_id": export_id,
+                "content_hashes": {
+                    "job_description": content_hash(job_description),
+                    "cover_letter": content_hash(cover_letter_text),
+                    "resume": content_hash(resume_text)
+                }
+            }
+            generation_cache.put(cache_key, corpus_version, final_data)
+            yield "final_result", final_data
+
+        export_id = None
+        async for event, data in generation_scheduler.submit(cache_key, user_id, produce):
+            if event == "queue":
+                yield f"event: queue\ndata: {json.dumps(data)}\n\n"
+            elif event == "message":
+                yield f"event: message\ndata: {data}\n\n"
+            else:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if event == "final_result":
+                export_id = data["export_id"]
+                telemetry.observe("generate.time_to_final_result", time.perf_counter() - started)
+
+        if export_id:
+            async for event in stream_export_result(user_id, export_id):
+                yield event
+
+    except Exception as e:
+        telemetry.count("generation_errors")
+        yield f"event: error\ndata: {str(e)}\n\n"
+
+@app.post("/generate-stream")
+async def generate_application_documents_stream(
+    request: GenerationRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    API endpoint to generate application documents and stream the response.
+    """
+    metadata_filter = vector_db_service.build_filter(
+        document_types=request.document_types,
+        uploaded_after=request.uploaded_after.timestamp() if request.uploaded_after else None,
+    )
+    return StreamingResponse(
+        generate_and_stream(request.job_description, user, metadata_filter, request.use_cache),
+        media_type="text/event-stream"
+    )
+
+@app.post("/feedback")
+async def receive_feedback(
+    request: FeedbackRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    API endpoint to receive and store user feedback. The feedback is written to
+    Firestore in the background, shortly after the response.
+    """
+    try:
+        await feedback_buffer.submit(
+            feedback=request.feedback,
+            content_hashes=request.content_hashes.model_dump(),
+            texts=request.texts.model_dump()
+        )
+        return {"message": "Feedback received successfully"}
+    except FeedbackBufferFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        print(f"Error in /feedback endpoint: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@app.get("/documents", response_model=List[DocumentResponse])
+async def get_user_documents(
+    response: Response,
+    limit: int = Query(config.DOCUMENTS_PAGE_SIZE, ge=1, le=config.DOCUMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user)
+):
+    """
+    API endpoint to retrieve a page of the user's uploaded documents, newest first.
+    When more documents follow, the `X-Next-Cursor` header holds the `cursor` for the
+    next page. Pages carry an ETag; an unchanged page is answered with 304.
+    """
+    try:
+        user_id = user.get("uid")
+        # Every change to the user's documents bumps the corpus version, so a page
+        # is unchanged as long as the version, cursor and page size are.
+        corpus_version = await firebase_service.get_corpus_version_async(user_id)
+        etag_source = f"{user_id}:{corpus_version}:{cursor or ''}:{limit}"
+        etag = f'W/"{hashlib.sha256(etag_source.encode()).hexdigest()[:32]}"'
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        documents, next_cursor = await firebase_service.get_user_documents_async(user_id, limit, cursor)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return documents
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        print(f"Error in /documents endpoint: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@app.get("/documents/exports/{export_id}", response_model=ExportStatusResponse)
+async def get_export_status(export_id: str, user: dict = Depends(get_current_user)):
+    """
+    API endpoint to check on a Google Doc export started by /generate-stream.
+    """
+    export_status = await export_service.get_status(user.get("uid"), export_id)
+    if export_status is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found")
+    return export_status
+
+@app.delete("/documents/{document_id}")
+async def delete_user_document(document_id: str, user: dict = Depends(get_current_user)):
+    """
+    API endpoint to delete a user's document.
+    """
+    try:
+        user_id = user.get("uid")
+        await ingestion_service.delete_document_async(user_id, document_id)
+        return {"message": "Document deleted successfully"}
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        print(f"Error in /documents/{document_id} endpoint: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+@app.get("/metrics")
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Serves stage latency histograms, token counts and service statistics in the
+    Prometheus text format. Requires the METRICS_TOKEN bearer token; without one
+    configured, the endpoint does not exist.
+    """
+    if not config.METRICS_TOKEN or not telemetry.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not hmac.compare_digest(authorization or "", f"Bearer {config.METRICS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(telemetry.render(), media_type="text/plain; version=0.0.4")
@@ -1,60 +1,181 @@
+import asyncio
+import hashlib
+import os
+import re
 import time
+from collections import OrderedDict
 import requests
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import jwk, jwt, JWTError
+from services.executor import run_blocking
+from services.telemetry import telemetry
 
 # This is a placeholder. In a real app, you'd get this from your Firebase project settings.
 FIREBASE_PROJECT_ID = "resume-optimiser-467418"
 ALGORITHMS = ["RS256"]
 AUTH_URL = f"https://securetoken.google.com/{FIREBASE_PROJECT_ID}"
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+# Maximum number of verified tokens kept in memory
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_MAX_SIZE", "1024"))
+# Start refreshing Google's certs this many seconds before they expire
+KEYS_REFRESH_MARGIN_SECONDS = 300
+# Minimum gap between refreshes forced by an unknown key ID
+KEYS_MIN_FORCED_REFRESH_INTERVAL_SECONDS = 60
 
 # This scheme will look for a token in the Authorization header, e.g., "Bearer <token>"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Cache for Google's public keys to avoid fetching them on every request
-_public_keys_cache = {}
+# Counters for token cache effectiveness and key refresh latency
+auth_stats = {
+    "token_cache_hits": 0,
+    "token_cache_misses": 0,
+    "key_refreshes": 0,
+    "key_refresh_failures": 0,
+    "key_refresh_seconds_total": 0.0,
+    "last_key_refresh_seconds": 0.0,
+}
+
+def get_auth_stats() -> dict:
+    """Returns a snapshot of the auth counters, including the token cache hit rate."""
+    lookups = auth_stats["token_cache_hits"] + auth_stats["token_cache_misses"]
+    return {
+        **auth_stats,
+        "token_cache_size": len(_token_cache),
+        "token_cache_hit_rate": auth_stats["token_cache_hits"] / lookups if lookups else 0.0,
+    }
 
-def get_public_keys():
+
+class _PublicKeyCache:
     """
-    Fetches Google's public keys for verifying Firebase ID tokens.
-    Caches the keys to improve performance.
+    Holds Google's public keys as pre-parsed key objects.
+    Refreshes are single-flight: concurrent callers share one fetch, and while a
+    background refresh is running the previous keys keep being served.
     """
-    global _public_keys_cache
-    if not _public_keys_cache or _public_keys_cache.get("expires", 0) < time.time():
+
+    def __init__(self):
+        self.keys = {}
+        self.expires = 0.0
+        self.last_refresh = 0.0
+        self._refresh_task = None
+
+    async def get_keys(self) -> dict:
+        if not self.keys:
+            # Nothing to serve yet, so this caller has to wait for the fetch.
+            await self._wait_for_refresh()
+        elif time.time() >= self.expires - KEYS_REFRESH_MARGIN_SECONDS:
+            self._start_refresh()
+        return self.keys
+
+    async def get_key(self, kid: str):
+        keys = await self.get_keys()
+        if kid not in keys and time.time() - self.last_refresh >= KEYS_MIN_FORCED_REFRESH_INTERVAL_SECONDS:
+            # Google may have rotated its keys before our cached copy expired.
+            await self._wait_for_refresh()
+        return self.keys.get(kid)
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._fetch_keys())
+            self._refresh_task.add_done_callback(self._on_refresh_done)
+        return self._refresh_task
+
+    async def _wait_for_refresh(self):
         try:
-            response = requests.get(f"https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com")
-            response.raise_for_status()
-            keys = response.json()
-            # The 'expires' time is in the Cache-Control header, e.g., "max-age=21088"
-            max_age = int(response.headers['Cache-Control'].split('=')[1])
-            keys['expires'] = time.time() + max_age
-            _public_keys_cache = keys
-        except requests.RequestException as e:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Could not fetch Google's public keys: {e}",
-            )
-    return _public_keys_cache
+            await asyncio.shield(self._start_refresh())
+        except Exception as e:
+            if not self.keys:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=f"Could not fetch Google's public keys: {e}",
+                )
+
+    def _on_refresh_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            auth_stats["key_refresh_failures"] += 1
+            print(f"Failed to refresh Google's public keys, serving cached keys: {error}")
+
+    async def _fetch_keys(self):
+        started = time.perf_counter()
+        response = await run_blocking(requests.get, GOOGLE_CERTS_URL, timeout=10)
+        response.raise_for_status()
+        certs = response.json()
+
+        # The 'expires' time is in the Cache-Control header, e.g., "public, max-age=21088, must-revalidate"
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else 3600
+
+        # Parse each certificate once so token verification never re-decodes PEM.
+        self.keys = {kid: jwk.construct(cert, ALGORITHMS[0]) for kid, cert in certs.items()}
+        self.expires = time.time() + max_age
+        self.last_refresh = time.time()
+
+        elapsed = time.perf_counter() - started
+        auth_stats["key_refreshes"] += 1
+        auth_stats["key_refresh_seconds_total"] += elapsed
+        auth_stats["last_key_refresh_seconds"] = elapsed
+
+
+_public_key_cache = _PublicKeyCache()
+
+# Verified token payloads keyed by the SHA-256 of the token, in LRU order
+_token_cache = OrderedDict()
+
+def _get_cached_payload(token_hash: bytes):
+    entry = _token_cache.get(token_hash)
+    if entry is None:
+        return None
+    payload, expires_at = entry
+    if expires_at <= time.time():
+        del _token_cache[token_hash]
+        return None
+    _token_cache.move_to_end(token_hash)
+    return payload
+
+def _cache_payload(token_hash: bytes, payload: dict):
+    _token_cache[token_hash] = (payload, float(payload.get("exp", 0)))
+    _token_cache.move_to_end(token_hash)
+    while len(_token_cache) > TOKEN_CACHE_MAX_SIZE:
+        _token_cache.popitem(last=False)
+
+async def get_public_keys() -> dict:
+    """
+    Returns Google's public keys for verifying Firebase ID tokens, keyed by key ID.
+    Cached keys are served while a refresh runs in the background.
+    """
+    return await _public_key_cache.get_keys()
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Dependency to verify the Firebase ID token and return the user's data.
+    Verified tokens are cached until they expire.
     """
+    with telemetry.span("auth.verify_token"):
+        return await _verify_token(token)
+
+async def _verify_token(token: str) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    token_hash = hashlib.sha256(token.encode()).digest()
+    payload = _get_cached_payload(token_hash)
+    if payload is not None:
+        auth_stats["token_cache_hits"] += 1
+        return payload
+    auth_stats["token_cache_misses"] += 1
+
     try:
         unverified_header = jwt.get_unverified_header(token)
-        public_keys = get_public_keys()
-
-        if unverified_header["kid"] not in public_keys:
+        key = await _public_key_cache.get_key(unverified_header["kid"])
+        if key is None:
             raise credentials_exception
 
-        key = public_keys[unverified_header["kid"]]
-
         payload = jwt.decode(
             token,
             key,
@@ -62,7 +183,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             audience=FIREBASE_PROJECT_ID,
             issuer=AUTH_URL,
         )
+        _cache_payload(token_hash, payload)
         return payload
+    except HTTPException:
+        raise
     except JWTError:
         raise credentials_exception
     except Exception as e:
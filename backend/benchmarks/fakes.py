@@ -0,0 +1,615 @@
+"""
+In-process stand-ins for the cloud services the backend talks to: Firestore and Cloud
+Storage (firebase_admin), Cloud Functions decorators, Genkit/Gemini, Pinecone, Secret
+Manager and the Google API clients. `install` registers them in `sys.modules` before
+any service module is imported, so the real singletons are built against the fakes
+and every code path between the HTTP layer and the SDK calls is exercised unchanged.
+
+The fakes are deterministic: embeddings are derived from a hash of the text, and the
+fake model streams a fixed-shape JSON answer with configurable latency.
+"""
+import asyncio
+import copy
+import hashlib
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+@dataclass
+class Latencies:
+    """Simulated service latencies, in seconds."""
+    firestore: float = 0.002
+    storage: float = 0.01
+    embed: float = 0.05
+    vector_query: float = 0.01
+    model_first_token: float = 0.4
+    model_chunk_interval: float = 0.02
+    model_chunks: int = 60
+    google_api: float = 0.05
+
+
+EMBEDDING_DIMENSION = 768
+
+
+def fake_embedding(text: str, dimension: int = EMBEDDING_DIMENSION) -> list[float]:
+    """A unit vector seeded by the text's hash, so equal texts embed equally."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+# --- Firestore ---
+
+class _Sentinel:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+SERVER_TIMESTAMP = _Sentinel("SERVER_TIMESTAMP")
+DELETE_FIELD = _Sentinel("DELETE_FIELD")
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class ArrayUnion:
+    def __init__(self, values):
+        self.values = values
+
+
+def _apply(existing: dict, fields: dict, field_paths: bool = False) -> dict:
+    # Like Firestore, update() reads dotted keys as paths into nested maps; set() does not.
+    data = dict(existing)
+    for key, value in fields.items():
+        if field_paths and "." in key:
+            head, rest = key.split(".", 1)
+            data[head] = _apply(data.get(head) or {}, {rest: value}, field_paths=True)
+        elif value is DELETE_FIELD:
+            data.pop(key, None)
+        elif value is SERVER_TIMESTAMP:
+            data[key] = datetime.now(timezone.utc)
+        elif isinstance(value, Increment):
+            data[key] = data.get(key, 0) + value.value
+        elif isinstance(value, ArrayUnion):
+            data[key] = list(data.get(key, [])) + [v for v in value.values if v not in data.get(key, [])]
+        else:
+            data[key] = copy.deepcopy(value)
+    return data
+
+
+class FakeFirestore:
+    """A thread-safe in-memory document tree addressed by slash-separated paths."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.documents = {}
+        self.lock = threading.RLock()
+        self.operations = 0
+
+    def _tick(self):
+        self.operations += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def collection(self, name: str):
+        return CollectionReference(self, name)
+
+    def collection_group(self, name: str):
+        return Query(self, None, group=name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for reference in references:
+            yield reference.get(field_paths=field_paths)
+
+    def transaction(self):
+        return WriteBatch(self)
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        return (self._data or {}).get(field)
+
+
+class DocumentReference:
+    def __init__(self, db: FakeFirestore, path: str):
+        self.db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return CollectionReference(self.db, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name: str):
+        return CollectionReference(self.db, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        self.db._tick()
+        with self.db.lock:
+            data = self.db.documents.get(self.path)
+            if data is not None and field_paths is not None:
+                data = {key: data[key] for key in field_paths if key in data}
+            return DocumentSnapshot(self, copy.deepcopy(data))
+
+    def set(self, data: dict, merge: bool = False):
+        self.db._tick()
+        self._set(data, merge)
+
+    def update(self, fields: dict):
+        self.db._tick()
+        self._update(fields)
+
+    def delete(self):
+        self.db._tick()
+        with self.db.lock:
+            self.db.documents.pop(self.path, None)
+
+    def _set(self, data: dict, merge: bool = False):
+        with self.db.lock:
+            existing = self.db.documents.get(self.path, {}) if merge else {}
+            self.db.documents[self.path] = _apply(existing, data)
+
+    def _update(self, fields: dict):
+        with self.db.lock:
+            if self.path not in self.db.documents:
+                raise KeyError(f"No document to update: {self.path}")
+            self.db.documents[self.path] = _apply(self.db.documents[self.path], fields, field_paths=True)
+
+
+class Query:
+    DESCENDING = "DESCENDING"
+    ASCENDING = "ASCENDING"
+
+    def __init__(self, db: FakeFirestore, path: str, group: str = None):
+        self.db = db
+        self.path = path
+        self.group = group
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._fields = None
+        self._start_after = None
+
+    def _copy(self, **changes):
+        query = copy.copy(self)
+        query._filters = list(self._filters)
+        query._order = list(self._order)
+        for key, value in changes.items():
+            setattr(query, key, value)
+        return query
+
+    def where(self, field: str, op: str, value):
+        query = self._copy()
+        query._filters.append((field, op, value))
+        return query
+
+    def order_by(self, field: str, direction: str = "ASCENDING"):
+        query = self._copy()
+        query._order.append((field, direction))
+        return query
+
+    def limit(self, count: int):
+        return self._copy(_limit=count)
+
+    def select(self, fields):
+        return self._copy(_fields=list(fields))
+
+    def start_after(self, snapshot):
+        return self._copy(_start_after=snapshot)
+
+    def _matches(self, path: str) -> bool:
+        parts = path.split("/")
+        if self.group is not None:
+            return len(parts) >= 2 and parts[-2] == self.group
+        return path.rsplit("/", 1)[0] == self.path
+
+    def stream(self):
+        self.db._tick()
+        ops = {"==": lambda a, b: a == b, "<": lambda a, b: a is not None and a < b,
+               ">": lambda a, b: a is not None and a > b, "in": lambda a, b: a in b}
+        with self.db.lock:
+            rows = [(path, copy.deepcopy(data)) for path, data in self.db.documents.items() if self._matches(path)]
+        rows = [(path, data) for path, data in rows
+                if all(ops[op](data.get(field), value) for field, op, value in self._filters)]
+        # Firestore drops documents that lack an ordered-by field.
+        rows = [(path, data) for path, data in rows
+                if all(field == "__name__" or field in data for field, _ in self._order)]
+        for field, direction in reversed(self._order or [("__name__", "ASCENDING")]):
+            rows.sort(key=lambda row: row[0] if field == "__name__" else row[1][field],
+                      reverse=direction == self.DESCENDING)
+        if self._start_after is not None:
+            paths = [path for path, _ in rows]
+            start = self._start_after.reference.path
+            rows = rows[paths.index(start) + 1:] if start in paths else rows
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        for path, data in rows:
+            if self._fields is not None:
+                data = {key: data[key] for key in self._fields if key in data}
+            yield DocumentSnapshot(DocumentReference(self.db, path), data)
+
+
+class CollectionReference(Query):
+    def __init__(self, db: FakeFirestore, path: str):
+        super().__init__(db, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return DocumentReference(self.db, self.path.rsplit("/", 1)[0]) if "/" in self.path else None
+
+    def document(self, document_id: str = None):
+        return DocumentReference(self.db, f"{self.path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data: dict):
+        reference = self.document()
+        reference.set(data)
+        return None, reference
+
+
+class WriteBatch:
+    """Buffers writes and applies them together on commit (also used as a transaction)."""
+
+    def __init__(self, db: FakeFirestore):
+        self.db = db
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(lambda: reference._set(data, merge))
+
+    def update(self, reference, fields):
+        self._writes.append(lambda: reference._update(fields))
+
+    def delete(self, reference):
+        self._writes.append(lambda: self.db.documents.pop(reference.path, None))
+
+    def commit(self):
+        self.db._tick()
+        with self.db.lock:
+            for write in self._writes:
+                write()
+        self._writes = []
+
+
+def transactional(func):
+    def wrapper(transaction, *args, **kwargs):
+        with transaction.db.lock:
+            result = func(transaction, *args, **kwargs)
+            transaction.commit()
+            return result
+    return wrapper
+
+
+# --- Cloud Storage ---
+
+class FakeBlob:
+    def __init__(self, bucket, name: str):
+        self.bucket = bucket
+        self.name = name
+        self.size = None
+
+    def _data(self) -> bytes:
+        time.sleep(self.bucket.latency)
+        if self.name not in self.bucket.objects:
+            from google.api_core.exceptions import NotFound
+            raise NotFound(self.name)
+        return self.bucket.objects[self.name]
+
+    def upload_from_string(self, data, content_type=None):
+        time.sleep(self.bucket.latency)
+        self.bucket.objects[self.name] = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+
+    def download_as_bytes(self) -> bytes:
+        return self._data()
+
+    def download_to_file(self, f):
+        f.write(self._data())
+
+    def reload(self):
+        self.size = len(self._data())
+
+    def delete(self):
+        self._data()
+        del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    def __init__(self, name: str, latency: float):
+        self.name = name
+        self.latency = latency
+        self.objects = {}
+
+    def blob(self, name: str):
+        return FakeBlob(self, name)
+
+
+# --- Genkit ---
+
+class _Model:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Chunk:
+    def __init__(self, text):
+        self._text = text
+
+    def text(self):
+        return self._text
+
+
+class FakeGenkit:
+    """Stands in for the `genkit` module: deterministic embeddings and a streaming fake model."""
+
+    def __init__(self, latencies: Latencies):
+        self.latencies = latencies
+        self.embed_calls = 0
+        self.generate_calls = 0
+
+    def init(self, **kwargs):
+        pass
+
+    # Same keyword-only parameters as the real client's embed and embed_many
+    def embed(self, *, embedder=None, content=None, metadata=None, options=None):
+        return self.embed_many(embedder=embedder, content=[content], metadata=metadata, options=options)[0]
+
+    def embed_many(self, *, embedder=None, content=None, metadata=None, options=None):
+        self.embed_calls += 1
+        time.sleep(self.latencies.embed)
+        return [fake_embedding(text) for text in content]
+
+    @staticmethod
+    def answer_pieces(prompt: str, chunks: int) -> list[str]:
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        cover_letter = " ".join(f"Cover letter sentence {i} ({seed})." for i in range(chunks))
+        resume = " ".join(f"Resume line {i}." for i in range(chunks // 2))
+        text = json.dumps({"cover_letter_text": cover_letter, "resume_text": resume})
+        size = max(1, len(text) // chunks)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def generate(self, model=None, prompt="", stream=False, config=None):
+        self.generate_calls += 1
+        pieces = self.answer_pieces(prompt, self.latencies.model_chunks)
+        if not stream:
+            time.sleep(self.latencies.model_first_token + self.latencies.model_chunk_interval * len(pieces))
+            return _Chunk("".join(pieces))
+
+        async def start():
+            async def chunks():
+                await asyncio.sleep(self.latencies.model_first_token)
+                for i, piece in enumerate(pieces):
+                    if i:
+                        await asyncio.sleep(self.latencies.model_chunk_interval)
+                    yield _Chunk(piece)
+            return chunks()
+        return start()
+
+
+# --- Pinecone ---
+
+class FakePineconeIndex:
+    """A Pinecone index client backed by the local NumPy vector store."""
+
+    def __init__(self, directory: str, latency: float):
+        from services.local_vector_store import LocalVectorStore
+        self.store = LocalVectorStore(directory)
+        self.latency = latency
+
+    def upsert(self, vectors, namespace=""):
+        time.sleep(self.latency)
+        self.store.upsert(vectors, namespace)
+
+    def delete(self, ids, namespace=""):
+        time.sleep(self.latency)
+        self.store.delete(ids, namespace)
+
+    def fetch(self, ids, namespace=""):
+        time.sleep(self.latency)
+        return {"vectors": {vector["id"]: vector for vector in self.store.fetch(ids, namespace)}}
+
+    def query(self, vector, top_k, namespace="", filter=None, include_metadata=True, include_values=False):
+        time.sleep(self.latency)
+        return {"matches": self.store.query(vector, top_k, namespace, filter, include_values)}
+
+
+# --- Google API clients ---
+
+class _Request:
+    def __init__(self, result, latency):
+        self._result = result
+        self._latency = latency
+
+    def execute(self, num_retries=0):
+        time.sleep(self._latency)
+        return self._result() if callable(self._result) else self._result
+
+
+class _DocsDocuments:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def create(self, body):
+        return _Request(lambda: {"documentId": uuid.uuid4().hex, "title": body.get("title")}, self.latency)
+
+    def batchUpdate(self, documentId, body):
+        return _Request({"documentId": documentId, "replies": [{} for _ in body["requests"]]}, self.latency)
+
+
+class _DocsService:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def documents(self):
+        return _DocsDocuments(self.latency)
+
+
+class FakeCredentials:
+    def __init__(self, token="fake-token"):
+        self.token = token
+        self.expiry = None
+
+    @classmethod
+    def from_authorized_user_info(cls, info, scopes=None):
+        return cls()
+
+    def refresh(self, request):
+        self.token = "fake-token"
+
+
+# --- Installation ---
+
+def _module(name: str, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+def _ensure_package(name: str):
+    """Uses the real package if it is installed, otherwise registers an empty one."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        package = _module(name)
+        package.__path__ = []
+        sys.modules[name] = package
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(_ensure_package(parent), child, package)
+        return package
+
+def _register(name: str, module):
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(_ensure_package(parent), child, module)
+
+
+class FakeEnvironment:
+    """Handles to the installed fakes, for seeding data and reading call counts."""
+
+    def __init__(self, latencies: Latencies, workdir: str):
+        self.latencies = latencies
+        self.workdir = workdir
+        self.firestore = FakeFirestore(latencies.firestore)
+        self.buckets = {}
+        self.genkit = FakeGenkit(latencies)
+        self.pinecone_indexes = {}
+
+    def bucket(self, name: str = None):
+        name = name or "default-bucket"
+        if name not in self.buckets:
+            self.buckets[name] = FakeBucket(name, self.latencies.storage)
+        return self.buckets[name]
+
+    def pinecone_index(self, name: str):
+        if name not in self.pinecone_indexes:
+            directory = os.path.join(self.workdir, "pinecone", name)
+            self.pinecone_indexes[name] = FakePineconeIndex(directory, self.latencies.vector_query)
+        return self.pinecone_indexes[name]
+
+
+def install(latencies: Latencies = None, workdir: str = None) -> FakeEnvironment:
+    """
+    Registers the fakes in `sys.modules` and points the backend's configuration at
+    local, per-run storage. Must be called before `main` or any service is imported.
+    """
+    latencies = latencies or Latencies()
+    workdir = workdir or tempfile.mkdtemp(prefix="backend-bench-")
+    env = FakeEnvironment(latencies, workdir)
+
+    for key, value in {
+        "GCLOUD_PROJECT": "benchmark-project",
+        "PINECONE_API_KEY": "benchmark-key",
+        "EMBEDDING_CACHE_BACKEND": "memory",
+        "EXPORT_STORE_BACKEND": "memory",
+        "TEXT_STORE_BACKEND": "local",
+        "LOCAL_TEXT_STORE_DIR": os.path.join(workdir, "text_store"),
+        "LOCAL_VECTOR_STORE_DIR": os.path.join(workdir, "vector_store"),
+    }.items():
+        os.environ.setdefault(key, value)
+
+    firestore = _module(
+        "firebase_admin.firestore",
+        client=lambda app=None: env.firestore,
+        SERVER_TIMESTAMP=SERVER_TIMESTAMP, DELETE_FIELD=DELETE_FIELD,
+        Increment=Increment, ArrayUnion=ArrayUnion, Query=Query, transactional=transactional,
+    )
+    storage = _module("firebase_admin.storage", bucket=lambda name=None, app=None: env.bucket(name))
+    _register("firebase_admin", _module("firebase_admin", initialize_app=lambda *a, **k: None,
+                                        firestore=firestore, storage=storage, __path__=[]))
+    _register("firebase_admin.firestore", firestore)
+    _register("firebase_admin.storage", storage)
+
+    identity = lambda *args, **kwargs: (lambda func: func)
+    _register("firebase_functions", _module("firebase_functions", __path__=[]))
+    _register("firebase_functions.storage_fn", _module("firebase_functions.storage_fn",
+                                                       on_object_finalized=identity, CloudEvent=object))
+    _register("firebase_functions.scheduler_fn", _module("firebase_functions.scheduler_fn",
+                                                         on_schedule=identity, ScheduledEvent=object))
+
+    genkit = _module("genkit", init=env.genkit.init, embed=env.genkit.embed, embed_many=env.genkit.embed_many,
+                     generate=env.genkit.generate, __path__=[])
+    gemini = _module("genkit.models.gemini", text_embedding_004=_Model("text-embedding-004"),
+                     gemini_1_5_pro=_Model("gemini-1.5-pro"))
+    _register("genkit", genkit)
+    _register("genkit.models", _module("genkit.models", gemini=gemini, __path__=[]))
+    _register("genkit.models.gemini", gemini)
+
+    _register("pinecone", _module("pinecone", init=lambda **kwargs: None, Index=env.pinecone_index))
+
+    secret = json.dumps({"token": "fake", "refresh_token": "fake", "client_id": "fake", "client_secret": "fake"})
+    payload = types.SimpleNamespace(payload=types.SimpleNamespace(data=secret.encode("utf-8")))
+    _register("google.cloud.secretmanager", _module(
+        "google.cloud.secretmanager",
+        SecretManagerServiceClient=lambda: types.SimpleNamespace(access_secret_version=lambda request: payload),
+    ))
+
+    class HttpError(Exception):
+        def __init__(self, resp, content=b"", uri=None):
+            super().__init__(content)
+            self.resp = resp
+
+    class NotFound(Exception):
+        pass
+
+    api_services = {"docs": _DocsService}
+    _register("googleapiclient", _module("googleapiclient", __path__=[]))
+    _register("googleapiclient.errors", _module("googleapiclient.errors", HttpError=HttpError))
+    _register("googleapiclient.discovery", _module(
+        "googleapiclient.discovery",
+        build=lambda api, version, **kwargs: api_services[api](latencies.google_api),
+    ))
+    _register("google.api_core.exceptions", _module("google.api_core.exceptions", NotFound=NotFound))
+    _register("google.oauth2.credentials", _module("google.oauth2.credentials", Credentials=FakeCredentials))
+    _register("google.auth.exceptions", _module("google.auth.exceptions", RefreshError=type("RefreshError", (Exception,), {})))
+    _register("google.auth.transport.requests", _module("google.auth.transport.requests", Request=lambda *a, **k: None))
+    _register("google_auth_httplib2", _module("google_auth_httplib2", AuthorizedHttp=lambda credentials, http=None: http))
+    _register("httplib2", _module("httplib2", Http=lambda timeout=None: None))
+    return env
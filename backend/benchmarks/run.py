@@ -0,0 +1,358 @@
+"""
+Offline benchmarks for the RAG generation path. Every cloud dependency is replaced by
+the in-process fakes in `benchmarks.fakes`, so runs are reproducible and free.
+
+    python -m benchmarks.run http [--clients 20] [--requests 200]   # end-to-end /generate-stream load
+    python -m benchmarks.run micro                                  # extraction, chunking, retrieval
+    python -m benchmarks.run all --json results.json
+
+Run from the backend directory. Needs the API's own dependencies (fastapi, uvicorn,
+python-jose, numpy, ...) plus httpx; pypdf and python-docx enable the extraction
+benchmarks. Latencies of the fake services are set with the --*-latency flags.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import threading
+import time
+
+from . import fakes
+
+# Words used to build synthetic documents and job descriptions
+_VOCABULARY = (
+    "support worker NDIS disability care plan community participation client goals Working with Children Check "
+    "Cert IV mental health case management rostering documentation incident reporting behaviour support "
+    "team leader aged care medication first aid manual handling allied health advocacy outreach youth "
+    "family violence housing intake assessment referral stakeholder compliance quality audit"
+).split()
+
+
+def synthetic_text(seed: int, paragraphs: int = 40, words_per_paragraph: int = 80) -> str:
+    rng = random.Random(seed)
+    return "\n\n".join(
+        " ".join(rng.choice(_VOCABULARY) for _ in range(words_per_paragraph)).capitalize() + "."
+        for _ in range(paragraphs)
+    )
+
+
+def synthetic_pdf(pages: int, lines_per_page: int = 40) -> bytes:
+    """Builds a minimal text PDF without any PDF-writing dependency."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    font_id = 3 + 2 * pages
+    rng = random.Random(pages)
+    for i in range(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>")
+        lines = [" ".join(rng.choice(_VOCABULARY) for _ in range(10)) for _ in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 14 TL 50 760 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n" + "".join(f"{o:010d} 00000 n \n" for o in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values) * 1000 if values else float("nan"),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def print_table(title: str, rows: dict):
+    print(f"\n{title}")
+    print(f"  {'':40} {'count':>7} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, row in rows.items():
+        print(f"  {name:40} {row['count']:>7} {row['mean_ms']:>10.2f} {row['p50_ms']:>10.2f} "
+              f"{row['p95_ms']:>10.2f} {row['p99_ms']:>10.2f}")
+
+
+# --- End-to-end /generate-stream load ---
+
+def seed_corpus(users: int, documents_per_user: int):
+    from services.ingestion_service import ingestion_service
+
+    for user in range(users):
+        for document in range(documents_per_user):
+            ingestion_service.ingest_document(
+                f"bench-user-{user}", f"doc-{user}-{document}", synthetic_text(user * 1000 + document)
+            )
+
+
+def start_server(app) -> tuple:
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+async def run_client_requests(base_url: str, requests: int, clients: int, users: int, repeat_ratio: float) -> dict:
+    import httpx
+
+    timings = {"first_event": [], "final_result": [], "total": []}
+    outcomes = {"ok": 0, "error": 0, "queued": 0}
+    rng = random.Random(0)
+    semaphore = asyncio.Semaphore(clients)
+
+    async def one_request(client, index: int):
+        user = f"bench-user-{index % users}"
+        # A share of requests repeat an earlier job description to exercise the generation cache.
+        variant = rng.randrange(max(1, index)) if index and rng.random() < repeat_ratio else index
+        job_description = f"{synthetic_text(variant, paragraphs=2, words_per_paragraph=60)} (posting {variant})"
+        async with semaphore:
+            started = time.perf_counter()
+            first_event = final_result = None
+            failed = queued = False
+            async with client.stream("POST", f"{base_url}/generate-stream", json={"job_description": job_description},
+                                     headers={"X-Bench-User": user}) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith("event: "):
+                        continue
+                    now = time.perf_counter() - started
+                    first_event = first_event if first_event is not None else now
+                    event = line[len("event: "):]
+                    if event == "final_result":
+                        final_result = now
+                    elif event == "error":
+                        failed = True
+                    elif event == "queue":
+                        queued = True
+            total = time.perf_counter() - started
+        if failed or final_result is None:
+            outcomes["error"] += 1
+            return
+        outcomes["ok"] += 1
+        outcomes["queued"] += queued
+        timings["first_event"].append(first_event)
+        timings["final_result"].append(final_result)
+        timings["total"].append(total)
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request(client, i) for i in range(requests)))
+        wall = time.perf_counter() - started
+
+    return {
+        "latency": {name: summarize(values) for name, values in timings.items()},
+        "outcomes": outcomes,
+        "wall_seconds": wall,
+        "requests_per_second": outcomes["ok"] / wall if wall else 0.0,
+    }
+
+
+def benchmark_http(args, env) -> dict:
+    from fastapi import Request
+    import main
+    from auth import get_current_user
+    from services.generation_cache import generation_cache
+    from services.generation_scheduler import generation_scheduler
+
+    main.app.dependency_overrides[get_current_user] = (
+        lambda request: {"uid": request.headers.get("X-Bench-User", "bench-user-0")}
+    )
+    # FastAPI needs the annotation to inject the request into the override.
+    main.app.dependency_overrides[get_current_user].__annotations__["request"] = Request
+
+    print(f"Seeding {args.users} users x {args.documents} documents...")
+    seed_corpus(args.users, args.documents)
+    embed_calls_after_seed, generate_calls_before = env.genkit.embed_calls, env.genkit.generate_calls
+
+    server, thread, base_url = start_server(main.app)
+    try:
+        print(f"Running {args.requests} requests with {args.clients} concurrent clients against {base_url}...")
+        result = asyncio.run(run_client_requests(base_url, args.requests, args.clients, args.users, args.repeat_ratio))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    result["model_calls"] = env.genkit.generate_calls - generate_calls_before
+    result["embed_calls"] = env.genkit.embed_calls - embed_calls_after_seed
+    result["generation_cache"] = dict(generation_cache.stats)
+    result["scheduler"] = generation_scheduler.get_stats()
+
+    print_table("/generate-stream latency", {
+        "time to first event": result["latency"]["first_event"],
+        "time to final_result": result["latency"]["final_result"],
+        "total stream": result["latency"]["total"],
+    })
+    print(f"\n  ok={result['outcomes']['ok']} errors={result['outcomes']['error']} "
+          f"queued={result['outcomes']['queued']} wall={result['wall_seconds']:.2f}s "
+          f"throughput={result['requests_per_second']:.2f} req/s")
+    print(f"  model calls={result['model_calls']} embed calls={result['embed_calls']} "
+          f"scheduler={result['scheduler']}")
+    return result
+
+
+# --- Micro-benchmarks ---
+
+def time_calls(func, repeat: int) -> dict:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return summarize(durations)
+
+
+def benchmark_micro(args) -> dict:
+    import numpy as np
+    import config
+    from services.context_builder import select_passages
+    from services.local_vector_store import LocalVectorStore
+    from services.text_processing import chunk_text
+    from services.text_extraction import DOCX, PDF, iter_document_text, pdf_page_pool
+
+    results = {}
+
+    long_text = "\n\n".join(synthetic_text(seed) for seed in range(20))
+    results[f"chunk_text ({len(long_text) // 1024} KiB)"] = time_calls(
+        lambda: chunk_text(long_text, config.CHUNK_MAX_TOKENS, config.CHUNK_OVERLAP_TOKENS), args.repeat
+    )
+
+    if importlib.util.find_spec("pypdf") is None:
+        print("pypdf is not installed; skipping PDF extraction benchmarks.")
+    else:
+        import tempfile
+        pdf = synthetic_pdf(args.pdf_pages)
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+            f.write(pdf)
+            f.flush()
+            results[f"extract PDF {args.pdf_pages}p, in-process"] = time_calls(
+                lambda: list(iter_document_text(pdf, PDF)), max(1, args.repeat // 10)
+            )
+            # The pool is used directly, since iter_document_text only uses it when enabled in config.
+            list(pdf_page_pool.extract_pages(f.name, args.pdf_pages))  # start the worker pool outside the timing
+            results[f"extract PDF {args.pdf_pages}p, process pool ({pdf_page_pool.workers} workers)"] = time_calls(
+                lambda: list(pdf_page_pool.extract_pages(f.name, args.pdf_pages)), max(1, args.repeat // 10)
+            )
+        pdf_page_pool.terminate()
+
+    try:
+        import docx
+    except ImportError:
+        print("python-docx is not installed; skipping DOCX extraction benchmarks.")
+    else:
+        import io
+        document = docx.Document()
+        for paragraph in synthetic_text(7, paragraphs=300).split("\n\n"):
+            document.add_paragraph(paragraph)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        docx_bytes = buffer.getvalue()
+        results["extract DOCX (300 paragraphs)"] = time_calls(
+            lambda: list(iter_document_text(docx_bytes, DOCX)), max(1, args.repeat // 10)
+        )
+
+    import tempfile
+    store = LocalVectorStore(tempfile.mkdtemp(prefix="bench-vectors-"))
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, fakes.EMBEDDING_DIMENSION)).astype(np.float32)
+    for start in range(0, args.vectors, 500):
+        store.upsert([
+            {"id": f"v{i}", "values": vectors[i].tolist(),
+             "metadata": {"doc_type": "pdf" if i % 2 else "docx", "text": synthetic_text(i, 1, 60)}}
+            for i in range(start, min(start + 500, args.vectors))
+        ], namespace="bench")
+    query = rng.standard_normal(fakes.EMBEDDING_DIMENSION).astype(np.float32).tolist()
+    results[f"vector query top-{config.RETRIEVAL_CANDIDATES} ({args.vectors} vectors)"] = time_calls(
+        lambda: store.query(query, config.RETRIEVAL_CANDIDATES, namespace="bench"), args.repeat
+    )
+    results["vector query with filter"] = time_calls(
+        lambda: store.query(query, config.RETRIEVAL_CANDIDATES, namespace="bench", filter={"doc_type": {"$eq": "pdf"}}),
+        args.repeat
+    )
+    candidates = [
+        {**match, "text": match["metadata"]["text"]}
+        for match in store.query(query, config.RETRIEVAL_CANDIDATES, namespace="bench", include_values=True)
+    ]
+    results["select_passages (MMR packing)"] = time_calls(
+        lambda: select_passages(candidates, config.CONTEXT_TOKEN_BUDGET), args.repeat
+    )
+
+    print_table("Micro-benchmarks", results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the RAG generation path.")
+    parser.add_argument("suite", choices=["http", "micro", "all"], nargs="?", default="all")
+    parser.add_argument("--clients", type=int, default=20, help="concurrent SSE clients")
+    parser.add_argument("--requests", type=int, default=200, help="total /generate-stream requests")
+    parser.add_argument("--users", type=int, default=20, help="distinct users the requests are spread over")
+    parser.add_argument("--documents", type=int, default=5, help="seeded documents per user")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0,
+                        help="share of requests that repeat an earlier job description")
+    parser.add_argument("--vector-store", choices=["pinecone", "local"], default="pinecone",
+                        help="fake Pinecone client, or the in-process local store")
+    parser.add_argument("--repeat", type=int, default=200, help="iterations per micro-benchmark")
+    parser.add_argument("--vectors", type=int, default=5000, help="vectors in the micro-benchmark index")
+    parser.add_argument("--pdf-pages", type=int, default=60, help="pages in the synthetic PDF")
+    parser.add_argument("--model-first-token", type=float, default=0.4, help="fake model time to first token (s)")
+    parser.add_argument("--model-chunk-interval", type=float, default=0.02, help="fake model gap between chunks (s)")
+    parser.add_argument("--model-chunks", type=int, default=60, help="chunks per fake model response")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="fake embedding call latency (s)")
+    parser.add_argument("--vector-latency", type=float, default=0.01, help="fake Pinecone call latency (s)")
+    parser.add_argument("--firestore-latency", type=float, default=0.002, help="fake Firestore call latency (s)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("VECTOR_STORE_BACKEND", args.vector_store)
+    # The fake model has no quota, so the token bucket is opened up unless set explicitly.
+    os.environ.setdefault("GENERATION_RATE_PER_MINUTE", "1000000")
+    os.environ.setdefault("GENERATION_RATE_BURST", "1000000")
+    os.environ.setdefault("EXPORT_STREAM_WAIT_SECONDS", "0")
+    env = fakes.install(fakes.Latencies(
+        firestore=args.firestore_latency,
+        embed=args.embed_latency,
+        vector_query=args.vector_latency,
+        model_first_token=args.model_first_token,
+        model_chunk_interval=args.model_chunk_interval,
+        model_chunks=args.model_chunks,
+    ))
+
+    results = {}
+    if args.suite in ("http", "all"):
+        results["http"] = benchmark_http(args, env)
+    if args.suite in ("micro", "all"):
+        results["micro"] = benchmark_micro(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
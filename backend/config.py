@@ -1,19 +1,145 @@
 import os
-import genkit
-from genkit.models import gemini
 
-# Genkit/Gemini Model Configuration
-EMBEDDER_MODEL = gemini.text_embedding_004
-GENERATOR_MODEL = gemini.gemini_1_5_pro
+# Genkit/Gemini Model Configuration. The model references are looked up on first
+# access (see __getattr__ below), so reading config does not import Genkit.
+# Names are attributes of genkit.models.gemini.
+_MODEL_NAMES = {
+    "EMBEDDER_MODEL": os.getenv("EMBEDDER_MODEL", "text_embedding_004"),
+    "GENERATOR_MODEL": "gemini_1_5_pro",
+}
+EMBEDDER_MODEL_NAME = _MODEL_NAMES["EMBEDDER_MODEL"]
+
+def __getattr__(name):
+    if name in _MODEL_NAMES:
+        from genkit.models import gemini
+        return getattr(gemini, _MODEL_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Embedding cache: "memory" (in-process LRU only), "sqlite" or "firestore" for a persistent tier
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "memory")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_PERSISTENT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_PERSISTENT_MAX_ENTRIES", "200000"))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+EMBEDDING_CACHE_SQLITE_PATH = os.getenv("EMBEDDING_CACHE_SQLITE_PATH", ".cache/embeddings.sqlite3")
+EMBEDDING_CACHE_FIRESTORE_COLLECTION = "embedding_cache"
+
+# Vector store backend: "pinecone" (hosted) or "local" (in-process NumPy index persisted to disk)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+LOCAL_VECTOR_STORE_DIR = os.getenv("LOCAL_VECTOR_STORE_DIR", ".cache/vector_store")
 
 # Pinecone Configuration
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "career-pilot-index")
+VECTOR_UPSERT_BATCH_SIZE = 100
+VECTOR_DELETE_BATCH_SIZE = 1000
+VECTOR_FETCH_BATCH_SIZE = 1000
+
+# Extracted document text: "gcs" (compressed objects in Cloud Storage) or "local" (files on disk)
+TEXT_STORE_BACKEND = os.getenv("TEXT_STORE_BACKEND", "gcs")
+# Bucket for text objects; empty means the default Firebase Storage bucket
+TEXT_STORE_BUCKET = os.getenv("TEXT_STORE_BUCKET", "")
+TEXT_STORE_PREFIX = "extracted_text/"
+LOCAL_TEXT_STORE_DIR = os.getenv("LOCAL_TEXT_STORE_DIR", ".cache/text_store")
+TEXT_STORE_ZSTD_LEVEL = 9
+
+# Text extraction: uploads over the size cap are rejected and PDFs are cut off at the page cap.
+# With EXTRACTION_PARALLEL_ENABLED, PDFs with at least EXTRACTION_PARALLEL_MIN_PAGES pages are
+# extracted in a process pool when there is more than one worker. It is off by default: on a
+# single CPU, in-process extraction of a 60-page PDF is faster (`python -m benchmarks.run micro`).
+# EXTRACTION_PAGE_TIMEOUT_SECONDS only bounds pages extracted in the pool: a page extracted in
+# process cannot be interrupted, so with the default settings one pathological page can still
+# stall its upload's ingestion.
+EXTRACTION_MAX_FILE_BYTES = int(os.getenv("EXTRACTION_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", "300"))
+EXTRACTION_PARALLEL_ENABLED = os.getenv("EXTRACTION_PARALLEL_ENABLED", "false").lower() in ("1", "true", "yes")
+EXTRACTION_PARALLEL_MIN_PAGES = int(os.getenv("EXTRACTION_PARALLEL_MIN_PAGES", "100"))
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACTION_PAGE_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_PAGE_TIMEOUT_SECONDS", "20"))
+
+# Ingestion Configuration
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "60"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = 4
+EMBED_RETRY_BASE_DELAY_SECONDS = 0.5
+EMBED_RETRY_MAX_DELAY_SECONDS = 8.0
+
+# Vector index versions. A version is an embedding model plus chunking parameters, and its
+# vectors live in per-user namespaces of their own. Retrieval and ingestion use the version
+# marked active in Firestore, re-read this often; scripts/reindex_vectors.py builds the
+# version configured above (EMBEDDER_MODEL, CHUNK_*) and then switches to it.
+VECTOR_INDEX_STATE_REFRESH_SECONDS = 60
+REINDEX_PAGE_SIZE = int(os.getenv("REINDEX_PAGE_SIZE", "50"))
+REINDEX_WORKERS = int(os.getenv("REINDEX_WORKERS", "4"))
 
 # Google Cloud Configuration
 GCP_PROJECT_ID = os.getenv("GCLOUD_PROJECT")
 OAUTH_SECRET_NAME = "job-scout-token"
 
+# Context assembly: over-fetch candidates, diversify with MMR and pack into a token budget
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Trade-off between relevance (1.0) and diversity (0.0) when re-ranking passages
+CONTEXT_MMR_LAMBDA = 0.7
+# Passages more similar than this to an already selected one are treated as duplicates
+CONTEXT_DUPLICATE_THRESHOLD = 0.95
+
+# Hybrid retrieval: a per-user BM25 index over chunk text, queried alongside the vector
+# search and fused with it by reciprocal rank fusion. Each document's part of the index
+# is a compressed object in the text store's bucket under LEXICAL_INDEX_PREFIX.
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LEXICAL_INDEX_PREFIX = "lexical_index/"
+LEXICAL_INDEX_CACHE_USERS = int(os.getenv("LEXICAL_INDEX_CACHE_USERS", "256"))
+# Bounds how long another instance's deletions can go unnoticed by a cached index
+LEXICAL_INDEX_CACHE_TTL_SECONDS = 300
+BM25_K1 = 1.2
+BM25_B = 0.75
+HYBRID_RRF_K = 60
+# When the lexical side has results and the vector side (query embedding plus vector query)
+# takes longer than this or fails, the lexical results are used alone, and the vector side
+# is skipped for that user for HYBRID_DEGRADED_COOLDOWN_SECONDS while lexical results keep coming back
+HYBRID_VECTOR_TIMEOUT_SECONDS = float(os.getenv("HYBRID_VECTOR_TIMEOUT_SECONDS", "2.0"))
+HYBRID_DEGRADED_COOLDOWN_SECONDS = 30
+
+# Generation result cache
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "256"))
+GENERATION_CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# Generation admission control: concurrent model calls overall and per user, a token bucket
+# sized to the model quota (requests per minute plus burst; a rate of 0 means no rate limit),
+# and the size of the wait queue
+GENERATION_MAX_CONCURRENT = int(os.getenv("GENERATION_MAX_CONCURRENT", "8"))
+GENERATION_MAX_PER_USER = int(os.getenv("GENERATION_MAX_PER_USER", "1"))
+GENERATION_RATE_PER_MINUTE = float(os.getenv("GENERATION_RATE_PER_MINUTE", "60"))
+GENERATION_RATE_BURST = int(os.getenv("GENERATION_RATE_BURST", "10"))
+GENERATION_MAX_QUEUE = int(os.getenv("GENERATION_MAX_QUEUE", "100"))
+
+# Google Doc export jobs: "firestore" keeps job state durable across instances, "memory" is per-process
+EXPORT_STORE_BACKEND = os.getenv("EXPORT_STORE_BACKEND", "firestore")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "4"))
+EXPORT_QUEUE_MAX_SIZE = int(os.getenv("EXPORT_QUEUE_MAX_SIZE", "1000"))
+EXPORT_MAX_RETAINED_JOBS = 1000
+# A running job whose lease lapses is assumed dead and is picked up again
+EXPORT_LEASE_SECONDS = 600
+# How often stale jobs, and jobs that arrived while the queue was full, are claimed and queued
+EXPORT_RECOVERY_INTERVAL_SECONDS = 60
+# How long /generate-stream stays open after final_result to report the document URL (0 = not at all)
+EXPORT_STREAM_WAIT_SECONDS = float(os.getenv("EXPORT_STREAM_WAIT_SECONDS", "30"))
+
+# Feedback write-behind buffer: /feedback returns once the entry is buffered, and buffered
+# entries are written to Firestore in batches of up to FEEDBACK_BATCH_SIZE, at least every
+# FEEDBACK_FLUSH_INTERVAL_SECONDS. When FEEDBACK_MAX_PENDING entries are waiting, requests
+# wait up to FEEDBACK_ENQUEUE_TIMEOUT_SECONDS for room and are then turned away.
+FEEDBACK_BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "100"))
+FEEDBACK_FLUSH_INTERVAL_SECONDS = float(os.getenv("FEEDBACK_FLUSH_INTERVAL_SECONDS", "2.0"))
+FEEDBACK_MAX_PENDING = int(os.getenv("FEEDBACK_MAX_PENDING", "5000"))
+FEEDBACK_ENQUEUE_TIMEOUT_SECONDS = 1.0
+# Content hashes of generation texts this instance has already stored, so they are not rewritten
+FEEDBACK_KNOWN_CONTENT_MAX_ENTRIES = 10000
+
 # Application-specific prompts
+# Bump PROMPT_VERSION whenever GENERATION_SYSTEM_PROMPT changes, so cached generations are not reused.
+PROMPT_VERSION = "1"
 GENERATION_SYSTEM_PROMPT = """
 You are an expert career document writer for the Australian Community Services sector.
 Your task is to generate a tailored resume summary and a full cover letter based on the provided job description and relevant examples from the user's past documents.
@@ -31,5 +157,35 @@ Your task is to generate a tailored resume summary and a full cover letter based
 }}
 """
 
+# Concurrency Configuration
+# Upper bound on threads used to run the blocking Firebase, Pinecone and Google API
+# clients off the event loop.
+SERVICE_EXECUTOR_MAX_WORKERS = int(os.getenv("SERVICE_EXECUTOR_MAX_WORKERS", "32"))
+
+# GET /documents page sizes
+DOCUMENTS_PAGE_SIZE = 50
+DOCUMENTS_MAX_PAGE_SIZE = 200
+
+# Comma-separated origins the frontend is served from, allowed to call the API from a browser
+CORS_ALLOWED_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:5173").split(",") if origin.strip()]
+
 # Job Scout Configuration
 JOB_SCOUT_SENDERS = ["noreply@s.seek.com.au", "noreply@ethicaljobs.com.au", "donotreply@jora.com"]
+# Reminders are placed this many days before an alert's closing date (but never before tomorrow)
+JOB_SCOUT_REMINDER_DAYS_BEFORE = 2
+JOB_SCOUT_MAX_PARALLEL_BATCHES = int(os.getenv("JOB_SCOUT_MAX_PARALLEL_BATCHES", "4"))
+
+# Google API request batching and retries
+GOOGLE_API_BATCH_SIZE = 50
+GOOGLE_API_MAX_RETRIES = 5
+
+# Telemetry: per-stage latency histograms and counters, served at GET /metrics in the
+# Prometheus text format. Spans are also exported through OpenTelemetry when
+# TELEMETRY_OTEL_EXPORTER is "otlp" (configured by the standard OTEL_EXPORTER_OTLP_*
+# variables) or "console"; this needs the opentelemetry-sdk package.
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() in ("1", "true", "yes")
+TELEMETRY_OTEL_EXPORTER = os.getenv("TELEMETRY_OTEL_EXPORTER", "")
+TELEMETRY_SERVICE_NAME = os.getenv("TELEMETRY_SERVICE_NAME", "career-pilot-backend")
+# GET /metrics requires "Authorization: Bearer <METRICS_TOKEN>"; while it is unset the
+# endpoint answers 404, since the statistics include per-user service figures.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
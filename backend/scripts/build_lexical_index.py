@@ -0,0 +1,24 @@
+"""
+Builds lexical index shards for documents indexed before hybrid retrieval existed.
+Safe to interrupt and re-run; documents that already have a shard are skipped.
+
+Run from the backend directory:
+    python -m scripts.build_lexical_index [--page-size 100]
+"""
+import argparse
+from dotenv import load_dotenv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=100, help="documents per Firestore page")
+    args = parser.parse_args()
+
+    load_dotenv()
+    from services.ingestion_service import ingestion_service
+    built = ingestion_service.backfill_lexical_index(page_size=args.page_size)
+    print(f"Done. Built {built} lexical index shards.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Measures the cold start of each entry point deployed from main.py: the time to import
+what it imports, in a fresh interpreter, and which heavy SDKs and services that loads.
+
+Run from the backend directory:
+    python -m scripts.measure_cold_start [--build] [--fakes] [--repeat 5] [--top 10]
+
+--build also constructs the services each entry point uses on its first call (this
+connects to Firebase, Pinecone and so on, so it needs credentials unless --fakes is
+given). --fakes runs against the in-process fakes from benchmarks/fakes.py, for
+machines without the SDKs; SDK import times are then not representative.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# What each function's body imports on its first invocation, and the services it uses.
+ENTRY_POINTS = {
+    "import main": ("", []),
+    "api (main.app)": ("main.app", ["firebase_service", "vector_db_service", "ai_service", "export_service"]),
+    "process_and_embed_document": (
+        "from services.firebase_service import firebase_service\n"
+        "from services.ingestion_service import ingestion_service",
+        ["firebase_service", "ingestion_service", "ai_service", "vector_db_service"],
+    ),
+    "jobScout_scheduled": (
+        "from services.firebase_service import firebase_service\n"
+        "from services.gcp_service import gcp_service",
+        ["firebase_service", "gcp_service"],
+    ),
+}
+
+SERVICE_MODULES = {
+    "ai_service": "services.ai_service",
+    "export_service": "services.export_service",
+    "firebase_service": "services.firebase_service",
+    "gcp_service": "services.gcp_service",
+    "ingestion_service": "services.ingestion_service",
+    "vector_db_service": "services.vector_db_service",
+}
+
+HEAVY_MODULES = [
+    "fastapi", "pydantic", "genkit", "pinecone", "numpy", "pypdf", "docx",
+    "googleapiclient.discovery", "google.cloud.secretmanager", "google.cloud.firestore",
+]
+
+MARKER = "--- cold start ---"
+
+CHILD = """
+import json, sys, time
+if {fakes!r}:
+    from benchmarks import fakes
+    fakes.install(fakes.Latencies(firestore=0, storage=0, embed=0, vector_query=0,
+                                  model_first_token=0, model_chunk_interval=0, google_api=0))
+preloaded = set(sys.modules)
+print({marker!r}, file=sys.stderr, flush=True)
+started = time.perf_counter()
+import main
+{body}
+for name in {build!r}:
+    getattr(__import__(SERVICE_MODULES[name], fromlist=[name]), name).resolve()
+elapsed = time.perf_counter() - started
+built = [name for name, module in SERVICE_MODULES.items()
+         if module in sys.modules and getattr(sys.modules[module], name).initialized]
+print(json.dumps({{
+    "seconds": elapsed,
+    "modules": len(set(sys.modules) - preloaded),
+    "heavy": [name for name in {heavy!r} if name in sys.modules and name not in preloaded],
+    "built": built,
+}}))
+"""
+
+
+def parse_importtime(stderr: str, top: int) -> list[tuple[str, int]]:
+    """Returns the `top` slowest top-level imports as (module, cumulative microseconds)."""
+    lines = stderr.split(MARKER, 1)[-1].splitlines()
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Nested imports are indented below the one that triggered them.
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        imports.append((name.strip(), int(cumulative)))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def measure(body: str, services: list[str], build: bool, fakes: bool, top: int) -> dict:
+    code = CHILD.format(
+        fakes=fakes, marker=MARKER, body=body, build=services if build else [], heavy=HEAVY_MODULES,
+    )
+    code = f"SERVICE_MODULES = {SERVICE_MODULES!r}\n" + code
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "child failed")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["slowest"] = parse_importtime(result.stderr, top)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--build", action="store_true", help="also construct the services each entry point uses")
+    parser.add_argument("--fakes", action="store_true", help="run against benchmarks/fakes.py instead of the SDKs")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports to list")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for entry_point, (body, services) in ENTRY_POINTS.items():
+        try:
+            runs = [measure(body, services, args.build, args.fakes, args.top) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{entry_point}: failed: {e}")
+            continue
+        seconds = [run["seconds"] * 1000 for run in runs]
+        results[entry_point] = {**runs[-1], "median_ms": statistics.median(seconds), "max_ms": max(seconds)}
+
+        report = results[entry_point]
+        print(f"{entry_point}")
+        print(f"  {report['median_ms']:.1f} ms median, {report['max_ms']:.1f} ms max, {report['modules']} modules")
+        print(f"  heavy modules: {', '.join(report['heavy']) or 'none'}")
+        print(f"  services built: {', '.join(report['built']) or 'none'}")
+        for module, microseconds in report["slowest"]:
+            print(f"    {microseconds / 1000:8.1f} ms  {module}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
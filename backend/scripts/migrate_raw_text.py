@@ -0,0 +1,24 @@
+"""
+Moves extracted text stored inline in Firestore (`raw_text`) into the text store.
+Safe to interrupt and re-run; already migrated documents are skipped.
+
+Run from the backend directory:
+    python -m scripts.migrate_raw_text [--page-size 100]
+"""
+import argparse
+from dotenv import load_dotenv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=100, help="documents per Firestore page and write batch")
+    args = parser.parse_args()
+
+    load_dotenv()
+    from services.firebase_service import firebase_service
+    migrated = firebase_service.migrate_raw_text(page_size=args.page_size)
+    print(f"Done. Migrated {migrated} documents.")
+
+
+if __name__ == "__main__":
+    main()
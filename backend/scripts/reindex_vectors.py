@@ -0,0 +1,39 @@
+"""
+Re-embeds every stored document into a new vector index version and switches to it.
+Use after changing EMBEDDER_MODEL, CHUNK_MAX_TOKENS or CHUNK_OVERLAP_TOKENS: the version
+built is the one the current environment configures. Progress is checkpointed, so an
+interrupted run resumes where it stopped when started again.
+
+Run from the backend directory:
+    python -m scripts.reindex_vectors [--page-size 50] [--workers 4] [--no-switch]
+
+The new version's namespaces share the vector index, so the new embedder must produce
+vectors of the index's dimension.
+"""
+import argparse
+from dotenv import load_dotenv
+
+
+def main():
+    load_dotenv()
+    import config
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=config.REINDEX_PAGE_SIZE, help="documents per Firestore page")
+    parser.add_argument("--workers", type=int, default=config.REINDEX_WORKERS,
+                        help="threads reading text, embedding and upserting")
+    parser.add_argument("--no-switch", action="store_true",
+                        help="build the version but leave retrieval on the current one")
+    args = parser.parse_args()
+
+    from services.index_versions import IndexVersion
+    from services.ingestion_service import ingestion_service
+    version = IndexVersion.from_config()
+    print(f"Building {version}")
+    indexed = ingestion_service.rebuild_index(
+        version, page_size=args.page_size, workers=args.workers, activate=not args.no_switch
+    )
+    print(f"Done. Indexed {indexed} documents into index version {version.name}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,83 @@
 import json
-import genkit
-from . import config
-import asyncio
+import config
+from .embedding_cache import EmbeddingCache, SQLiteEmbeddingStore, FirestoreEmbeddingStore
+from .json_stream import JsonFieldStreamer
+from .providers import LazyService
+
+def create_embedding_cache() -> EmbeddingCache:
+    """Builds the embedding cache with the persistent tier selected in config."""
+    backend = config.EMBEDDING_CACHE_BACKEND
+    if backend == "sqlite":
+        persistent = SQLiteEmbeddingStore(config.EMBEDDING_CACHE_SQLITE_PATH, config.EMBEDDING_CACHE_PERSISTENT_MAX_ENTRIES)
+    elif backend == "firestore":
+        from .firebase_service import firebase_service
+        persistent = FirestoreEmbeddingStore(firebase_service.db, config.EMBEDDING_CACHE_FIRESTORE_COLLECTION)
+    elif backend == "memory":
+        persistent = None
+    else:
+        raise ValueError(f"Unsupported embedding cache backend: {backend}")
+    return EmbeddingCache(
+        max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES,
+        ttl_seconds=config.EMBEDDING_CACHE_TTL_SECONDS,
+        persistent=persistent,
+    )
 
 class AIService:
-    def __init__(self, embedder, generator):
+    def __init__(self, embedder, generator, embedding_cache: EmbeddingCache = None):
+        # Genkit is imported where it is used, so only code paths that call the model load it.
+        import genkit
         genkit.init(log_level="INFO")
         self.embedder = embedder
         self.generator = generator
+        self.embedder_name = getattr(embedder, "name", str(embedder))
+        self.generator_name = getattr(generator, "name", str(generator))
+        self.embedding_cache = embedding_cache
 
-    def embed_text(self, text: str) -> list[float]:
+    def embed_text(self, text: str, model: str = None) -> list[float]:
         """Generates a vector embedding for the given text."""
-        return genkit.embed(embedder=self.embedder, content=text)
+        return self.embed_texts([text], model=model)[0]
 
-    def generate_document_content(self, job_description: str, context_docs_text: str) -> dict:
+    def embed_texts(self, texts: list[str], model: str = None) -> list[list[float]]:
         """
-        Generates a cover letter and resume summary using the LLM.
-        Returns a dictionary with 'cover_letter_text' and 'resume_text'.
+        Generates vector embeddings for a batch of texts, with the configured embedder or
+        the one named `model` (an attribute of genkit.models.gemini).
+        Cached embeddings are reused; the remaining texts go to the embedder in a single call
+        if the Genkit client has `embed_many`, or one `embed` call per text otherwise.
         """
-        prompt = f"""
+        embedder, embedder_name = self._resolve_embedder(model)
+        if self.embedding_cache is None:
+            return self._embed_uncached(embedder, texts)
+
+        embeddings = self.embedding_cache.get_many(embedder_name, texts)
+        # Identical texts within the batch only need to be embedded once.
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            new_embeddings = self._embed_uncached(embedder, missing)
+            self.embedding_cache.put_many(embedder_name, missing, new_embeddings)
+            by_text = dict(zip(missing, new_embeddings))
+            embeddings = [embedding if embedding is not None else by_text[text] for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
+    @staticmethod
+    def _embed_uncached(embedder, texts: list[str]) -> list[list[float]]:
+        import genkit
+
+        embed_many = getattr(genkit, "embed_many", None)
+        if embed_many is not None:
+            return embed_many(embedder=embedder, content=texts)
+        return [genkit.embed(embedder=embedder, content=text) for text in texts]
+
+    def _resolve_embedder(self, model: str):
+        if model is None or model == config.EMBEDDER_MODEL_NAME:
+            return self.embedder, self.embedder_name
+        from genkit.models import gemini
+        embedder = getattr(gemini, model)
+        return embedder, getattr(embedder, "name", str(embedder))
+
+    @staticmethod
+    def build_prompt(job_description: str, context_docs_text: str) -> str:
+        """Assembles the generation prompt from the job description and the retrieved examples."""
+        return f"""
         {config.GENERATION_SYSTEM_PROMPT}
 
         **TARGET JOB DESCRIPTION:**
@@ -28,6 +87,15 @@ class AIService:
         {context_docs_text}
         """
 
+    def generate_document_content(self, job_description: str, context_docs_text: str) -> dict:
+        """
+        Generates a cover letter and resume summary using the LLM.
+        Returns a dictionary with 'cover_letter_text' and 'resume_text'.
+        """
+        import genkit
+
+        prompt = self.build_prompt(job_description, context_docs_text)
+
         try:
             llm_response = genkit.generate(
                 model=self.generator,
@@ -49,16 +117,12 @@ class AIService:
     async def generate_document_content_stream(self, job_description: str, context_docs_text: str):
         """
         Generates a cover letter and resume summary using the LLM and streams the response.
+        Yields dicts with "cover_letter_chunk" and "resume_chunk" holding the unescaped text
+        the model has added to each field since the previous chunk.
         """
-        prompt = f"""
-        {config.GENERATION_SYSTEM_PROMPT}
+        import genkit
 
-        **TARGET JOB DESCRIPTION:**
-        {job_description}
-
-        **RELEVANT EXAMPLES FROM USER'S PAST DOCUMENTS (FOR CONTEXT AND STYLE):**
-        {context_docs_text}
-        """
+        prompt = self.build_prompt(job_description, context_docs_text)
 
         llm_response_stream = await genkit.generate(
             model=self.generator,
@@ -67,20 +131,25 @@ class AIService:
             config={"response_format": "json"}
         )
 
+        streamer = JsonFieldStreamer()
+        raw_parts = []
         async for chunk in llm_response_stream:
-            try:
-                # Try to parse the chunk as JSON
-                yield json.loads(chunk.text())
-            except json.JSONDecodeError:
-                # If it's not valid JSON, it's likely a partial string
-                # In a more robust implementation, you would buffer these
-                # and try to parse them together. For now, we'll just
-                # yield the raw text as a chunk.
-                yield {"cover_letter_chunk": chunk.text(), "resume_chunk": ""}
-
-
-# A single, shared instance of the service
-ai_service = AIService(
+            text = chunk.text()
+            raw_parts.append(text)
+            fields = {key: delta for key, delta in streamer.feed(text)}
+            cover_letter_chunk = fields.get("cover_letter_text", "")
+            resume_chunk = fields.get("resume_text", "")
+            if cover_letter_chunk or resume_chunk:
+                yield {"cover_letter_chunk": cover_letter_chunk, "resume_chunk": resume_chunk}
+
+        if not streamer.seen_object:
+            # The model ignored the JSON format; surface its text rather than nothing.
+            yield {"cover_letter_chunk": "".join(raw_parts), "resume_chunk": ""}
+
+
+# A single, shared instance of the service, built on first use
+ai_service = LazyService(lambda: AIService(
     embedder=config.EMBEDDER_MODEL,
-    generator=config.GENERATOR_MODEL
-)
+    generator=config.GENERATOR_MODEL,
+    embedding_cache=create_embedding_cache()
+))
@@ -0,0 +1,58 @@
+import numpy as np
+import config
+from .text_processing import estimate_tokens
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+def select_passages(candidates: list[dict], token_budget: int, mmr_lambda: float = config.CONTEXT_MMR_LAMBDA,
+                    duplicate_threshold: float = config.CONTEXT_DUPLICATE_THRESHOLD) -> list[dict]:
+    """
+    Chooses which retrieved passages go into the prompt.
+    Candidates (as returned by VectorDBService.retrieve with include_values=True) are
+    re-ranked by maximal marginal relevance, near-duplicates of already chosen passages
+    are dropped, and passages are packed greedily until the token budget is spent.
+    Candidates without a vector (lexical-only matches) are ranked by relevance alone.
+    """
+    if not candidates:
+        return []
+
+    dimension = next((len(doc["values"]) for doc in candidates if doc.get("values") is not None), 1)
+    vectors = np.asarray(
+        [doc["values"] if doc.get("values") is not None else np.zeros(dimension) for doc in candidates],
+        dtype=np.float32,
+    )
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    similarity = vectors @ vectors.T
+    relevance = np.asarray([doc["score"] for doc in candidates], dtype=np.float32)
+    tokens = [estimate_tokens(doc["text"]) for doc in candidates]
+
+    selected = []
+    remaining = set(range(len(candidates)))
+    budget_left = token_budget
+    # Highest similarity of each candidate to anything selected so far
+    max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)
+
+    while remaining and budget_left > 0:
+        indices = np.fromiter(remaining, dtype=int)
+        redundancy = np.where(np.isfinite(max_similarity[indices]), max_similarity[indices], 0.0)
+        mmr = mmr_lambda * relevance[indices] - (1 - mmr_lambda) * redundancy
+        best = int(indices[np.argmax(mmr)])
+        remaining.discard(best)
+
+        if max_similarity[best] >= duplicate_threshold:
+            continue
+        cost = tokens[best] + (estimate_tokens(CONTEXT_SEPARATOR) if selected else 0)
+        if cost > budget_left:
+            # Too long for what is left; a shorter passage further down may still fit.
+            continue
+
+        selected.append(best)
+        budget_left -= cost
+        max_similarity = np.maximum(max_similarity, similarity[best])
+
+    return [candidates[i] for i in selected]
+
+def build_context(passages: list[dict]) -> str:
+    """Joins the selected passages into the examples section of the prompt."""
+    return CONTEXT_SEPARATOR.join(doc["text"] for doc in passages)
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+from .text_processing import normalize_text
+
+def _pack(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def _unpack(data: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class SQLiteEmbeddingStore:
+    """Persistent embedding tier backed by a local SQLite file. Suited to tests and local runs."""
+
+    def __init__(self, path: str, max_entries: int):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+
+    def get_many(self, keys: list[str]) -> dict:
+        now = time.time()
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders}) AND expires_at > ?",
+                (*keys, now),
+            ).fetchall()
+            if rows:
+                self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key, _ in rows])
+                self._conn.commit()
+        return {key: _unpack(vector) for key, vector in rows}
+
+    def put_many(self, entries: dict, ttl_seconds: float):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                [(key, _pack(vector), now + ttl_seconds, now) for key, vector in entries.items()],
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM embeddings WHERE expires_at <= ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            # Drop the least recently used entries beyond the size limit.
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+
+class FirestoreEmbeddingStore:
+    """
+    Persistent embedding tier backed by a Firestore collection, shared across instances.
+    Expiry relies on a Firestore TTL policy on the `expires_at` field; reads also skip
+    expired entries in case the policy has not removed them yet.
+    """
+
+    def __init__(self, db, collection: str):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    def get_many(self, keys: list[str]) -> dict:
+        now = time.time()
+        found = {}
+        for snapshot in self.db.get_all([self.collection.document(key) for key in keys]):
+            if not snapshot.exists:
+                continue
+            data = snapshot.to_dict()
+            if data["expires_at"].timestamp() > now:
+                found[snapshot.id] = _unpack(data["vector"])
+        return found
+
+    def put_many(self, entries: dict, ttl_seconds: float):
+        expires_at = datetime.fromtimestamp(time.time() + ttl_seconds, tz=timezone.utc)
+        items = list(entries.items())
+        # Firestore batches are limited to 500 writes.
+        for start in range(0, len(items), 500):
+            batch = self.db.batch()
+            for key, vector in items[start:start + 500]:
+                batch.set(self.collection.document(key), {"vector": _pack(vector), "expires_at": expires_at})
+            batch.commit()
+
+
+class EmbeddingCache:
+    """
+    Two-tier memoizing cache for embeddings, keyed on (model, normalized text hash).
+    An in-process LRU sits in front of an optional persistent store.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, persistent=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: list[str]) -> list:
+        """Returns cached embeddings aligned with `texts`, with None for misses."""
+        keys = [self.make_key(model, text) for text in texts]
+        results = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    continue
+                vector, expires_at = entry
+                if expires_at <= now:
+                    del self._memory[key]
+                    continue
+                self._memory.move_to_end(key)
+                results[key] = vector
+            self.stats["memory_hits"] += len(results)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        if missing and self.persistent is not None:
+            try:
+                found = self.persistent.get_many(missing)
+            except Exception as e:
+                print(f"Embedding cache persistent tier read failed: {e}")
+                found = {}
+            if found:
+                self._remember(found)
+                results.update(found)
+            with self._lock:
+                self.stats["persistent_hits"] += len(found)
+
+        with self._lock:
+            self.stats["misses"] += len([key for key in dict.fromkeys(keys) if key not in results])
+        return [results.get(key) for key in keys]
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        entries = {self.make_key(model, text): vector for text, vector in zip(texts, vectors)}
+        self._remember(entries)
+        if self.persistent is not None:
+            try:
+                self.persistent.put_many(entries, self.ttl_seconds)
+            except Exception as e:
+                print(f"Embedding cache persistent tier write failed: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = sum(self.stats.values())
+            hits = self.stats["memory_hits"] + self.stats["persistent_hits"]
+            return {**self.stats, "size": len(self._memory), "hit_rate": hits / lookups if lookups else 0.0}
+
+    def _remember(self, entries: dict):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            for key, vector in entries.items():
+                self._memory[key] = (vector, expires_at)
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
@@ -0,0 +1,24 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+# A single, bounded pool shared by every service. The Firebase Admin SDK, the
+# Pinecone client and googleapiclient are all synchronous, so their calls are
+# offloaded here to keep the event loop free for other requests.
+_executor = ThreadPoolExecutor(
+    max_workers=config.SERVICE_EXECUTOR_MAX_WORKERS,
+    thread_name_prefix="service-io",
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking callable on the shared service executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context, so tracing spans opened in the thread nest under the caller's.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown_executor(wait: bool = True):
+    """Shuts down the shared executor. Intended for application shutdown."""
+    _executor.shutdown(wait=wait)
@@ -0,0 +1,268 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+import config
+from .executor import run_blocking
+from .gcp_service import gcp_service
+from .providers import LazyService
+from .telemetry import telemetry
+
+# Export job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class InMemoryExportStore:
+    """Keeps export jobs in process memory, retaining only the most recent ones."""
+
+    def __init__(self, max_jobs: int, lease_seconds: int):
+        self.max_jobs = max_jobs
+        self.lease_seconds = lease_seconds
+        self._jobs = OrderedDict()
+
+    def create(self, job: dict):
+        self._jobs[(job["user_id"], job["id"])] = dict(job)
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def update(self, user_id: str, export_id: str, fields: dict):
+        job = self._jobs.get((user_id, export_id))
+        if job is not None:
+            job.update(fields)
+
+    def get(self, user_id: str, export_id: str):
+        job = self._jobs.get((user_id, export_id))
+        return dict(job) if job is not None else None
+
+    def claim_stale(self, limit: int) -> list[dict]:
+        # Jobs in memory die with the process, so only this process's unqueued jobs are found.
+        now = time.time()
+        claimed = []
+        for job in self._jobs.values():
+            if len(claimed) == limit:
+                break
+            if job["status"] in (PENDING, RUNNING) and job["lease_expires_at"] < now:
+                job["lease_expires_at"] = now + self.lease_seconds
+                claimed.append(dict(job))
+        return claimed
+
+
+class FirestoreExportStore:
+    """
+    Persists export jobs, including their payload, in `users/{uid}/exports/{id}`.
+    Status is visible from every instance, and jobs whose worker died are re-claimed
+    once their lease expires. Claiming stale jobs needs a composite index on the
+    `exports` collection group over (status, lease_expires_at).
+    """
+
+    def __init__(self, db, lease_seconds: int):
+        self.db = db
+        self.lease_seconds = lease_seconds
+
+    def _ref(self, user_id: str, export_id: str):
+        return self.db.collection("users").document(user_id).collection("exports").document(export_id)
+
+    def create(self, job: dict):
+        self._ref(job["user_id"], job["id"]).set(job)
+
+    def update(self, user_id: str, export_id: str, fields: dict):
+        self._ref(user_id, export_id).update(fields)
+
+    def get(self, user_id: str, export_id: str):
+        snapshot = self._ref(user_id, export_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def claim_stale(self, limit: int) -> list[dict]:
+        from firebase_admin import firestore
+
+        now = time.time()
+        query = (self.db.collection_group("exports")
+                 .where("status", "in", [PENDING, RUNNING])
+                 .where("lease_expires_at", "<", now)
+                 .limit(limit))
+
+        @firestore.transactional
+        def claim(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            job = snapshot.to_dict() if snapshot.exists else None
+            # Another instance may have claimed or finished the job since the query ran.
+            if job is None or job["status"] not in (PENDING, RUNNING) or job["lease_expires_at"] >= now:
+                return None
+            transaction.update(ref, {"lease_expires_at": now + self.lease_seconds})
+            return job
+
+        claimed = []
+        for snapshot in query.stream():
+            job = claim(self.db.transaction(), snapshot.reference)
+            if job is not None:
+                claimed.append(job)
+        return claimed
+
+
+class ExportService:
+    """
+    Runs Google Doc exports as background jobs so generation streams can finish
+    as soon as the text is ready. Jobs go through a bounded queue drained by a
+    pool of worker tasks; callers poll `get_status` or await `wait_for`.
+    A job submitted while the queue is full is stored with a lapsed lease instead,
+    and every `recovery_interval` seconds jobs with lapsed leases (those, and jobs
+    of dead instances) are claimed as far as the queue has room.
+    """
+
+    def __init__(self, gcp, store, workers: int, queue_size: int, lease_seconds: int, recovery_interval: float):
+        self.gcp = gcp
+        self.store = store
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.recovery_interval = recovery_interval
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._worker_tasks = []
+        self._recovery_task = None
+        self._finished = {}
+        self.stats = {"deferred": 0, "recovered": 0}
+
+    async def start(self):
+        """Starts the worker pool and the periodic recovery of stale jobs."""
+        if self._worker_tasks:
+            return
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._recovery_task = asyncio.create_task(self._recover_periodically())
+
+    async def stop(self):
+        tasks = self._worker_tasks + ([self._recovery_task] if self._recovery_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks, self._recovery_task = [], None
+
+    async def recover(self) -> int:
+        """Claims jobs whose lease has lapsed, as many as the queue has room for, and queues them."""
+        room = self._queue.maxsize - self._queue.qsize() if self._queue.maxsize else 100
+        if room <= 0:
+            return 0
+        jobs = await self._call_store(self.store.claim_stale, room)
+        for job in jobs:
+            print(f"Recovering export job {job['id']} for user {job['user_id']}")
+            self._enqueue(job)
+        self.stats["recovered"] += len(jobs)
+        return len(jobs)
+
+    async def submit(self, user_id: str, title: str, cover_letter: str, resume_summary: str) -> str:
+        """Queues a Google Doc export and returns its export ID."""
+        await self.start()
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "status": PENDING,
+            "title": title,
+            "cover_letter": cover_letter,
+            "resume_summary": resume_summary,
+            "document_url": None,
+            "error": None,
+            "created_at": time.time(),
+            "lease_expires_at": time.time() + self.lease_seconds,
+        }
+        if self._queue.full():
+            # Left for a recovery sweep, here or on another instance, rather than failing the request
+            job["lease_expires_at"] = time.time()
+            await self._call_store(self.store.create, job)
+            self.stats["deferred"] += 1
+            return job["id"]
+        await self._call_store(self.store.create, job)
+        if not self._enqueue(job):
+            # The queue filled up while the job was being stored.
+            await self._call_store(self.store.update, user_id, job["id"], {"lease_expires_at": time.time()})
+            self.stats["deferred"] += 1
+        return job["id"]
+
+    async def get_status(self, user_id: str, export_id: str):
+        """Returns the public view of an export job, or None if it is unknown."""
+        job = await self._call_store(self.store.get, user_id, export_id)
+        if job is None:
+            return None
+        return {key: job.get(key) for key in ("id", "status", "document_url", "error")}
+
+    async def wait_for(self, user_id: str, export_id: str, timeout: float):
+        """Waits up to `timeout` seconds for the export to finish, then returns its status."""
+        event = self._finished.get(export_id)
+        if event is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return await self.get_status(user_id, export_id)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "queued": self._queue.qsize(), "unfinished": len(self._finished),
+                "workers": len(self._worker_tasks)}
+
+    def _enqueue(self, job: dict) -> bool:
+        """Queues a job unless the queue is full, so a backlog cannot grow without bound. Returns whether it was queued."""
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        self._finished[job["id"]] = asyncio.Event()
+        return True
+
+    async def _recover_periodically(self):
+        while True:
+            try:
+                await self.recover()
+            except Exception as e:
+                print(f"Recovering stale export jobs failed: {e}")
+            await asyncio.sleep(self.recovery_interval)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            user_id, export_id = job["user_id"], job["id"]
+            try:
+                await self._call_store(self.store.update, user_id, export_id, {
+                    "status": RUNNING, "lease_expires_at": time.time() + self.lease_seconds
+                })
+                with telemetry.span("export.google_doc"):
+                    document_url = await self.gcp.create_google_doc_async(
+                        title=job["title"], cover_letter=job["cover_letter"], resume_summary=job["resume_summary"]
+                    )
+                await self._call_store(self.store.update, user_id, export_id, {"status": DONE, "document_url": document_url})
+            except Exception as e:
+                print(f"Export job {export_id} failed: {e}")
+                try:
+                    await self._call_store(self.store.update, user_id, export_id, {"status": FAILED, "error": str(e)})
+                except Exception as store_error:
+                    print(f"Could not record failure of export job {export_id}: {store_error}")
+            finally:
+                event = self._finished.pop(export_id, None)
+                if event is not None:
+                    event.set()
+                self._queue.task_done()
+
+    async def _call_store(self, func, *args):
+        if isinstance(self.store, InMemoryExportStore):
+            return func(*args)
+        return await run_blocking(func, *args)
+
+
+def create_export_store():
+    """Builds the export job store selected in config."""
+    backend = config.EXPORT_STORE_BACKEND
+    if backend == "memory":
+        return InMemoryExportStore(max_jobs=config.EXPORT_MAX_RETAINED_JOBS, lease_seconds=config.EXPORT_LEASE_SECONDS)
+    if backend == "firestore":
+        from .firebase_service import firebase_service
+        return FirestoreExportStore(firebase_service.db, lease_seconds=config.EXPORT_LEASE_SECONDS)
+    raise ValueError(f"Unsupported export store backend: {backend}")
+
+# A single, shared instance of the service, built on first use
+export_service = LazyService(lambda: ExportService(
+    gcp=gcp_service,
+    store=create_export_store(),
+    workers=config.EXPORT_WORKERS,
+    queue_size=config.EXPORT_QUEUE_MAX_SIZE,
+    lease_seconds=config.EXPORT_LEASE_SECONDS,
+    recovery_interval=config.EXPORT_RECOVERY_INTERVAL_SECONDS
+))
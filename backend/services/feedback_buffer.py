@@ -0,0 +1,154 @@
+import asyncio
+from collections import OrderedDict, deque
+import config
+from .firebase_service import firebase_service
+from .providers import LazyService
+from .telemetry import telemetry
+from .text_processing import content_hash
+
+
+class FeedbackBufferFullError(Exception):
+    """Raised when feedback arrives faster than it can be written for longer than the enqueue timeout."""
+
+
+class FeedbackBuffer:
+    """
+    Write-behind buffer for user feedback. `submit` only hashes and queues an entry;
+    a background task writes queued entries to Firestore in batches, when a full batch
+    is waiting or the flush interval passes, and `stop` writes whatever is left.
+
+    Entries refer to a generation's texts (job description, cover letter, résumé) by
+    the content hashes returned with it. Each text is stored once under its hash, when
+    feedback first refers to it: hashes this instance has stored are remembered, and
+    texts already in Firestore are not written again.
+    The queue is bounded: once full, `submit` waits for a flush to make room, and
+    raises FeedbackBufferFullError if none does in time.
+    """
+
+    def __init__(self, firebase, batch_size: int, flush_interval: float, max_pending: int,
+                 enqueue_timeout: float, known_content_max_entries: int):
+        self.firebase = firebase
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self.known_content_max_entries = known_content_max_entries
+        self._pending = deque()
+        self._known_content = OrderedDict()
+        self._flush_requested = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.stats = {"submitted": 0, "written": 0, "rejected": 0, "flushes": 0, "failed_flushes": 0,
+                      "content_written": 0, "content_skipped": 0}
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the background flushes and writes every entry still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Dropping {len(self._pending)} feedback entries that could not be written on shutdown: {e}")
+                self._pending.clear()
+
+    async def submit(self, feedback: str, content_hashes: dict[str, str], texts: dict[str, str]):
+        """
+        Queues a feedback entry for writing; returns as soon as it is queued.
+        `content_hashes` maps each of the generation's texts (e.g. "cover_letter") to the
+        hash it was returned with, and `texts` maps them to the texts themselves.
+        Raises ValueError if a text does not match its hash.
+        """
+        contents = {}
+        for name, text_hash in content_hashes.items():
+            if name not in texts or content_hash(texts[name]) != text_hash:
+                raise ValueError(f"The {name} text does not match the generation's content hash.")
+            contents[text_hash] = texts[name]
+
+        await self.start()
+        if len(self._pending) >= self.max_pending:
+            self._flush_requested.set()
+            try:
+                async with self._space:
+                    await asyncio.wait_for(
+                        self._space.wait_for(lambda: len(self._pending) < self.max_pending), self.enqueue_timeout
+                    )
+            except asyncio.TimeoutError:
+                self.stats["rejected"] += 1
+                telemetry.count("feedback_rejected")
+                raise FeedbackBufferFullError("Too much feedback is waiting to be saved; please try again shortly.")
+
+        entry = {"feedback": feedback, **{f"{name}_hash": text_hash for name, text_hash in content_hashes.items()}}
+        self._pending.append((entry, contents))
+        self.stats["submitted"] += 1
+        if len(self._pending) >= self.batch_size:
+            self._flush_requested.set()
+
+    async def flush(self):
+        """Writes up to one batch of queued entries. On failure they are put back at the front of the queue."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            items = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            entries, contents, text_count = [], {}, 0
+            for entry, texts in items:
+                entries.append(entry)
+                text_count += len(texts)
+                for text_hash, text in texts.items():
+                    if text_hash in self._known_content:
+                        self._known_content.move_to_end(text_hash)
+                    else:
+                        contents.setdefault(text_hash, text)
+            try:
+                with telemetry.span("feedback.flush"):
+                    written = await self.firebase.store_feedback_batch_async(entries, contents)
+            except Exception:
+                self._pending.extendleft(reversed(items))
+                self.stats["failed_flushes"] += 1
+                raise
+            for text_hash in contents:
+                self._known_content[text_hash] = True
+            while len(self._known_content) > self.known_content_max_entries:
+                self._known_content.popitem(last=False)
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(entries)
+            self.stats["content_written"] += written
+            self.stats["content_skipped"] += text_count - written
+        async with self._space:
+            self._space.notify_all()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "pending": len(self._pending)}
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                while self._pending:
+                    await self.flush()
+            except Exception as e:
+                # The entries stay queued and are retried on the next interval.
+                print(f"Writing {len(self._pending)} buffered feedback entries failed: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+
+# A single, shared instance of the service, built on first use
+feedback_buffer = LazyService(lambda: FeedbackBuffer(
+    firebase=firebase_service,
+    batch_size=config.FEEDBACK_BATCH_SIZE,
+    flush_interval=config.FEEDBACK_FLUSH_INTERVAL_SECONDS,
+    max_pending=config.FEEDBACK_MAX_PENDING,
+    enqueue_timeout=config.FEEDBACK_ENQUEUE_TIMEOUT_SECONDS,
+    known_content_max_entries=config.FEEDBACK_KNOWN_CONTENT_MAX_ENTRIES
+))
@@ -1,7 +1,16 @@
-import io
-import pypdf
-import docx
+import contextlib
+import mmap
+import tempfile
 from firebase_admin import initialize_app, firestore, storage
+from .executor import run_blocking
+import config
+from .text_extraction import DocumentTooLargeError
+from .text_store import create_text_store
+from .providers import LazyService
+from .telemetry import telemetry
+
+# Firestore rejects batched writes with more operations than this
+FIRESTORE_MAX_BATCH_WRITES = 500
 
 class FirebaseService:
     def __init__(self):
@@ -13,84 +22,467 @@ class FirebaseService:
             print("Firebase app already initialized.")
         self.db = firestore.client()
         self.storage = storage.bucket()
+        self.text_store = create_text_store(self.storage)
+        self.lexical_store = create_text_store(self.storage, prefix=config.LEXICAL_INDEX_PREFIX)
+
+    def _user_documents(self, user_id: str):
+        return self.db.collection("users").document(user_id).collection("user_documents")
+
+    def _content_index(self, user_id: str):
+        return self.db.collection("users").document(user_id).collection("content_index")
+
+    def _bump_corpus_version(self, batch, user_id: str):
+        """Adds a write to `batch` that marks the user's document set as changed."""
+        batch.set(self.db.collection("users").document(user_id), {"corpus_version": firestore.Increment(1)}, merge=True)
+
+    def get_corpus_version(self, user_id: str) -> int:
+        """
+        Returns a counter that changes whenever the user's document set changes.
+        Lets caches derived from the user's documents detect that they are stale.
+        """
+        doc = self.db.collection("users").document(user_id).get(field_paths=["corpus_version"])
+        return (doc.to_dict() or {}).get("corpus_version", 0) if doc.exists else 0
+
+    def new_document_id(self, user_id: str) -> str:
+        """Allocates an ID for a document that has not been written yet."""
+        return self._user_documents(user_id).document().id
 
-    def store_document_metadata(self, user_id: str, file_path: str, raw_text: str) -> str:
+    def store_document_metadata(self, user_id: str, file_path: str, raw_text: str,
+                                content_hash: str = None, document_id: str = None, chunk_ids: list[str] = (),
+                                lexical_shard: str = None, index_version: str = "",
+                                version_chunk_ids: dict = None, version_lexical_shards: dict = None) -> str:
         """
         Stores document metadata in a user's subcollection in Firestore.
-        Returns the ID of the new document.
+        The extracted text goes to the text store, as do the document's lexical index
+        shards if given; the metadata only holds references to them.
+        `chunk_ids` and `lexical_shard` are the document's vectors and shard in index version
+        `index_version`; `version_chunk_ids` and `version_lexical_shards` map any other
+        versions it was indexed into to theirs.
+        If `document_id` is given, that document is overwritten (e.g., a re-upload to the same path).
+        When a content hash is given, the document is registered as the owner of that content.
+        Returns the ID of the document.
         """
-        doc_ref = self.db.collection("users").document(user_id).collection("user_documents").document()
-        doc_ref.set({
+        doc_ref = self._user_documents(user_id).document(document_id) if document_id else self._user_documents(user_id).document()
+        text_ref = self.text_store.put(user_id, doc_ref.id, raw_text)
+        fields = {
             "original_storage_path": file_path,
-            "raw_text": raw_text,
+            "text_ref": text_ref,
+            "content_hash": content_hash,
+            "chunk_ids": list(chunk_ids),
+            "index_version": index_version,
             "created_at": firestore.SERVER_TIMESTAMP
-        })
+        }
+        if version_chunk_ids:
+            fields["version_chunk_ids"] = version_chunk_ids
+        if lexical_shard is not None:
+            fields["index_ref"] = self.lexical_store.put(user_id, doc_ref.id, lexical_shard, kind="json")
+        if version_lexical_shards:
+            fields["version_index_refs"] = {
+                version: self.lexical_store.put(user_id, doc_ref.id, shard, kind="json")
+                for version, shard in version_lexical_shards.items()
+            }
+        batch = self.db.batch()
+        batch.set(doc_ref, fields)
+        if content_hash:
+            batch.set(self._content_index(user_id).document(content_hash), {
+                "document_id": doc_ref.id,
+                "document_ids": [doc_ref.id],
+            })
+        self._bump_corpus_version(batch, user_id)
+        batch.commit()
         print(f"Document metadata stored in Firestore with ID: {doc_ref.id}")
         return doc_ref.id
 
-    def get_user_documents(self, user_id: str):
+    def link_duplicate_document(self, user_id: str, file_path: str, canonical_id: str,
+                                content_hash: str, document_id: str = None) -> str:
+        """
+        Stores metadata for a file whose bytes are identical to an already indexed document.
+        The new document only links to the canonical one; no text or vectors are duplicated.
+        Returns the ID of the linked document.
+        """
+        doc_ref = self._user_documents(user_id).document(document_id) if document_id else self._user_documents(user_id).document()
+        batch = self.db.batch()
+        batch.set(doc_ref, {
+            "original_storage_path": file_path,
+            "content_hash": content_hash,
+            "duplicate_of": canonical_id,
+            "created_at": firestore.SERVER_TIMESTAMP
+        })
+        batch.update(self._content_index(user_id).document(content_hash), {
+            "document_ids": firestore.ArrayUnion([doc_ref.id])
+        })
+        self._bump_corpus_version(batch, user_id)
+        batch.commit()
+        print(f"Document {doc_ref.id} linked to identical document {canonical_id}")
+        return doc_ref.id
+
+    def get_content_index_entry(self, user_id: str, content_hash: str):
+        """Returns the content index entry for a file hash, or None if the content is new."""
+        entry = self._content_index(user_id).document(content_hash).get()
+        return entry.to_dict() if entry.exists else None
+
+    def get_document_by_storage_path(self, user_id: str, file_path: str):
+        """Returns (document_id, metadata) for the document uploaded at `file_path`, or None."""
+        query = self._user_documents(user_id).where("original_storage_path", "==", file_path).limit(1)
+        for doc in query.stream():
+            return doc.id, doc.to_dict()
+        return None
+
+    @staticmethod
+    def chunk_ids_by_version(doc_data: dict) -> dict:
+        """
+        Returns the vector IDs a document owns in each index version, by version name.
+        `chunk_ids` belong to the version the document was ingested under, `index_version`
+        (missing on documents from before index versions, which are in the original
+        version ""); an index rebuild records the IDs it creates under `version_chunk_ids`.
+        """
+        chunk_ids = dict(doc_data.get("version_chunk_ids") or {})
+        if doc_data.get("chunk_ids"):
+            chunk_ids[doc_data.get("index_version", "")] = doc_data["chunk_ids"]
+        return chunk_ids
+
+    @staticmethod
+    def index_refs_by_version(doc_data: dict) -> dict:
+        """Returns a document's lexical index shard references by index version, like `chunk_ids_by_version`."""
+        index_refs = dict(doc_data.get("version_index_refs") or {})
+        if doc_data.get("index_ref"):
+            index_refs[doc_data.get("index_version", "")] = doc_data["index_ref"]
+        return index_refs
+
+    def release_content(self, user_id: str, document_id: str, doc_data: dict, transfer) -> dict:
+        """
+        Detaches a document from the content it holds, before it is deleted or overwritten.
+        If other documents link to the same content, one of them is promoted to own it:
+        the text is copied under the promoted document's ID, and `transfer(user_id, new_owner_id, doc_data)`
+        copies the vectors and lexical shard, returning the metadata fields that refer to the copies.
+        Returns the released document's vector IDs that no other document refers to, by index
+        version; after a promotion that is all of them, since the promoted document has copies.
+        """
+        content_hash = doc_data.get("content_hash")
+        if not content_hash:
+            # Documents indexed before content hashing own their vectors outright.
+            self._delete_text(doc_data)
+            return self.chunk_ids_by_version(doc_data)
+
+        entry_ref = self._content_index(user_id).document(content_hash)
+        entry = entry_ref.get()
+        remaining = [d for d in (entry.to_dict() or {}).get("document_ids", []) if d != document_id] if entry.exists else []
+
+        if doc_data.get("duplicate_of"):
+            # A link owns nothing; the canonical document keeps the vectors.
+            if entry.exists:
+                entry_ref.update({"document_ids": remaining})
+            return {}
+        if not remaining:
+            if entry.exists:
+                entry_ref.delete()
+            self._delete_text(doc_data)
+            return self.chunk_ids_by_version(doc_data)
+
+        # Stored objects and vector IDs are keyed by the owning document's ID, and the released
+        # document may be re-uploaded under the same ID, so the promoted document gets copies.
+        new_canonical_id = remaining[0]
+        fields = {
+            "text_ref": firestore.DELETE_FIELD,
+            "raw_text": doc_data.get("raw_text", firestore.DELETE_FIELD),
+            "index_ref": firestore.DELETE_FIELD,
+            "version_index_refs": firestore.DELETE_FIELD,
+            "version_chunk_ids": firestore.DELETE_FIELD,
+            "index_version": doc_data.get("index_version", ""),
+            "duplicate_of": firestore.DELETE_FIELD,
+            **transfer(user_id, new_canonical_id, doc_data),
+        }
+        if doc_data.get("text_ref"):
+            fields["text_ref"] = self.text_store.put(user_id, new_canonical_id, self.text_store.get(doc_data["text_ref"]))
+        batch = self.db.batch()
+        batch.update(self._user_documents(user_id).document(new_canonical_id), fields)
+        for linked_id in remaining[1:]:
+            batch.update(self._user_documents(user_id).document(linked_id), {"duplicate_of": new_canonical_id})
+        batch.update(entry_ref, {"document_id": new_canonical_id, "document_ids": remaining})
+        batch.commit()
+        self._delete_text(doc_data)
+        print(f"Promoted document {new_canonical_id} to own the content of {document_id}")
+        return self.chunk_ids_by_version(doc_data)
+
+    def _delete_text(self, doc_data: dict):
+        if doc_data.get("text_ref"):
+            self.text_store.delete(doc_data["text_ref"])
+        for index_ref in self.index_refs_by_version(doc_data).values():
+            self.lexical_store.delete(index_ref)
+
+    def get_lexical_index_refs(self, user_id: str, version: str) -> list[dict]:
+        """Returns the index version's lexical index shard references of the user's documents that own content."""
+        docs = self._user_documents(user_id).select(["index_ref", "index_version", "version_index_refs"]).stream()
+        refs = [self.index_refs_by_version(doc.to_dict() or {}).get(version) for doc in docs]
+        return [ref for ref in refs if ref]
+
+    def get_chunk_ids_by_hash(self, user_id: str, version: str) -> dict:
+        """
+        Returns the vector IDs the user's documents own in an index version, keyed by the
+        chunk content hash the IDs end in, so chunks any document shares can be reused.
+        """
+        docs = self._user_documents(user_id).select(["chunk_ids", "index_version", "version_chunk_ids"]).stream()
+        return {
+            chunk_id.split("#", 1)[1]: chunk_id
+            for doc in docs
+            for chunk_id in self.chunk_ids_by_version(doc.to_dict() or {}).get(version, [])
+        }
+
+    def get_document_text(self, user_id: str, document_id: str) -> str:
         """
-        Retrieves a list of documents for a given user.
+        Loads a document's extracted text, following a duplicate link to the document
+        that owns it. Documents not yet migrated still carry `raw_text` inline.
         """
-        docs_ref = self.db.collection("users").document(user_id).collection("user_documents")
-        docs = docs_ref.stream()
+        doc = self._user_documents(user_id).document(document_id).get(field_paths=["text_ref", "duplicate_of"])
+        if not doc.exists:
+            raise ValueError("Document not found")
+        doc_data = doc.to_dict()
+        if doc_data.get("duplicate_of"):
+            return self.get_document_text(user_id, doc_data["duplicate_of"])
+        if doc_data.get("text_ref"):
+            return self.text_store.get(doc_data["text_ref"])
+        legacy = self._user_documents(user_id).document(document_id).get(field_paths=["raw_text"])
+        return (legacy.to_dict() or {}).get("raw_text", "")
+
+    def migrate_raw_text(self, page_size: int = 100) -> int:
+        """
+        Moves inline `raw_text` from every user's document metadata into the text store.
+        Pages through the `user_documents` collection group in document order and commits
+        one batch per page, so it can be stopped and re-run at any time.
+        Returns the number of documents migrated.
+        """
+        migrated = 0
+        last_doc = None
+        while True:
+            query = self.db.collection_group("user_documents").order_by("__name__").limit(page_size)
+            if last_doc is not None:
+                query = query.start_after(last_doc)
+            docs = list(query.stream())
+            if not docs:
+                return migrated
+
+            batch = self.db.batch()
+            for doc in docs:
+                raw_text = (doc.to_dict() or {}).get("raw_text")
+                if raw_text is None:
+                    continue
+                user_id = doc.reference.parent.parent.id
+                text_ref = self.text_store.put(user_id, doc.id, raw_text)
+                batch.update(doc.reference, {"text_ref": text_ref, "raw_text": firestore.DELETE_FIELD})
+                migrated += 1
+            batch.commit()
+            last_doc = docs[-1]
+            print(f"Migrated text of {migrated} documents so far")
+
+    def iter_document_pages(self, page_size: int = 100, start_after: tuple = None):
+        """
+        Pages through every user's document metadata (the `user_documents` collection
+        group) in document order. Yields lists of (user_id, document_id, metadata);
+        `start_after` is the (user_id, document_id) of the last document already handled,
+        so an interrupted walk can be resumed.
+        """
+        cursor = self._user_documents(start_after[0]).document(start_after[1]).get() if start_after else None
+        while True:
+            query = self.db.collection_group("user_documents").order_by("__name__").limit(page_size)
+            if cursor is not None:
+                query = query.start_after(cursor)
+            docs = list(query.stream())
+            if not docs:
+                return
+            yield [(doc.reference.parent.parent.id, doc.id, doc.to_dict() or {}) for doc in docs]
+            cursor = docs[-1]
+
+    def store_lexical_shard(self, user_id: str, document_id: str, lexical_shard: str, version: str = None):
+        """
+        Stores a lexical index shard for an existing document and references it from the metadata.
+        `version` names the shard's index version if it is not the one the document was ingested under.
+        """
+        index_ref = self.lexical_store.put(user_id, document_id, lexical_shard, kind="json")
+        field = "index_ref" if version is None else f"version_index_refs.{version}"
+        self.update_document_metadata(user_id, document_id, {field: index_ref})
+
+    def store_version_chunk_ids(self, version: str, chunk_ids: list[tuple], checkpoint: dict):
+        """
+        Records the vector IDs and lexical index shard documents got in index version `version`,
+        given as (user_id, document_id, chunk_ids, lexical_shard or None), together with the
+        rebuild's checkpoint, in one batch.
+        """
+        batch = self.db.batch()
+        for user_id, document_id, ids, lexical_shard in chunk_ids:
+            fields = {f"version_chunk_ids.{version}": ids}
+            if lexical_shard is not None:
+                fields[f"version_index_refs.{version}"] = self.lexical_store.put(user_id, document_id, lexical_shard, kind="json")
+            batch.update(self._user_documents(user_id).document(document_id), fields)
+        batch.set(self.db.collection("vector_index_builds").document(version),
+                  {**checkpoint, "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+        batch.commit()
+
+    def get_reindex_checkpoint(self, version: str):
+        """Returns the checkpoint of the rebuild of index version `version`, or None."""
+        doc = self.db.collection("vector_index_builds").document(version).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_vector_index_state(self):
+        """Returns which index versions are active and being built, or None if nothing was recorded yet."""
+        doc = self.db.collection("vector_index").document("state").get()
+        return doc.to_dict() if doc.exists else None
+
+    def update_vector_index_state(self, update) -> dict:
+        """
+        Replaces the index version state with `update(current state or None)` in a
+        transaction, so concurrent changes cannot interleave. Returns the new state.
+        """
+        state_ref = self.db.collection("vector_index").document("state")
+
+        @firestore.transactional
+        def apply(transaction):
+            snapshot = state_ref.get(transaction=transaction)
+            current = snapshot.to_dict() if snapshot.exists else None
+            new_state = update(current)
+            if new_state is not current:
+                transaction.set(state_ref, new_state)
+            return new_state
+
+        return apply(self.db.transaction())
+
+    def update_document_metadata(self, user_id: str, document_id: str, fields: dict):
+        """Merges the given fields into an existing document's metadata."""
+        self._user_documents(user_id).document(document_id).update(fields)
+
+    def get_user_documents(self, user_id: str, limit: int, start_after: str = None):
+        """
+        Retrieves one page of a user's documents, newest first.
+        Only the listed fields are read, so `raw_text` is never transferred.
+        `start_after` is the ID of the last document on the previous page.
+        Returns (documents, ID to pass as `start_after` for the next page or None).
+        """
+        query = (self._user_documents(user_id)
+                 .select(["original_storage_path", "created_at"])
+                 .order_by("created_at", direction=firestore.Query.DESCENDING))
+        if start_after:
+            cursor = self._user_documents(user_id).document(start_after).get(field_paths=["created_at"])
+            if not cursor.exists:
+                raise ValueError("Invalid cursor")
+            query = query.start_after(cursor)
+
+        # One extra document tells us whether another page follows.
+        docs = list(query.limit(limit + 1).stream())
         user_documents = []
-        for doc in docs:
+        for doc in docs[:limit]:
             doc_data = doc.to_dict()
             user_documents.append({
                 "id": doc.id,
                 "original_storage_path": doc_data.get("original_storage_path"),
                 "created_at": doc_data.get("created_at").isoformat()
             })
-        return user_documents
+        next_cursor = docs[limit - 1].id if len(docs) > limit else None
+        return user_documents, next_cursor
 
-    def delete_document(self, user_id: str, document_id: str):
+    def delete_document(self, user_id: str, document_id: str, transfer):
         """
         Deletes a document's metadata from Firestore and the file from Storage.
+        `transfer` is passed on to `release_content`.
+        Returns the vector IDs that are no longer referenced by any document, by index version.
         """
-        doc_ref = self.db.collection("users").document(user_id).collection("user_documents").document(document_id)
+        doc_ref = self._user_documents(user_id).document(document_id)
         doc = doc_ref.get()
         if not doc.exists:
             raise ValueError("Document not found")
 
         # Delete the file from Cloud Storage
-        storage_path = doc.to_dict().get("original_storage_path")
+        doc_data = doc.to_dict()
+        storage_path = doc_data.get("original_storage_path")
         if storage_path:
             blob = self.storage.blob(storage_path)
             blob.delete()
             print(f"Deleted {storage_path} from Cloud Storage")
 
+        orphaned_chunk_ids = self.release_content(user_id, document_id, doc_data, transfer)
+
         # Delete the Firestore document
-        doc_ref.delete()
+        batch = self.db.batch()
+        batch.delete(doc_ref)
+        self._bump_corpus_version(batch, user_id)
+        batch.commit()
         print(f"Deleted document {document_id} from Firestore")
+        return orphaned_chunk_ids
 
-    def store_feedback(self, feedback: str, job_description: str, generated_text: str):
+    def store_feedback_batch(self, entries: list[dict], contents: dict[str, str]) -> int:
         """
-        Stores user feedback in a dedicated collection.
+        Stores user feedback entries in a dedicated collection, using batched writes.
+        Entries refer to a generation's texts by content hash; `contents` maps hashes that
+        may not be stored yet to their text. Texts already in `generation_content` are
+        not written again. The content is written before the feedback that refers to it.
+        Returns the number of texts written.
         """
-        self.db.collection("generation_feedback").add({
-            "feedback": feedback,
-            "job_description": job_description,
-            "generated_text": generated_text,
-            "created_at": firestore.SERVER_TIMESTAMP
+        refs = {text_hash: self.db.collection("generation_content").document(text_hash) for text_hash in contents}
+        # Reading only a small field tells which texts exist without transferring them.
+        stored = {snapshot.id for snapshot in self.db.get_all(list(refs.values()), field_paths=["created_at"])
+                  if snapshot.exists} if refs else set()
+        writes = [
+            (ref, {"text": contents[text_hash], "created_at": firestore.SERVER_TIMESTAMP})
+            for text_hash, ref in refs.items() if text_hash not in stored
+        ]
+        content_written = len(writes)
+        writes.extend(
+            (self.db.collection("generation_feedback").document(),
+             {**entry, "created_at": firestore.SERVER_TIMESTAMP})
+            for entry in entries
+        )
+        for start in range(0, len(writes), FIRESTORE_MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for ref, data in writes[start:start + FIRESTORE_MAX_BATCH_WRITES]:
+                batch.set(ref, data)
+            batch.commit()
+        return content_written
+
+    def get_job_scout_checkpoint(self, account: str):
+        """Returns the job scout's last processed Gmail history checkpoint for an account, or None."""
+        doc = self.db.collection("job_scout_state").document(account).get()
+        return doc.to_dict() if doc.exists else None
+
+    def save_job_scout_checkpoint(self, account: str, history_id: str):
+        """Records the Gmail historyId up to which the job scout has processed an account's mail."""
+        self.db.collection("job_scout_state").document(account).set({
+            "history_id": history_id,
+            "updated_at": firestore.SERVER_TIMESTAMP
         })
 
-    def download_file_from_storage(self, bucket_name: str, file_path: str) -> bytes:
-        """Downloads a file from Firebase Cloud Storage."""
-        bucket = storage.bucket(bucket_name)
-        blob = bucket.blob(file_path)
-        return blob.download_as_bytes()
-
-    def extract_text_from_file(self, file_bytes: bytes, content_type: str) -> str:
-        """Extracts raw text from PDF or DOCX file bytes."""
-        if content_type == "application/pdf":
-            pdf_reader = pypdf.PdfReader(io.BytesIO(file_bytes))
-            return "".join(page.extract_text() for page in pdf_reader.pages)
-        elif content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            doc = docx.Document(io.BytesIO(file_bytes))
-            return "\n".join(para.text for para in doc.paragraphs)
-        else:
-            raise ValueError(f"Unsupported file type for text extraction: {content_type}")
+    async def get_user_documents_async(self, user_id: str, limit: int, start_after: str = None):
+        """Async counterpart of `get_user_documents`, run on the shared service executor."""
+        return await run_blocking(self.get_user_documents, user_id, limit, start_after)
+
+    async def get_corpus_version_async(self, user_id: str) -> int:
+        """Async counterpart of `get_corpus_version`, run on the shared service executor."""
+        return await run_blocking(self.get_corpus_version, user_id)
+
+    async def store_feedback_batch_async(self, entries: list[dict], contents: dict[str, str]) -> int:
+        """Async counterpart of `store_feedback_batch`, run on the shared service executor."""
+        return await run_blocking(self.store_feedback_batch, entries, contents)
+
+    @contextlib.contextmanager
+    def open_file_from_storage(self, bucket_name: str, file_path: str):
+        """
+        Downloads a file into a temporary file and yields (memory-mapped contents, path).
+        The contents are paged in from disk on demand instead of held as one bytes copy,
+        and files over the extraction size cap are rejected before downloading.
+        """
+        blob = storage.bucket(bucket_name).blob(file_path)
+        blob.reload()
+        if blob.size is not None and blob.size > config.EXTRACTION_MAX_FILE_BYTES:
+            raise DocumentTooLargeError(
+                f"File is {blob.size} bytes; the limit is {config.EXTRACTION_MAX_FILE_BYTES} bytes"
+            )
+        with tempfile.NamedTemporaryFile(suffix=".upload") as f:
+            with telemetry.span("ingest.download", bytes=blob.size or 0):
+                blob.download_to_file(f)
+                f.flush()
+            if f.tell() == 0:
+                # Empty files cannot be memory-mapped.
+                yield b"", f.name
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                yield contents, f.name
 
     @staticmethod
     def get_user_id_from_path(file_path: str) -> str:
@@ -103,5 +495,5 @@ class FirebaseService:
             return parts[1]
         raise ValueError(f"Could not extract user ID from file path: {file_path}")
 
-# A single, shared instance of the service
-firebase_service = FirebaseService()
+# A single, shared instance of the service, built on first use
+firebase_service = LazyService(FirebaseService)
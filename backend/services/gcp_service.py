@@ -1,33 +1,39 @@
-import os
-import json
 import datetime
-from google.cloud import secretmanager
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from . import config
+import hashlib
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parseaddr
+from typing import TYPE_CHECKING
+from googleapiclient.errors import HttpError
+import config
+from .executor import run_blocking
+from .google_clients import CredentialManager, ServiceClientPool
+from .job_alert_parser import parse_job_alert
+from .providers import LazyService
+from .telemetry import telemetry
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 class GCPService:
     def __init__(self, project_id: str):
         if not project_id:
             raise ValueError("GCP_PROJECT_ID environment variable is not set.")
         self.project_id = project_id
+        self.credential_manager = CredentialManager(project_id, config.OAUTH_SECRET_NAME)
+        self.clients = ServiceClientPool(self.credential_manager)
+        # Long-lived, so the per-thread clients in `clients` are reused across runs.
+        self._batch_pool = ThreadPoolExecutor(max_workers=config.JOB_SCOUT_MAX_PARALLEL_BATCHES,
+                                              thread_name_prefix="google-api-batch")
 
-    def get_oauth_credentials(self) -> Credentials:
-        """Fetches stored OAuth credentials from Google Secret Manager."""
-        client = secretmanager.SecretManagerServiceClient()
-        name = f"projects/{self.project_id}/secrets/{config.OAUTH_SECRET_NAME}/versions/latest"
-        try:
-            response = client.access_secret_version(request={"name": name})
-            creds_json = response.payload.data.decode("UTF-8")
-            return Credentials.from_authorized_user_info(json.loads(creds_json))
-        except Exception as e:
-            print(f"FATAL: Could not access secret. Ensure it exists and the service account has the 'Secret Manager Secret Accessor' role. Error: {e}")
-            raise
+    def get_oauth_credentials(self) -> "Credentials":
+        """Returns the stored OAuth credentials, cached and refreshed before they expire."""
+        return self.credential_manager.get_credentials()
 
     def create_google_doc(self, title: str, cover_letter: str, resume_summary: str) -> str:
         """Creates a Google Doc with the provided content and returns its URL."""
-        creds = self.get_oauth_credentials()
-        docs_service = build('docs', 'v1', credentials=creds)
+        docs_service = self.clients.get('docs', 'v1')
 
         # Create the document
         doc = docs_service.documents().create(body={'title': title}).execute()
@@ -50,30 +56,244 @@ class GCPService:
         print(f"Successfully created Google Doc: {doc_url}")
         return doc_url
 
-    def run_job_scout(self):
-        """Scans Gmail for job alerts and creates Calendar reminders."""
-        creds = self.get_oauth_credentials()
-        gmail_service = build('gmail', 'v1', credentials=creds)
-        calendar_service = build('calendar', 'v1', credentials=creds)
-
-        processed_count = 0
-        for sender in config.JOB_SCOUT_SENDERS:
-            results = gmail_service.users().messages().list(userId='me', q=f"is:unread from:{sender}").execute()
-            messages = results.get('messages', [])
-
-            for message in messages:
-                subject = "Apply for Job (from email alert)"
-                event_date = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
-                event = {
-                    'summary': subject,
-                    'start': {'date': event_date},
-                    'end': {'date': event_date},
-                }
-                calendar_service.events().insert(calendarId='primary', body=event).execute()
-                gmail_service.users().messages().modify(userId='me', id=message['id'], body={'removeLabelIds': ['UNREAD']}).execute()
-                processed_count += 1
-
-        print(f"Job scout finished. Processed {processed_count} emails.")
-
-# A single, shared instance of the service
-gcp_service = GCPService(project_id=config.GCP_PROJECT_ID)
+    async def create_google_doc_async(self, title: str, cover_letter: str, resume_summary: str) -> str:
+        """Async counterpart of `create_google_doc`, run on the shared service executor."""
+        return await run_blocking(self.create_google_doc, title, cover_letter, resume_summary)
+
+    def run_job_scout(self, checkpoints=None):
+        """
+        Creates a Calendar reminder for each new job alert in Gmail.
+        With a checkpoint store (e.g. `firebase_service`), only messages added since the
+        last run's Gmail historyId are considered, so an unchanged mailbox costs a single
+        history call. Without one, or when the checkpoint has expired, unread alerts are
+        found with a full search. Events get an ID derived from the message ID, so a rerun
+        after a crash never creates a duplicate reminder. Messages that fail permanently
+        (e.g. deleted before they were fetched) are skipped; only transient failures
+        hold the checkpoint back.
+        """
+        gmail_service = self.clients.get('gmail', 'v1')
+        account = config.OAUTH_SECRET_NAME
+        checkpoint = checkpoints.get_job_scout_checkpoint(account) if checkpoints else None
+
+        message_ids, history_id = None, None
+        with telemetry.span("job_scout.list_messages") as span:
+            if checkpoint:
+                message_ids, history_id = self._list_added_messages(gmail_service, checkpoint["history_id"])
+            if message_ids is None:
+                # Read the current historyId before searching so nothing arriving mid-search is skipped.
+                history_id = gmail_service.users().getProfile(userId='me').execute(
+                    num_retries=config.GOOGLE_API_MAX_RETRIES)['historyId']
+                message_ids = self._search_unread_alerts(gmail_service)
+            span.set("messages", len(message_ids))
+
+        with telemetry.span("job_scout.process_alerts"):
+            processed_ids, failed_count, skipped_count = self._process_alerts(
+                gmail_service, message_ids, filter_senders=checkpoint is not None)
+        telemetry.count("job_scout_alerts", len(processed_ids), result="processed")
+        telemetry.count("job_scout_alerts", failed_count, result="failed")
+        telemetry.count("job_scout_alerts", skipped_count, result="skipped")
+
+        # On a transient failure the checkpoint stays put; the next run retries and event IDs prevent duplicates.
+        if checkpoints and failed_count == 0 and history_id and (not checkpoint or history_id != checkpoint["history_id"]):
+            checkpoints.save_job_scout_checkpoint(account, history_id)
+        print(f"Job scout finished. Processed {len(processed_ids)} emails, {failed_count} failed, {skipped_count} skipped.")
+
+    def _search_unread_alerts(self, gmail_service) -> list[str]:
+        """Finds all unread alerts from the configured senders with one paginated search."""
+        senders = " OR ".join(config.JOB_SCOUT_SENDERS)
+        query = f"is:unread from:({senders})"
+
+        message_ids = []
+        page_token = None
+        while True:
+            results = gmail_service.users().messages().list(
+                userId='me', q=query, pageToken=page_token, maxResults=500
+            ).execute(num_retries=config.GOOGLE_API_MAX_RETRIES)
+            message_ids.extend(message['id'] for message in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return message_ids
+
+    def _list_added_messages(self, gmail_service, start_history_id: str):
+        """
+        Returns (IDs of messages added anywhere in the mailbox since `start_history_id`,
+        the mailbox's current historyId), or (None, None) if Gmail no longer has history
+        that old. Not limited to the inbox: like the full search, it has to find alerts
+        that filters file under other labels.
+        """
+        message_ids = []
+        page_token = None
+        while True:
+            try:
+                results = gmail_service.users().history().list(
+                    userId='me', startHistoryId=start_history_id, historyTypes=['messageAdded'],
+                    pageToken=page_token, maxResults=500
+                ).execute(num_retries=config.GOOGLE_API_MAX_RETRIES)
+            except HttpError as e:
+                if e.resp.status == 404:
+                    print("Gmail history checkpoint expired; falling back to a full search.")
+                    return None, None
+                raise
+            for record in results.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    if added['message']['id'] not in message_ids:
+                        message_ids.append(added['message']['id'])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return message_ids, results['historyId']
+
+    def _process_alerts(self, gmail_service, message_ids: list[str], filter_senders: bool):
+        """
+        Fetches the given messages, creates their reminders and marks them read.
+        History results include every new message, so with `filter_senders` only the
+        From headers and labels are fetched first, and messages the full search would
+        not find (other senders, read, spam or trash) are skipped.
+        Returns (IDs of messages with a reminder, number of requests that failed transiently,
+        number that failed permanently and will not be retried).
+        """
+        failures = {}
+        if filter_senders and message_ids:
+            headers, header_failures = self._run_batched(
+                'gmail', 'v1', [(message_id, message_id) for message_id in message_ids],
+                lambda service, message_id: service.users().messages().get(
+                    userId='me', id=message_id, format='metadata', metadataHeaders=['From']),
+            )
+            failures.update(header_failures)
+            message_ids = [message_id for message_id, message in headers.items() if _matches_alert_search(message)]
+        if not message_ids:
+            return [], *_count_failures(failures)
+
+        messages, fetch_failures = self._run_batched(
+            'gmail', 'v1', [(message_id, message_id) for message_id in message_ids],
+            lambda service, message_id: service.users().messages().get(userId='me', id=message_id, format='full'),
+        )
+
+        events = [(message_id, self._build_job_event(message)) for message_id, message in messages.items()]
+        created, insert_failures = self._run_batched(
+            'calendar', 'v3', events,
+            lambda service, event: service.events().insert(calendarId='primary', body=event),
+            conflict_ok=True,
+        )
+
+        # Only alerts that now have a reminder are marked as read; the rest are retried next run.
+        processed_ids = list(created)
+        for start in range(0, len(processed_ids), 1000):
+            gmail_service.users().messages().batchModify(
+                userId='me', body={'ids': processed_ids[start:start + 1000], 'removeLabelIds': ['UNREAD']}
+            ).execute(num_retries=config.GOOGLE_API_MAX_RETRIES)
+        failures.update(fetch_failures)
+        failures.update(insert_failures)
+        return processed_ids, *_count_failures(failures)
+
+    @staticmethod
+    def _build_job_event(message: dict) -> dict:
+        """Builds an all-day Calendar event reminding the user to apply before the job closes."""
+        alert = parse_job_alert(message)
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        event_date = tomorrow
+        if alert["closing_date"]:
+            event_date = max(tomorrow, alert["closing_date"] - datetime.timedelta(days=config.JOB_SCOUT_REMINDER_DAYS_BEFORE))
+
+        summary = f"Apply: {alert['title'] or 'Job from email alert'}"
+        if alert["employer"]:
+            summary += f" ({alert['employer']})"
+        description_lines = []
+        if alert["closing_date"]:
+            description_lines.append(f"Applications close {alert['closing_date'].isoformat()}.")
+        if alert["url"]:
+            description_lines.append(alert["url"])
+        return {
+            # Calendar event IDs allow base32hex characters, which include every hex digit.
+            'id': hashlib.sha1(message['id'].encode()).hexdigest(),
+            'summary': summary,
+            'description': "\n".join(description_lines),
+            'start': {'date': event_date.isoformat()},
+            # All-day events end on the following (exclusive) date.
+            'end': {'date': (event_date + datetime.timedelta(days=1)).isoformat()},
+        }
+
+    def _run_batched(self, api: str, version: str, items: list, make_request, conflict_ok: bool = False):
+        """
+        Executes one API request per (key, item) pair using batch requests of
+        GOOGLE_API_BATCH_SIZE, with up to JOB_SCOUT_MAX_PARALLEL_BATCHES batches in flight.
+        With `conflict_ok`, a 409 (the resource already exists) counts as success.
+        Returns ({key: response}, {key: error}).
+        """
+        size = config.GOOGLE_API_BATCH_SIZE
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        results, failures = {}, {}
+        with telemetry.span(f"google_api.{api}_batches", requests=len(items)):
+            for chunk_results, chunk_failures in self._batch_pool.map(
+                lambda chunk: self._execute_batch_with_backoff(api, version, chunk, make_request, conflict_ok), chunks
+            ):
+                results.update(chunk_results)
+                failures.update(chunk_failures)
+        for key, error in failures.items():
+            print(f"{api} request for {key} failed: {error}")
+        return results, failures
+
+    def _execute_batch_with_backoff(self, api: str, version: str, items: list, make_request, conflict_ok: bool):
+        """Sends one batch, retrying only the sub-requests that were rate limited or hit a server error."""
+        # Each worker thread gets its own client, since httplib2 transports are not thread-safe.
+        service = self.clients.get(api, version)
+        pending = dict(items)
+        results, failures = {}, {}
+        for attempt in range(config.GOOGLE_API_MAX_RETRIES + 1):
+            retryable = {}
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = response
+                elif conflict_ok and isinstance(exception, HttpError) and exception.resp.status == 409:
+                    results[request_id] = None
+                elif _is_retryable(exception) and attempt < config.GOOGLE_API_MAX_RETRIES:
+                    retryable[request_id] = exception
+                else:
+                    failures[request_id] = exception
+
+            batch = service.new_batch_http_request(callback=callback)
+            for key, item in pending.items():
+                batch.add(make_request(service, item), request_id=key)
+            batch.execute()
+
+            if not retryable:
+                break
+            pending = {key: pending[key] for key in retryable}
+            delay = min(32, 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"{len(pending)} {api} requests rate limited; retrying in {delay:.1f}s")
+            time.sleep(delay)
+        return results, failures
+
+def _header(message: dict, name: str) -> str:
+    for header in message.get('payload', {}).get('headers', []):
+        if header['name'].lower() == name.lower():
+            return header['value']
+    return ""
+
+def _matches_alert_search(message: dict) -> bool:
+    """Whether a message fetched with its From header and labels matches `_search_unread_alerts`' query."""
+    labels = set(message.get('labelIds', []))
+    senders = {sender.lower() for sender in config.JOB_SCOUT_SENDERS}
+    # Gmail searches leave out spam and trash unless asked to include them.
+    return ('UNREAD' in labels and not labels & {'SPAM', 'TRASH'}
+            and parseaddr(_header(message, 'From'))[1].lower() in senders)
+
+def _count_failures(failures: dict) -> tuple[int, int]:
+    """Splits failed requests into (transient, permanent) counts."""
+    permanent = sum(1 for error in failures.values() if _is_permanent(error))
+    return len(failures) - permanent, permanent
+
+def _is_permanent(error: Exception) -> bool:
+    """True for client errors that retrying will not fix, e.g. a message deleted before it was fetched."""
+    return isinstance(error, HttpError) and 400 <= error.resp.status < 500 and not _is_retryable(error)
+
+def _is_retryable(error: Exception) -> bool:
+    """True for rate-limit and transient server errors from Google APIs."""
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status in (429, 500, 502, 503, 504):
+        return True
+    return error.resp.status == 403 and "ratelimitexceeded" in str(error).lower()
+
+# A single, shared instance of the service, built on first use
+gcp_service = LazyService(lambda: GCPService(project_id=config.GCP_PROJECT_ID))
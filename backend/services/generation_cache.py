@@ -0,0 +1,65 @@
+import hashlib
+import time
+from collections import OrderedDict
+import config
+from .text_processing import normalize_text
+
+class GenerationCache:
+    """
+    In-process LRU cache of finished generations with a TTL.
+    Entries are keyed on everything that determines the prompt and the model output,
+    and are dropped for a user as soon as their corpus version changes.
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._corpus_versions = {}
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(user_id: str, job_description: str, chunk_ids: list[str], prompt_version: str, model: str) -> tuple:
+        job_hash = hashlib.sha256(normalize_text(job_description).encode("utf-8")).hexdigest()
+        return (user_id, job_hash, tuple(sorted(chunk_ids)), prompt_version, model)
+
+    def get(self, key: tuple, corpus_version: int):
+        self._check_corpus_version(key[0], corpus_version)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            self._entries.pop(key, None)
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "size": len(self._entries), "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+    def put(self, key: tuple, corpus_version: int, result: dict):
+        self._check_corpus_version(key[0], corpus_version)
+        self._entries[key] = (result, time.time() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: str):
+        """Drops every cached generation for the user."""
+        for key in [key for key in self._entries if key[0] == user_id]:
+            del self._entries[key]
+        self.stats["invalidations"] += 1
+
+    def _check_corpus_version(self, user_id: str, corpus_version: int):
+        known = self._corpus_versions.get(user_id)
+        if known is not None and known != corpus_version:
+            self.invalidate_user(user_id)
+        self._corpus_versions[user_id] = corpus_version
+
+# A single, shared instance of the cache
+generation_cache = GenerationCache(
+    max_entries=config.GENERATION_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.GENERATION_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,195 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+import config
+from .telemetry import telemetry
+
+
+class SchedulerBusyError(Exception):
+    """Raised when the generation wait queue is full."""
+
+
+class _Waiter:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.granted = asyncio.get_running_loop().create_future()
+        self.changed = asyncio.Event()
+
+
+class _Broadcast:
+    """Fans the events of one generation out to every request that joined it, from the start."""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Condition()
+        self.task = None
+
+    async def publish(self, event: tuple):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def close(self, error: Exception = None):
+        async with self._changed:
+            self.done, self.error = True, error
+            self._changed.notify_all()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.done)
+                events, done, error = self.events[index:], self.done, self.error
+            for event in events:
+                yield event
+            index += len(events)
+            if done and index == len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+
+class GenerationScheduler:
+    """
+    Admission control in front of the model. A generation starts only when a global
+    slot, a slot for its user and a rate-limit token are all free; until then it
+    waits in a bounded FIFO queue and its requests are told their queue position.
+    Requests with the same key while one is in flight join it instead of starting
+    another, and receive every event from the beginning.
+
+    `submit` yields (event, data) pairs: ("queue", {"position": n}) while waiting,
+    then whatever the `produce` async generator yields.
+    A `rate_per_minute` of 0 turns the rate limit off.
+    """
+
+    def __init__(self, max_concurrent: int, max_per_user: int, rate_per_minute: float, burst: int, max_queue: int):
+        if rate_per_minute < 0:
+            raise ValueError(f"The generation rate must not be negative, got {rate_per_minute}")
+        if rate_per_minute and burst < 1:
+            raise ValueError(f"The generation burst must be at least 1 with a rate limit, got {burst}")
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self.max_queue = max_queue
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._refill_timer = None
+        self._running = 0
+        self._running_by_user = defaultdict(int)
+        self._waiters = deque()
+        self._inflight = {}
+        self.stats = {"started": 0, "coalesced": 0, "rejected": 0, "queued": 0}
+
+    async def submit(self, key, user_id: str, produce):
+        broadcast = self._inflight.get(key)
+        if broadcast is not None:
+            self.stats["coalesced"] += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise SchedulerBusyError("Too many generations are waiting; please try again shortly.")
+            # Queued right away, so requests arriving together see each other against the queue limit.
+            waiter = _Waiter(user_id)
+            self._waiters.append(waiter)
+            self._dispatch()
+            broadcast = self._inflight[key] = _Broadcast()
+            # The generation runs on its own, so it finishes for the others if one client disconnects.
+            broadcast.task = asyncio.create_task(self._run(key, waiter, produce, broadcast))
+        async for event in broadcast.subscribe():
+            yield event
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "running": self._running, "waiting": len(self._waiters), "in_flight": len(self._inflight)}
+
+    async def _run(self, key, waiter: _Waiter, produce, broadcast: _Broadcast):
+        user_id = waiter.user_id
+        error = None
+        acquired = False
+        try:
+            with telemetry.span("generate.queue_wait"):
+                await self._acquire(waiter, broadcast)
+            acquired = True
+            self.stats["started"] += 1
+            async for event in produce():
+                await broadcast.publish(event)
+        except Exception as e:
+            error = e
+        finally:
+            if acquired:
+                self._release(user_id)
+            del self._inflight[key]
+            await broadcast.close(error)
+
+    async def _acquire(self, waiter: _Waiter, broadcast: _Broadcast):
+        if not waiter.granted.done():
+            self.stats["queued"] += 1
+        try:
+            last_position = None
+            while not waiter.granted.done():
+                position = self._waiters.index(waiter) + 1
+                if position != last_position:
+                    await broadcast.publish(("queue", {"position": position}))
+                    last_position = position
+                waiter.changed.clear()
+                changed = asyncio.ensure_future(waiter.changed.wait())
+                await asyncio.wait([waiter.granted, changed], return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._dispatch()
+            elif waiter.granted.done():
+                self._release(waiter.user_id)
+            raise
+
+    def _release(self, user_id: str):
+        self._running -= 1
+        self._running_by_user[user_id] -= 1
+        if not self._running_by_user[user_id]:
+            del self._running_by_user[user_id]
+        self._dispatch()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_second)
+        self._refilled_at = now
+
+    def _dispatch(self):
+        """Starts as many waiting generations as the limits allow, oldest first."""
+        self._refill()
+        for waiter in list(self._waiters):
+            if self._running >= self.max_concurrent:
+                break
+            if self._running_by_user.get(waiter.user_id, 0) >= self.max_per_user:
+                # Skipped, not blocking: other users' requests behind it may still start.
+                continue
+            if self.rate_per_second:
+                if self._tokens < 1:
+                    self._schedule_refill()
+                    break
+                self._tokens -= 1
+            self._running += 1
+            self._running_by_user[waiter.user_id] += 1
+            self._waiters.remove(waiter)
+            waiter.granted.set_result(None)
+        for waiter in self._waiters:
+            waiter.changed.set()
+
+    def _schedule_refill(self):
+        if self._refill_timer is not None and not self._refill_timer.cancelled():
+            self._refill_timer.cancel()
+        delay = (1 - self._tokens) / self.rate_per_second
+        self._refill_timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+
+# A single, shared instance of the scheduler
+generation_scheduler = GenerationScheduler(
+    max_concurrent=config.GENERATION_MAX_CONCURRENT,
+    max_per_user=config.GENERATION_MAX_PER_USER,
+    rate_per_minute=config.GENERATION_RATE_PER_MINUTE,
+    burst=config.GENERATION_RATE_BURST,
+    max_queue=config.GENERATION_MAX_QUEUE
+)
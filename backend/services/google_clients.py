@@ -0,0 +1,109 @@
+import datetime
+import json
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+# The Google client libraries (Secret Manager in particular) are slow to import, so they
+# are imported in the methods that use them; only code that calls a Google API loads them.
+
+class CredentialManager:
+    """
+    Caches the job-scout OAuth credentials decoded from Secret Manager and refreshes
+    the access token shortly before it expires. Refreshes are single-flight: one
+    thread refreshes while the others wait for it and then reuse the result.
+    """
+
+    def __init__(self, project_id: str, secret_name: str, refresh_margin_seconds: int = 300):
+        self.secret_version = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin_seconds)
+        self._secret_client = None
+        self._credentials = None
+        # Incremented whenever a new credentials object replaces the old one
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def get_credentials(self) -> "Credentials":
+        """Returns valid credentials, loading or refreshing them only when needed."""
+        credentials = self._credentials
+        if credentials is not None and not self._needs_refresh(credentials):
+            return credentials
+
+        with self._lock:
+            # Another thread may have refreshed while this one waited for the lock.
+            if self._credentials is None:
+                self._load()
+            elif self._needs_refresh(self._credentials):
+                self._refresh()
+            return self._credentials
+
+    def _needs_refresh(self, credentials: "Credentials") -> bool:
+        if not credentials.token:
+            return True
+        if credentials.expiry is None:
+            return False
+        # google-auth keeps expiry as a naive UTC datetime.
+        return datetime.datetime.utcnow() >= credentials.expiry - self.refresh_margin
+
+    def _load(self):
+        from google.auth.transport.requests import Request
+        from google.cloud import secretmanager
+        from google.oauth2.credentials import Credentials
+
+        if self._secret_client is None:
+            self._secret_client = secretmanager.SecretManagerServiceClient()
+        try:
+            response = self._secret_client.access_secret_version(request={"name": self.secret_version})
+            creds_json = response.payload.data.decode("UTF-8")
+        except Exception as e:
+            print(f"FATAL: Could not access secret. Ensure it exists and the service account has the 'Secret Manager Secret Accessor' role. Error: {e}")
+            raise
+        self._credentials = Credentials.from_authorized_user_info(json.loads(creds_json))
+        self.generation += 1
+        if self._needs_refresh(self._credentials):
+            self._credentials.refresh(Request())
+
+    def _refresh(self):
+        from google.auth.exceptions import RefreshError
+        from google.auth.transport.requests import Request
+
+        try:
+            self._credentials.refresh(Request())
+        except RefreshError:
+            # The stored refresh token may have been rotated; re-read the secret once.
+            print("OAuth token refresh failed; reloading credentials from Secret Manager.")
+            self._credentials = None
+            self._load()
+
+
+class ServiceClientPool:
+    """
+    Reuses built Google API clients across requests.
+    Clients are built once per thread from the discovery documents bundled with
+    googleapiclient, each with its own authorized HTTP transport, because httplib2
+    connections are not thread-safe. The service executor's threads are long-lived,
+    so each thread pays the build cost once.
+    """
+
+    def __init__(self, credential_manager: CredentialManager, http_timeout: int = 60):
+        self.credential_manager = credential_manager
+        self.http_timeout = http_timeout
+        self._local = threading.local()
+
+    def get(self, api: str, version: str):
+        credentials = self.credential_manager.get_credentials()
+        clients = getattr(self._local, "clients", None)
+        if clients is None or self._local.generation != self.credential_manager.generation:
+            clients = self._local.clients = {}
+            self._local.generation = self.credential_manager.generation
+
+        if (api, version) not in clients:
+            import google_auth_httplib2
+            import httplib2
+            from googleapiclient.discovery import build
+
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=self.http_timeout))
+            clients[(api, version)] = build(api, version, http=http, static_discovery=True, cache_discovery=False)
+        return clients[(api, version)]
@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+import config
+from .firebase_service import firebase_service
+from .providers import LazyService
+
+
+class IndexVersion:
+    """
+    An embedding model and chunking parameters: everything that decides which vectors
+    a document gets. Each version's vectors live in per-user namespaces of their own.
+    """
+
+    def __init__(self, name: str, embedder: str, chunk_max_tokens: int, chunk_overlap_tokens: int):
+        self.name = name
+        self.embedder = embedder
+        self.chunk_max_tokens = chunk_max_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+
+    @classmethod
+    def from_config(cls, name: str = None) -> "IndexVersion":
+        """The version the current configuration builds, named after its settings unless `name` is given."""
+        embedder, max_tokens, overlap_tokens = config.EMBEDDER_MODEL_NAME, config.CHUNK_MAX_TOKENS, config.CHUNK_OVERLAP_TOKENS
+        if name is None:
+            # Names are used as Firestore field names, so keep them to word characters.
+            name = re.sub(r"\W", "_", f"{embedder}_{max_tokens}_{overlap_tokens}")
+        return cls(name, embedder, max_tokens, overlap_tokens)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndexVersion":
+        return cls(data["name"], data["embedder"], data["chunk_max_tokens"], data["chunk_overlap_tokens"])
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "embedder": self.embedder,
+            "chunk_max_tokens": self.chunk_max_tokens,
+            "chunk_overlap_tokens": self.chunk_overlap_tokens,
+        }
+
+    def same_settings(self, other: "IndexVersion") -> bool:
+        return (self.embedder, self.chunk_max_tokens, self.chunk_overlap_tokens) == \
+            (other.embedder, other.chunk_max_tokens, other.chunk_overlap_tokens)
+
+    def __repr__(self):
+        return f"<IndexVersion {self.name or '(original)'}: {self.embedder}, {self.chunk_max_tokens}/{self.chunk_overlap_tokens} tokens>"
+
+
+class IndexVersionRegistry:
+    """
+    Knows which index version retrieval and ingestion use ("active") and which one a
+    rebuild is filling ("building"). Both live in one Firestore document, so switching
+    versions is a single atomic write. The state is cached for `refresh_seconds`; every
+    instance follows a switch within that time.
+
+    The first read on a project without a state records the configured version as the
+    active one, named "", which keeps the namespaces vectors were written to before
+    versions existed.
+    """
+
+    def __init__(self, firebase, refresh_seconds: float):
+        self.firebase = firebase
+        self.refresh_seconds = refresh_seconds
+        self._state = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_state(self, refresh: bool = False) -> dict:
+        """Returns {"active": IndexVersion, "building": IndexVersion or None, "previous": IndexVersion or None}."""
+        with self._lock:
+            if refresh or self._state is None or time.monotonic() >= self._expires_at:
+                data = self.firebase.get_vector_index_state()
+                if data is None:
+                    data = self.firebase.update_vector_index_state(
+                        lambda current: current or {"active": IndexVersion.from_config(name="").to_dict()}
+                    )
+                self._set_state(data)
+            return self._state
+
+    def active(self) -> IndexVersion:
+        return self.get_state()["active"]
+
+    def write_targets(self) -> list[IndexVersion]:
+        """The versions new documents are indexed into: the active one, then any being built."""
+        state = self.get_state()
+        return [state["active"]] + ([state["building"]] if state["building"] else [])
+
+    def begin_build(self, version: IndexVersion):
+        """Marks `version` as being built, so documents ingested from now on are indexed into it as well."""
+        def update(current):
+            building = current.get("building")
+            if building and building["name"] != version.name:
+                print(f"Abandoning the unfinished build of index version {building['name']}")
+            return {**current, "building": version.to_dict()}
+        data = self.firebase.update_vector_index_state(update)
+        with self._lock:
+            self._set_state(data)
+
+    def activate(self, version: IndexVersion):
+        """Atomically makes the built `version` the one retrieval and ingestion use."""
+        def update(current):
+            if (current.get("building") or {}).get("name") != version.name:
+                raise ValueError(f"Index version {version.name} is not the one being built.")
+            return {"active": version.to_dict(), "previous": current["active"]}
+        data = self.firebase.update_vector_index_state(update)
+        with self._lock:
+            self._set_state(data)
+
+    def _set_state(self, data: dict):
+        self._state = {key: IndexVersion.from_dict(data[key]) if data.get(key) else None
+                       for key in ("active", "building", "previous")}
+        self._expires_at = time.monotonic() + self.refresh_seconds
+
+
+# A single, shared instance of the service, built on first use
+index_versions = LazyService(lambda: IndexVersionRegistry(
+    firebase=firebase_service,
+    refresh_seconds=config.VECTOR_INDEX_STATE_REFRESH_SECONDS
+))
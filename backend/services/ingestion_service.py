@@ -0,0 +1,439 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+from .ai_service import ai_service
+from .executor import run_blocking
+from .firebase_service import firebase_service
+from .vector_db_service import vector_db_service
+from .index_versions import IndexVersion, index_versions
+from .lexical_index import build_shard
+from .text_extraction import iter_document_text
+from .text_processing import chunk_stream, content_hash
+from .providers import LazyService
+from .telemetry import telemetry
+
+# Short document type names stored in vector metadata for filtering
+DOCUMENT_TYPES = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+}
+
+class IngestionService:
+    """
+    Turns uploaded documents into vectors: content-hash deduplication, chunking,
+    batched embedding with bounded concurrency and retries, and batched upserts.
+    """
+
+    def __init__(self, ai, firebase, vector_db, versions, embed_batch_size: int,
+                 max_concurrency: int, max_retries: int, upsert_batch_size: int):
+        self.ai = ai
+        self.firebase = firebase
+        self.vector_db = vector_db
+        self.versions = versions
+        self.embed_batch_size = embed_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.upsert_batch_size = upsert_batch_size
+
+    @staticmethod
+    def chunk_id(document_id: str, chunk_hash: str) -> str:
+        """
+        Vector IDs are derived from the Firestore document ID so they can be deleted with it,
+        and from the chunk's content hash so unchanged chunks keep their ID across edits.
+        """
+        return f"{document_id}#{chunk_hash}"
+
+    @staticmethod
+    def owner_id(document_id: str, chunk_ids: list[str]) -> str:
+        """
+        The document ID a stored document's chunk IDs carry. Documents promoted to own their
+        content before promotions copied the vectors still carry the previous owner's ID.
+        """
+        return chunk_ids[0].split("#", 1)[0] if chunk_ids else document_id
+
+    def iter_chunks(self, document_id: str, pieces, version: IndexVersion = None):
+        """
+        Yields (chunk_id, text) for each distinct chunk of a document given as pieces of text,
+        split the way index version `version` (by default the active one) splits documents.
+        """
+        version = version or self.versions.active()
+        seen = set()
+        for chunk in chunk_stream(pieces, version.chunk_max_tokens, version.chunk_overlap_tokens):
+            chunk_id = self.chunk_id(document_id, content_hash(chunk))
+            if chunk_id not in seen:
+                seen.add(chunk_id)
+                yield chunk_id, chunk
+
+    def ingest_upload(self, user_id: str, file_path: str, file_data, content_type: str, local_path: str = None) -> str:
+        """
+        Indexes an uploaded file, consulting the user's content index first.
+        `file_data` is bytes or a memory-mapped buffer; `local_path`, if the file is on
+        disk, lets large PDFs be extracted in parallel worker processes.
+        Byte-identical files become metadata-only links to the existing document,
+        and only chunks none of the user's documents already has are embedded, so an
+        edited copy, re-uploaded or under a new name, re-embeds just what changed.
+        Returns the Firestore document ID.
+        """
+        file_hash = content_hash(file_data)
+        document_id = None
+        previous_chunk_ids = {}
+
+        existing = self.firebase.get_document_by_storage_path(user_id, file_path)
+        if existing:
+            document_id, existing_data = existing
+            if existing_data.get("content_hash") == file_hash:
+                print(f"Document {document_id} is unchanged; skipping ingestion.")
+                return document_id
+            # Vectors only this document referenced can be diffed against the new version.
+            previous_chunk_ids = self.firebase.release_content(user_id, document_id, existing_data, self._transfer_content)
+
+        canonical = self.firebase.get_content_index_entry(user_id, file_hash)
+        if canonical:
+            self.vector_db.delete_by_version(previous_chunk_ids, user_id)
+            return self.firebase.link_duplicate_document(
+                user_id, file_path, canonical["document_id"], file_hash, document_id=document_id
+            )
+
+        # Pages are chunked and embedded as they are extracted, and kept for the text store.
+        document_id = document_id or self.firebase.new_document_id(user_id)
+        pieces = []
+        def extracted():
+            # Extraction interleaves with chunking and embedding, so its time is summed per piece.
+            extract_seconds = 0.0
+            started = time.perf_counter()
+            for piece in iter_document_text(file_data, content_type, path=local_path):
+                extract_seconds += time.perf_counter() - started
+                pieces.append(piece)
+                yield piece
+                started = time.perf_counter()
+            telemetry.observe("ingest.extract", extract_seconds + time.perf_counter() - started)
+
+        doc_type = DOCUMENT_TYPES.get(content_type, "other")
+        # While an index rebuild runs, documents also go into the version being built.
+        active, *building = self.versions.write_targets()
+        chunk_ids = self.ingest_document(
+            user_id, document_id, extracted(), previous_chunk_ids.pop(active.name, []), doc_type=doc_type, version=active
+        )
+        version_chunk_ids = {
+            version.name: self.ingest_document(
+                user_id, document_id, pieces, previous_chunk_ids.pop(version.name, []), doc_type=doc_type, version=version
+            )
+            for version in building
+        }
+        # Vectors left in versions the document is no longer indexed into
+        self.vector_db.delete_by_version(previous_chunk_ids, user_id)
+
+        lexical_shard, version_lexical_shards = None, None
+        if config.LEXICAL_INDEX_ENABLED:
+            # Chunking is deterministic, so re-chunking the kept pieces reproduces the vectors' chunk IDs.
+            metadata = {"document_id": document_id, "user_id": user_id, "doc_type": doc_type, "uploaded_at": time.time()}
+            with telemetry.span("ingest.lexical_index"):
+                lexical_shard = build_shard(list(self.iter_chunks(document_id, pieces, active)), metadata)
+                version_lexical_shards = {
+                    version.name: build_shard(list(self.iter_chunks(document_id, pieces, version)), metadata)
+                    for version in building
+                }
+        with telemetry.span("ingest.store_metadata"):
+            return self.firebase.store_document_metadata(
+                user_id, file_path, "\n\n".join(pieces), content_hash=file_hash, document_id=document_id,
+                chunk_ids=chunk_ids, lexical_shard=lexical_shard, index_version=active.name,
+                version_chunk_ids=version_chunk_ids, version_lexical_shards=version_lexical_shards
+            )
+
+    def delete_document(self, user_id: str, document_id: str):
+        """Deletes a document with its stored file, text and the vectors no other document refers to."""
+        orphaned_chunk_ids = self.firebase.delete_document(user_id, document_id, self._transfer_content)
+        self.vector_db.delete_by_version(orphaned_chunk_ids, user_id)
+
+    async def delete_document_async(self, user_id: str, document_id: str):
+        """Async counterpart of `delete_document`, run on the shared service executor."""
+        await run_blocking(self.delete_document, user_id, document_id)
+
+    def _transfer_content(self, user_id: str, new_owner_id: str, doc_data: dict) -> dict:
+        """
+        Copies a released document's vectors (in every index version) and lexical shard to
+        IDs owned by `new_owner_id`, the document promoted to own the content.
+        Returns the promoted document's metadata fields that refer to the copies.
+        """
+        def rekey(chunk_id):
+            return self.chunk_id(new_owner_id, chunk_id.split("#", 1)[1])
+
+        chunk_ids_by_version = {}
+        for version, chunk_ids in self.firebase.chunk_ids_by_version(doc_data).items():
+            vectors = [
+                {"id": rekey(vector["id"]), "values": vector["values"],
+                 "metadata": {**vector["metadata"], "document_id": new_owner_id}}
+                for vector in self.vector_db.fetch(chunk_ids, user_id, version)
+            ]
+            for start in range(0, len(vectors), self.upsert_batch_size):
+                self.vector_db.upsert(vectors[start:start + self.upsert_batch_size], user_id, version)
+            chunk_ids_by_version[version] = [vector["id"] for vector in vectors]
+
+        print(f"Copied {sum(map(len, chunk_ids_by_version.values()))} vectors to document {new_owner_id}")
+        index_refs_by_version = {}
+        for version, index_ref in self.firebase.index_refs_by_version(doc_data).items():
+            shard = json.loads(self.firebase.lexical_store.get(index_ref))
+            shard["metadata"]["document_id"] = new_owner_id
+            for chunk in shard["chunks"]:
+                chunk["id"] = rekey(chunk["id"])
+            index_refs_by_version[version] = self.firebase.lexical_store.put(
+                user_id, new_owner_id, json.dumps(shard, separators=(",", ":")), kind="json"
+            )
+
+        index_version = doc_data.get("index_version", "")
+        fields = {"chunk_ids": chunk_ids_by_version.pop(index_version, [])}
+        if chunk_ids_by_version:
+            fields["version_chunk_ids"] = chunk_ids_by_version
+        if index_version in index_refs_by_version:
+            fields["index_ref"] = index_refs_by_version.pop(index_version)
+        if index_refs_by_version:
+            fields["version_index_refs"] = index_refs_by_version
+        return fields
+
+    def backfill_lexical_index(self, page_size: int = 100) -> int:
+        """
+        Builds active index version lexical index shards from the stored text of documents
+        indexed before the lexical index existed. Only documents that own vectors in the
+        version and have no shard for it are touched, so it can be stopped and re-run at
+        any time. Returns the number built.
+        """
+        built = 0
+        active = self.versions.active()
+        for page in self.firebase.iter_document_pages(page_size):
+            for user_id, document_id, data in page:
+                active_chunk_ids = self.firebase.chunk_ids_by_version(data).get(active.name)
+                has_shard = active.name in self.firebase.index_refs_by_version(data)
+                if has_shard or data.get("duplicate_of") or not active_chunk_ids:
+                    continue
+                chunk_ids = set(active_chunk_ids)
+                owner_id = self.owner_id(document_id, active_chunk_ids)
+                text = self.firebase.get_document_text(user_id, document_id)
+                chunks = [
+                    (chunk_id, chunk) for chunk_id, chunk in self.iter_chunks(owner_id, [text], active) if chunk_id in chunk_ids
+                ]
+                if len(chunks) < len(chunk_ids):
+                    print(f"Document {document_id}: only {len(chunks)} of {len(chunk_ids)} chunks could be rebuilt from its text.")
+                self.firebase.store_lexical_shard(
+                    user_id, document_id, build_shard(chunks, self._stored_document_metadata(owner_id, user_id, data)),
+                    version=None if data.get("index_version", "") == active.name else active.name
+                )
+                built += 1
+            print(f"Built lexical index shards for {built} documents so far")
+        return built
+
+    def rebuild_index(self, version: IndexVersion, page_size: int = 50, workers: int = 4, activate: bool = True) -> int:
+        """
+        Indexes every stored document into index version `version` (e.g. the configured
+        one after changing the embedding model or chunking), then switches retrieval and
+        ingestion to it. Returns the number of documents indexed.
+
+        Uploads are indexed into both versions from the start of the build. Documents are
+        walked a page at a time: their chunks are embedded in full batches on `workers`
+        threads and upserted into the new version's namespaces, then the page's vector IDs
+        and lexical index shards are recorded in one batch with a checkpoint. Documents that already have vectors
+        in the version are skipped, so an interrupted rebuild can simply be run again; it
+        resumes after the last recorded page. Until the switch, which is a single Firestore
+        write, retrieval keeps using the previous version.
+        """
+        active = self.versions.get_state(refresh=True)["active"]
+        if active.name == version.name or active.same_settings(version):
+            print(f"{active} is already active; nothing to rebuild.")
+            return 0
+        self.versions.begin_build(version)
+        started = time.monotonic()
+        checkpoint = self.firebase.get_reindex_checkpoint(version.name) or {}
+        progress = {"documents": checkpoint.get("documents", 0), "chunks": checkpoint.get("chunks", 0)}
+        indexed = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            cursor = tuple(checkpoint["cursor"]) if checkpoint.get("cursor") else None
+            if cursor:
+                print(f"Resuming the rebuild of index version {version.name} after document {cursor[1]}")
+            indexed += self._rebuild_walk(version, pool, page_size, cursor, progress)
+            # Instances learn of the build within the state refresh interval; uploads they took
+            # before that only reached the active version, so a second walk picks them up.
+            remaining = self.versions.refresh_seconds - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+            indexed += self._rebuild_walk(version, pool, page_size, None, progress)
+        if activate:
+            self.versions.activate(version)
+            print(f"Index version {version.name} is now active.")
+        return indexed
+
+    def _rebuild_walk(self, version: IndexVersion, pool, page_size: int, start_after: tuple, progress: dict) -> int:
+        indexed = 0
+        for page in self.firebase.iter_document_pages(page_size, start_after=start_after):
+            chunk_ids = self._rebuild_page(version, pool, page)
+            indexed += len(chunk_ids)
+            progress["documents"] += len(chunk_ids)
+            progress["chunks"] += sum(len(ids) for _, _, ids, _ in chunk_ids)
+            last_user_id, last_document_id, _ = page[-1]
+            self.firebase.store_version_chunk_ids(
+                version.name, chunk_ids, {**progress, "cursor": [last_user_id, last_document_id]}
+            )
+            print(f"Rebuilt index version {version.name} for {progress['documents']} documents so far")
+        return indexed
+
+    def _rebuild_page(self, version: IndexVersion, pool, page: list) -> list[tuple]:
+        """
+        Indexes a page of stored documents into `version`.
+        Returns (user_id, document_id, chunk_ids, lexical shard or None) for each.
+        """
+        documents = [
+            (user_id, document_id, data) for user_id, document_id, data in page
+            if not data.get("duplicate_of") and version.name not in self.firebase.chunk_ids_by_version(data)
+        ]
+        texts = pool.map(lambda document: self.firebase.get_document_text(document[0], document[1]), documents)
+
+        # Chunks of every document on the page share embedding batches.
+        chunks, results = [], []
+        for (user_id, document_id, data), text in zip(documents, texts):
+            existing_chunk_ids = next(iter(self.firebase.chunk_ids_by_version(data).values()), [])
+            owner_id = self.owner_id(document_id, existing_chunk_ids)
+            metadata = self._stored_document_metadata(owner_id, user_id, data)
+            document_chunks = list(self.iter_chunks(owner_id, [text], version))
+            chunks.extend((user_id, chunk_id, chunk, metadata) for chunk_id, chunk in document_chunks)
+            # The lexical index has to use the new version's chunk IDs, or its hits could not be fused with vector hits.
+            lexical_shard = build_shard(document_chunks, metadata) if config.LEXICAL_INDEX_ENABLED else None
+            results.append((user_id, document_id, [chunk_id for chunk_id, _ in document_chunks], lexical_shard))
+
+        batches = [chunks[start:start + self.embed_batch_size] for start in range(0, len(chunks), self.embed_batch_size)]
+        embedded = pool.map(lambda batch: self._embed_batch_with_retry([chunk for _, _, chunk, _ in batch], version.embedder), batches)
+        vectors_by_user = {}
+        for (user_id, chunk_id, chunk, metadata), embedding in zip(chunks, (e for batch in embedded for e in batch)):
+            vectors_by_user.setdefault(user_id, []).append({"id": chunk_id, "values": embedding, "metadata": {**metadata, "text": chunk}})
+        upserts = [
+            pool.submit(self.vector_db.upsert, vectors[start:start + self.upsert_batch_size], user_id, version.name)
+            for user_id, vectors in vectors_by_user.items()
+            for start in range(0, len(vectors), self.upsert_batch_size)
+        ]
+        for upsert in upserts:
+            upsert.result()
+        return results
+
+    @staticmethod
+    def _stored_document_metadata(owner_id: str, user_id: str, data: dict) -> dict:
+        """Reconstructs the metadata an already stored document's chunks carry from its Firestore metadata."""
+        created_at = data.get("created_at")
+        extension = (data.get("original_storage_path") or "").rsplit(".", 1)[-1].lower()
+        return {
+            "document_id": owner_id,
+            "user_id": user_id,
+            "doc_type": extension if extension in DOCUMENT_TYPES.values() else "other",
+            "uploaded_at": created_at.timestamp() if created_at else time.time(),
+        }
+
+    def ingest_document(self, user_id: str, document_id: str, text, previous_chunk_ids: list[str] = (),
+                        doc_type: str = "other", version: IndexVersion = None) -> list[str]:
+        """
+        Chunks, embeds and upserts a document's text into the user's namespace for index
+        version `version`, by default the active one.
+        `text` is a string or an iterable of pieces (e.g. pages); embedding batches are
+        sent as soon as they fill, while later pieces are still being produced.
+        Vectors carry the document type and upload time so retrieval can filter on them.
+        Chunks whose vector already exists in `previous_chunk_ids` are not re-embedded;
+        chunks another of the user's documents has get a copy of its vector. Previous
+        vectors that no longer match any chunk are deleted.
+        Returns the IDs of the document's vectors.
+        """
+        pieces = [text] if isinstance(text, str) else text
+        version = version or self.versions.active()
+        previous = set(previous_chunk_ids)
+        # Vector IDs end in the chunk's content hash, whichever document owns them.
+        shared_ids = self.firebase.get_chunk_ids_by_hash(user_id, version.name)
+        chunks_by_id = {}
+        new_chunks, shared_chunks, batch, batch_futures = [], [], [], []
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            def embed(chunk_id, chunk):
+                nonlocal batch
+                new_chunks.append((chunk_id, chunk))
+                batch.append(chunk)
+                if len(batch) == self.embed_batch_size:
+                    batch_futures.append(pool.submit(self._embed_batch_with_retry, batch, version.embedder))
+                    batch = []
+
+            for chunk_id, chunk in self.iter_chunks(document_id, pieces, version):
+                chunks_by_id[chunk_id] = chunk
+                if chunk_id in previous:
+                    continue
+                shared_id = shared_ids.get(chunk_id.split("#", 1)[1])
+                if shared_id and shared_id != chunk_id:
+                    shared_chunks.append((chunk_id, chunk, shared_id))
+                else:
+                    embed(chunk_id, chunk)
+
+            shared_values = {}
+            if shared_chunks:
+                shared_values = {
+                    vector["id"]: vector["values"]
+                    for vector in self.vector_db.fetch([shared_id for _, _, shared_id in shared_chunks], user_id, version.name)
+                }
+            copied_chunks = []
+            for chunk_id, chunk, shared_id in shared_chunks:
+                if shared_id in shared_values:
+                    copied_chunks.append((chunk_id, chunk, shared_values[shared_id]))
+                else:
+                    # Deleted since the lookup
+                    embed(chunk_id, chunk)
+            if batch:
+                batch_futures.append(pool.submit(self._embed_batch_with_retry, batch, version.embedder))
+            # Futures are kept in submission order, so embeddings line up with chunks.
+            embeddings = [embedding for future in batch_futures for embedding in future.result()]
+
+        stale_ids = [chunk_id for chunk_id in previous_chunk_ids if chunk_id not in chunks_by_id]
+
+        upserts = [(chunk_id, chunk, embedding) for (chunk_id, chunk), embedding in zip(new_chunks, embeddings)]
+        upserts.extend(copied_chunks)
+        if upserts:
+            uploaded_at = time.time()
+            vectors = [
+                {
+                    "id": chunk_id,
+                    "values": embedding,
+                    "metadata": {
+                        "document_id": document_id,
+                        "user_id": user_id,
+                        "doc_type": doc_type,
+                        "uploaded_at": uploaded_at,
+                        "text": chunk,
+                    },
+                }
+                for chunk_id, chunk, embedding in upserts
+            ]
+            with telemetry.span("ingest.upsert", vectors=len(vectors)):
+                for start in range(0, len(vectors), self.upsert_batch_size):
+                    self.vector_db.upsert(vectors[start:start + self.upsert_batch_size], user_id, version.name)
+        self.vector_db.delete(stale_ids, user_id, version.name)
+
+        print(f"Indexed document {document_id}: {len(new_chunks)} chunks embedded, {len(copied_chunks)} copied "
+              f"from other documents, {len(chunks_by_id) - len(upserts)} reused, {len(stale_ids)} removed.")
+        return list(chunks_by_id)
+
+    def _embed_batch_with_retry(self, texts: list[str], model: str = None) -> list[list[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with telemetry.span("ingest.embed_batch", texts=len(texts)):
+                    return self.ai.embed_texts(texts, model=model)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                # Exponential backoff with jitter to avoid retrying in lockstep.
+                delay = min(config.EMBED_RETRY_MAX_DELAY_SECONDS, config.EMBED_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.0)
+                print(f"Embedding batch failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+# A single, shared instance of the service, built on first use
+ingestion_service = LazyService(lambda: IngestionService(
+    ai=ai_service,
+    firebase=firebase_service,
+    vector_db=vector_db_service,
+    versions=index_versions,
+    embed_batch_size=config.EMBED_BATCH_SIZE,
+    max_concurrency=config.EMBED_MAX_CONCURRENCY,
+    max_retries=config.EMBED_MAX_RETRIES,
+    upsert_batch_size=config.VECTOR_UPSERT_BATCH_SIZE,
+))
@@ -0,0 +1,94 @@
+import base64
+import datetime
+import re
+from email.utils import parseaddr
+from bs4 import BeautifulSoup
+
+# Prefixes job boards and mail clients put in front of the job title
+_SUBJECT_PREFIX = re.compile(r"^\s*(?:(?:fwd?|re)\s*:\s*|(?:new\s+)?job(?:\s+alert)?\s*:\s*|new\s+job\s+for\s+you\s*:\s*)+", re.IGNORECASE)
+# "Support Worker at Anglicare" / "Support Worker - Anglicare" / "Support Worker | Anglicare"
+_TITLE_EMPLOYER = re.compile(r"^(?P<title>.+?)\s+(?:at|with|-|–|\|)\s+(?P<employer>.+)$", re.IGNORECASE)
+_BODY_EMPLOYER = re.compile(r"^\s*(?:employer|organisation|organization|company|advertiser)\s*:\s*(?P<employer>.+)$",
+                            re.IGNORECASE | re.MULTILINE)
+_CLOSING_DATE = re.compile(
+    r"(?:closing\s+date|applications?\s+close(?:s)?|closes|close\s+date)\s*(?:on|:)?\s*"
+    r"(?:[A-Za-z]+,?\s+)?"
+    r"(?P<date>\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|\d{1,2}(?:st|nd|rd|th)?\s+[A-Za-z]{3,9},?\s+\d{4}|[A-Za-z]{3,9}\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4})",
+    re.IGNORECASE,
+)
+_JOB_URL = re.compile(r"https?://(?:www\.)?(?:seek\.com\.au/job/|ethicaljobs\.com\.au/|au\.jora\.com/|jora\.com/)\S+", re.IGNORECASE)
+
+# Day-first formats, as used by Australian job boards
+_DATE_FORMATS = ["%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y", "%d.%m.%Y", "%d %B %Y", "%d %b %Y", "%B %d %Y", "%b %d %Y"]
+
+
+def _header(payload: dict, name: str) -> str:
+    for header in payload.get("headers", []):
+        if header["name"].lower() == name.lower():
+            return header["value"]
+    return ""
+
+def _decode(data: str) -> str:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)).decode("utf-8", errors="replace")
+
+def _find_part(payload: dict, mime_type: str):
+    if payload.get("mimeType") == mime_type and payload.get("body", {}).get("data"):
+        return payload["body"]["data"]
+    for part in payload.get("parts", []):
+        found = _find_part(part, mime_type)
+        if found:
+            return found
+    return None
+
+def extract_body_text(payload: dict) -> str:
+    """Returns the plain-text body of a Gmail message payload, converting HTML if that is all there is."""
+    data = _find_part(payload, "text/plain")
+    if data:
+        return _decode(data)
+    data = _find_part(payload, "text/html")
+    if data:
+        return BeautifulSoup(_decode(data), "html.parser").get_text("\n")
+    return ""
+
+def parse_closing_date(text: str):
+    """Finds a closing date such as "Closing date: 14/03/2025" or "Applications close 3 March 2025"."""
+    match = _CLOSING_DATE.search(text)
+    if not match:
+        return None
+    raw = re.sub(r"(?<=\d)(?:st|nd|rd|th)", "", match.group("date")).replace(",", "")
+    raw = " ".join(raw.split())
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(raw, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+def parse_job_alert(message: dict) -> dict:
+    """
+    Extracts the job title, employer, closing date and job link from a Gmail message
+    fetched with format="full". Fields that cannot be found are None; the title falls
+    back to the cleaned-up subject and the employer to the sender's display name.
+    """
+    payload = message.get("payload", {})
+    subject = _SUBJECT_PREFIX.sub("", _header(payload, "Subject")).strip()
+    body = extract_body_text(payload)
+
+    title, employer = subject or None, None
+    match = _TITLE_EMPLOYER.match(subject)
+    if match:
+        title, employer = match.group("title").strip(), match.group("employer").strip()
+    if employer is None:
+        body_match = _BODY_EMPLOYER.search(body)
+        if body_match:
+            employer = body_match.group("employer").strip()
+    if employer is None:
+        employer = parseaddr(_header(payload, "From"))[0] or None
+
+    url_match = _JOB_URL.search(body)
+    return {
+        "title": title,
+        "employer": employer,
+        "closing_date": parse_closing_date(body) or parse_closing_date(subject),
+        "url": url_match.group(0) if url_match else None,
+    }
@@ -0,0 +1,126 @@
+import re
+import string
+
+# Runs of string characters that need no escape handling
+_STRING_RUN = re.compile(r'[^"\\]+')
+
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonFieldStreamer:
+    """
+    Incremental parser for a streamed JSON object whose values of interest are strings.
+    Text is fed in arbitrary pieces; for each piece, `feed` returns the unescaped
+    characters that were added to the top-level string fields, as (key, delta) pairs.
+    Every input character is examined once, so total cost is linear in the output size.
+    Anything before the opening brace (e.g. a Markdown code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.expecting_key = False
+        self.current_key = None
+        self.seen_object = False
+        self._in_string = False
+        self._string_is_key = False
+        self._string_parts = []
+        self._escape = None
+        self._high_surrogate = None
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        deltas = []
+        i, n = 0, len(text)
+        while i < n:
+            if self._in_string:
+                i = self._consume_string(text, i, deltas)
+                continue
+
+            char = text[i]
+            i += 1
+            if char == '"':
+                self._in_string = True
+                self._string_is_key = self.depth == 1 and self.expecting_key
+                self._string_parts = []
+            elif char in "{[":
+                self.depth += 1
+                if char == "{" and self.depth == 1:
+                    self.seen_object = True
+                self.expecting_key = char == "{"
+            elif char in "}]":
+                self.depth -= 1
+                self.expecting_key = False
+            elif char == ":" and self.depth == 1:
+                self.expecting_key = False
+            elif char == "," and self.depth == 1:
+                self.expecting_key = True
+                self.current_key = None
+
+        return self._merge(deltas)
+
+    def _consume_string(self, text: str, i: int, deltas: list) -> int:
+        """Consumes string contents starting at `i`; returns the index after what was consumed."""
+        streaming_value = self.depth == 1 and not self._string_is_key and self.current_key is not None
+
+        if self._escape is not None:
+            i, decoded = self._consume_escape(text, i)
+            if decoded and streaming_value:
+                deltas.append((self.current_key, decoded))
+            elif decoded and self._string_is_key:
+                self._string_parts.append(decoded)
+            return i
+
+        char = text[i]
+        if char == '"':
+            self._in_string = False
+            if self._string_is_key:
+                self.current_key = "".join(self._string_parts)
+            return i + 1
+        if char == "\\":
+            self._escape = ""
+            return i + 1
+
+        run = _STRING_RUN.match(text, i)
+        if streaming_value:
+            deltas.append((self.current_key, run.group()))
+        elif self._string_is_key:
+            self._string_parts.append(run.group())
+        return run.end()
+
+    def _consume_escape(self, text: str, i: int):
+        """Accumulates an escape sequence that may be split across fed pieces."""
+        if self._escape and text[i] not in string.hexdigits:
+            # Model output is not guaranteed to be valid JSON: a malformed \u escape becomes
+            # U+FFFD and the character that ended it is parsed as usual.
+            self._escape = None
+            self._high_surrogate = None
+            return i, "\ufffd"
+        self._escape += text[i]
+        i += 1
+        if self._escape[0] != "u":
+            decoded = _SIMPLE_ESCAPES.get(self._escape, self._escape)
+            self._escape = None
+            return i, decoded
+        if len(self._escape) < 5:
+            return i, ""
+
+        code_unit = int(self._escape[1:], 16)
+        self._escape = None
+        if 0xD800 <= code_unit < 0xDC00:
+            self._high_surrogate = code_unit
+            return i, ""
+        if 0xDC00 <= code_unit < 0xE000 and self._high_surrogate is not None:
+            code_point = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code_unit - 0xDC00)
+            self._high_surrogate = None
+            return i, chr(code_point)
+        self._high_surrogate = None
+        return i, chr(code_unit)
+
+    @staticmethod
+    def _merge(deltas: list) -> list[tuple[str, str]]:
+        merged = []
+        for key, delta in deltas:
+            if merged and merged[-1][0] == key:
+                merged[-1][1].append(delta)
+            else:
+                merged.append((key, [delta]))
+        return [(key, "".join(parts)) for key, parts in merged]
@@ -0,0 +1,160 @@
+import heapq
+import json
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import config
+from .executor import run_blocking
+from .firebase_service import firebase_service
+from .index_versions import index_versions
+from .providers import LazyService
+from .vector_store import matches_filter
+
+SHARD_FORMAT_VERSION = 1
+
+# Words and numbers, keeping decimals and contractions ("4.0", "o'brien") whole; hyphenated
+# words are split so "NDIS-registered" matches a search for "NDIS"
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by for from has have he her his i in into is it its me my not "
+    "of on or our she so such than that the their them then there these they this to was we were "
+    "what when which who will with would you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cases text and splits it into index terms, dropping common English stopwords."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return [token for token in _TOKEN.findall(text) if token not in _STOPWORDS]
+
+def build_shard(chunks: list[tuple[str, str]], metadata: dict) -> str:
+    """
+    Serializes one document's part of its owner's lexical index: the term frequencies
+    of each (chunk_id, text) pair, the chunk text itself (so lexical hits can be used
+    without a vector store round-trip) and the metadata shared by the document's chunks.
+    """
+    return json.dumps({
+        "version": SHARD_FORMAT_VERSION,
+        "metadata": metadata,
+        "chunks": [{"id": chunk_id, "text": text, "terms": Counter(tokenize(text))} for chunk_id, text in chunks],
+    }, separators=(",", ":"))
+
+
+class LexicalIndex:
+    """An in-memory BM25 index over one user's chunks, assembled from document shards."""
+
+    def __init__(self, shards: list[dict], k1: float = config.BM25_K1, b: float = config.BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.ids, self.texts, self.metadata, self.lengths = [], [], [], []
+        self.postings = {}
+        for shard in shards:
+            for chunk in shard["chunks"]:
+                index = len(self.ids)
+                self.ids.append(chunk["id"])
+                self.texts.append(chunk["text"])
+                self.metadata.append({**shard["metadata"], "text": chunk["text"]})
+                self.lengths.append(sum(chunk["terms"].values()))
+                for term, frequency in chunk["terms"].items():
+                    self.postings.setdefault(term, []).append((index, frequency))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query: str, k: int, filter: dict = None) -> list[dict]:
+        """Returns the `k` best chunks for `query` by BM25, as dicts shaped like vector store matches."""
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self.ids) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / self.average_length)
+                scores[index] = scores.get(index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        if filter:
+            scores = {index: score for index, score in scores.items() if matches_filter(self.metadata[index], filter)}
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [
+            {"id": self.ids[index], "text": self.texts[index], "metadata": self.metadata[index], "score": score}
+            for index, score in best
+        ]
+
+
+class LexicalIndexService:
+    """
+    Serves BM25 searches over each user's documents. A user's index is assembled from
+    the shards their documents reference for the active index version, so its chunk IDs
+    match the vectors', and cached until their corpus version or the active version
+    changes (or the entry's TTL passes, in case another instance deleted a document);
+    concurrent searches for the same user wait for a single load.
+    """
+
+    def __init__(self, firebase, versions, max_users: int, ttl_seconds: float, load_concurrency: int = 8):
+        self.firebase = firebase
+        self.versions = versions
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.load_concurrency = load_concurrency
+        self._cache = OrderedDict()
+        self._user_locks = {}
+        self._lock = threading.Lock()
+
+    def search(self, user_id: str, query: str, k: int, filter: dict = None, corpus_version: int = None) -> list[dict]:
+        """Searches the user's documents; pass the current corpus version to reuse a cached index."""
+        return self._get_index(user_id, corpus_version, self.versions.active().name).search(query, k, filter)
+
+    async def search_async(self, user_id: str, query: str, k: int, filter: dict = None,
+                           corpus_version: int = None) -> list[dict]:
+        """Async counterpart of `search`, run on the shared service executor."""
+        return await run_blocking(self.search, user_id, query, k, filter, corpus_version)
+
+    def _get_cached(self, user_id: str, corpus_version, version: str):
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is None or corpus_version is None or entry[:2] != (corpus_version, version) or entry[2] <= time.monotonic():
+                return None
+            self._cache.move_to_end(user_id)
+            return entry[3]
+
+    def _get_index(self, user_id: str, corpus_version, version: str) -> LexicalIndex:
+        index = self._get_cached(user_id, corpus_version, version)
+        if index is not None:
+            return index
+        with self._lock:
+            user_lock = self._user_locks.setdefault(user_id, threading.Lock())
+        with user_lock:
+            # Another thread may have loaded it while this one waited.
+            index = self._get_cached(user_id, corpus_version, version)
+            if index is None:
+                index = self._load(user_id, version)
+                with self._lock:
+                    self._cache[user_id] = (corpus_version, version, time.monotonic() + self.ttl_seconds, index)
+                    self._cache.move_to_end(user_id)
+                    while len(self._cache) > self.max_users:
+                        evicted, _ = self._cache.popitem(last=False)
+                        self._user_locks.pop(evicted, None)
+        return index
+
+    def _load(self, user_id: str, version: str) -> LexicalIndex:
+        refs = self.firebase.get_lexical_index_refs(user_id, version)
+        store = self.firebase.lexical_store
+        with ThreadPoolExecutor(max_workers=max(1, min(self.load_concurrency, len(refs)))) as pool:
+            shards = [json.loads(text) for text in pool.map(store.get, refs)]
+        index = LexicalIndex(shards)
+        print(f"Loaded lexical index for user {user_id}: {len(index)} chunks from {len(shards)} documents.")
+        return index
+
+
+# A single, shared instance of the service, built on first use
+lexical_index_service = LazyService(lambda: LexicalIndexService(
+    firebase=firebase_service,
+    versions=index_versions,
+    max_users=config.LEXICAL_INDEX_CACHE_USERS,
+    ttl_seconds=config.LEXICAL_INDEX_CACHE_TTL_SECONDS
+))
@@ -0,0 +1,402 @@
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+from .vector_store import VectorStore, matches_filter
+
+_MANIFEST = "manifest.jsonl"
+
+_RANGE_OPERATORS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+
+def _directory_name(namespace: str) -> str:
+    """
+    A namespace's directory: a filesystem-safe form of its name for readability, then
+    the SHA-256 of the name itself, since different names can have the same safe form
+    (e.g. "a@b" and "a_b") and must not share vectors.
+    """
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace)[:64] or "_default"
+    return f"{safe_name}-{hashlib.sha256(namespace.encode('utf-8')).hexdigest()}"
+
+
+class _ReadWriteLock:
+    """Lets any number of readers in at once, or one writer; waiting writers go before new readers."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class _Column:
+    """
+    One metadata key's values over a namespace's rows, for vectorized filtering: each
+    value's category code (missing values are the None category), and the value as a
+    float for range comparisons (NaN if missing or not a number).
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.codes = np.empty(0, dtype=np.int32)
+        self.numbers = np.empty(0, dtype=np.float64)
+        self.categories = {}
+        # Values that are neither numbers nor None, which range operators compare in Python
+        self.has_other = False
+        # Unhashable values (e.g. lists) have no category, so equality is checked in Python too
+        self.has_unhashable = False
+
+    def extend(self, values: list):
+        codes = np.full(len(values), -1, dtype=np.int32)
+        numbers = np.full(len(values), np.nan)
+        for offset, value in enumerate(values):
+            if _hashable(value):
+                codes[offset] = self.categories.setdefault(value, len(self.categories))
+            else:
+                self.has_unhashable = True
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                numbers[offset] = value
+            elif value is not None:
+                self.has_other = True
+        self.codes = np.concatenate([self.codes, codes])
+        self.numbers = np.concatenate([self.numbers, numbers])
+        self.size += len(values)
+
+    def equals_any(self, operands) -> np.ndarray:
+        codes = [self.categories[operand] for operand in operands if _hashable(operand) and operand in self.categories]
+        return np.isin(self.codes, codes)
+
+
+def _hashable(value) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _Namespace:
+    """
+    One namespace's vectors: a contiguous float32 matrix of unit-normalized rows,
+    persisted as append-only segment files plus a manifest of segment and delete records.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.size = 0
+        self.ids = []
+        self.metadata = []
+        self.alive = np.empty(0, dtype=bool)
+        self.rows_by_id = {}
+        self.last_segment_number = 0
+        self.segment_count = 0
+        self._columns = {}
+        self._columns_lock = threading.Lock()
+        # Queries share the namespace; upserts, deletes and compaction have it to themselves.
+        self.lock = _ReadWriteLock()
+        self._load()
+
+    # --- persistence ---
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"segment-{number:06d}.f32")
+
+    def _load(self):
+        manifest_path = os.path.join(self.directory, _MANIFEST)
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record["op"] == "segment":
+                    rows = np.memmap(self._segment_path(record["number"]), dtype=np.float32, mode="r",
+                                     shape=(len(record["ids"]), record["dimension"]))
+                    self._append_rows(record["ids"], rows, record["metadata"])
+                    self.last_segment_number = max(self.last_segment_number, record["number"])
+                    self.segment_count += 1
+                elif record["op"] == "delete":
+                    self._mark_deleted(record["ids"])
+
+    def _write_manifest_record(self, record: dict):
+        with open(os.path.join(self.directory, _MANIFEST), "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_segment(self, ids: list[str], rows: np.ndarray, metadata: list[dict]) -> dict:
+        self.last_segment_number += 1
+        self.segment_count += 1
+        rows.tofile(self._segment_path(self.last_segment_number))
+        return {"op": "segment", "number": self.last_segment_number, "dimension": rows.shape[1],
+                "ids": ids, "metadata": metadata}
+
+    # --- in-memory state ---
+
+    def _append_rows(self, ids: list[str], rows: np.ndarray, metadata: list[dict]):
+        count, dimension = rows.shape
+        if self.size == 0 and self.matrix.shape[1] != dimension:
+            self.matrix = np.empty((max(count, 16), dimension), dtype=np.float32)
+            self.alive = np.zeros(len(self.matrix), dtype=bool)
+        if dimension != self.matrix.shape[1]:
+            raise ValueError(f"Vector dimension {dimension} does not match index dimension {self.matrix.shape[1]}")
+        if self.size + count > len(self.matrix):
+            # Grow geometrically so repeated small upserts stay amortized O(1) per row.
+            capacity = max(self.size + count, 2 * len(self.matrix))
+            matrix = np.empty((capacity, dimension), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self.size] = self.alive[:self.size]
+            self.matrix, self.alive = matrix, alive
+
+        start = self.size
+        self.matrix[start:start + count] = rows
+        self.alive[start:start + count] = True
+        for offset, vector_id in enumerate(ids):
+            # An upsert of an existing ID supersedes the older row.
+            previous = self.rows_by_id.get(vector_id)
+            if previous is not None:
+                self.alive[previous] = False
+            self.rows_by_id[vector_id] = start + offset
+        self.ids.extend(ids)
+        self.metadata.extend(metadata)
+        self.size += count
+
+    def _mark_deleted(self, ids: list[str]):
+        for vector_id in ids:
+            row = self.rows_by_id.pop(vector_id, None)
+            if row is not None:
+                self.alive[row] = False
+
+    @property
+    def dead_rows(self) -> int:
+        return self.size - len(self.rows_by_id)
+
+    # --- operations ---
+
+    def upsert(self, vectors: list[dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        ids = [vector["id"] for vector in vectors]
+        rows = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        rows = rows / np.where(norms == 0, 1, norms)
+        metadata = [vector.get("metadata") or {} for vector in vectors]
+        record = self._write_segment(ids, rows, metadata)
+        self._append_rows(ids, rows, metadata)
+        self._write_manifest_record(record)
+
+    def delete(self, ids: list[str]):
+        present = [vector_id for vector_id in ids if vector_id in self.rows_by_id]
+        if not present:
+            return
+        self._mark_deleted(present)
+        self._write_manifest_record({"op": "delete", "ids": present})
+
+    def fetch(self, ids: list[str]) -> list[dict]:
+        rows = [(vector_id, self.rows_by_id[vector_id]) for vector_id in ids if vector_id in self.rows_by_id]
+        return [{"id": vector_id, "values": self.matrix[row].tolist(), "metadata": self.metadata[row]}
+                for vector_id, row in rows]
+
+    def query(self, vector: list[float], top_k: int, filter: dict, include_values: bool) -> list[dict]:
+        if not self.rows_by_id or top_k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        mask = self.alive[:self.size].copy()
+        if filter:
+            mask &= self._filter_mask(filter)
+        candidates = int(mask.sum())
+        if candidates == 0:
+            return []
+
+        scores = self.matrix[:self.size] @ query
+        scores[~mask] = -np.inf
+        k = min(top_k, candidates)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        matches = []
+        for row in top:
+            match = {"id": self.ids[row], "score": float(scores[row]), "metadata": self.metadata[row]}
+            if include_values:
+                match["values"] = self.matrix[row].tolist()
+            matches.append(match)
+        return matches
+
+    def _column(self, key: str) -> _Column:
+        # Built on first use and extended with the rows added since, so each row is read once per key.
+        with self._columns_lock:
+            column = self._columns.setdefault(key, _Column())
+            if column.size < self.size:
+                column.extend([metadata.get(key) for metadata in self.metadata[column.size:self.size]])
+            return column
+
+    def _filter_mask(self, filter: dict) -> np.ndarray:
+        """Evaluates a Pinecone-style metadata filter over all rows at once, like `matches_filter` does per row."""
+        mask = np.ones(self.size, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for sub in condition:
+                    mask &= self._filter_mask(sub)
+                continue
+            if key == "$or":
+                mask &= np.logical_or.reduce([self._filter_mask(sub) for sub in condition] or [np.zeros(self.size, dtype=bool)])
+                continue
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            column = self._column(key)
+            for op, operand in condition.items():
+                if op in ("$eq", "$ne", "$in", "$nin") and not column.has_unhashable:
+                    if op in ("$in", "$nin") and not isinstance(operand, (list, tuple, set, frozenset)):
+                        mask &= self._filter_mask_by_row(key, op, operand)
+                        continue
+                    matches = column.equals_any([operand] if op in ("$eq", "$ne") else operand)[:self.size]
+                    mask &= matches if op in ("$eq", "$in") else ~matches
+                elif op in _RANGE_OPERATORS and not column.has_other and isinstance(operand, (int, float)):
+                    # NaN (missing) compares false, as a missing value fails any range in `matches_filter`.
+                    mask &= _RANGE_OPERATORS[op](column.numbers[:self.size], operand)
+                elif op in ("$eq", "$ne", "$in", "$nin") or op in _RANGE_OPERATORS:
+                    mask &= self._filter_mask_by_row(key, op, operand)
+                else:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+    def _filter_mask_by_row(self, key: str, op: str, operand) -> np.ndarray:
+        # For values the columns cannot compare, e.g. lists or strings under range operators
+        condition = {key: {op: operand}}
+        return np.fromiter((matches_filter(metadata, condition) for metadata in self.metadata[:self.size]),
+                           dtype=bool, count=self.size)
+
+    def compact(self):
+        """Rewrites the live rows as a single segment and drops deleted rows and old segments."""
+        live_rows = sorted(self.rows_by_id.values())
+        ids = [self.ids[row] for row in live_rows]
+        rows = np.ascontiguousarray(self.matrix[live_rows])
+        metadata = [self.metadata[row] for row in live_rows]
+        old_segments = [name for name in os.listdir(self.directory) if name.endswith(".f32")]
+
+        record = self._write_segment(ids, rows, metadata)
+        manifest_path = os.path.join(self.directory, _MANIFEST)
+        with open(manifest_path + ".tmp", "w") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # The manifest swap is atomic, so a crash leaves either the old or the new layout.
+        os.replace(manifest_path + ".tmp", manifest_path)
+        for name in old_segments:
+            os.remove(os.path.join(self.directory, name))
+
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.size = 0
+        self.ids, self.metadata, self.rows_by_id = [], [], {}
+        self._columns = {}
+        self.alive = np.empty(0, dtype=bool)
+        self.segment_count = 1
+        if ids:
+            self._append_rows(ids, rows, metadata)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store for small per-user corpora, offline runs and load tests.
+    Each namespace is an in-memory float32 matrix searched with a vectorized cosine
+    top-k, persisted under `directory` as memory-mapped append-only segments.
+    """
+
+    def __init__(self, directory: str, compaction_threshold: float = 0.3, max_segments: int = 32):
+        self.directory = directory
+        self.compaction_threshold = compaction_threshold
+        self.max_segments = max_segments
+        self._namespaces = {}
+        # Only guards the namespace table; each namespace has its own read-write lock.
+        self._lock = threading.Lock()
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        with self._lock:
+            if namespace not in self._namespaces:
+                self._namespaces[namespace] = _Namespace(os.path.join(self.directory, _directory_name(namespace)))
+            return self._namespaces[namespace]
+
+    def upsert(self, vectors: list[dict], namespace: str = ""):
+        if not vectors:
+            return
+        ns = self._namespace(namespace)
+        with ns.lock.writing():
+            ns.upsert(vectors)
+            self._maybe_compact(ns)
+
+    def delete(self, ids: list[str], namespace: str = ""):
+        ns = self._namespace(namespace)
+        with ns.lock.writing():
+            ns.delete(ids)
+            self._maybe_compact(ns)
+
+    def fetch(self, ids: list[str], namespace: str = "") -> list[dict]:
+        ns = self._namespace(namespace)
+        with ns.lock.reading():
+            return ns.fetch(ids)
+
+    def query(self, vector: list[float], top_k: int, namespace: str = "", filter: dict = None,
+              include_values: bool = False) -> list[dict]:
+        ns = self._namespace(namespace)
+        with ns.lock.reading():
+            return ns.query(vector, top_k, filter, include_values)
+
+    def compact(self, namespace: str = ""):
+        ns = self._namespace(namespace)
+        with ns.lock.writing():
+            if ns.size:
+                ns.compact()
+
+    def _maybe_compact(self, ns: _Namespace):
+        if not ns.size:
+            return
+        if ns.dead_rows / ns.size > self.compaction_threshold or ns.segment_count > self.max_segments:
+            ns.compact()
@@ -0,0 +1,37 @@
+import threading
+
+
+class LazyService:
+    """
+    Stands in for a shared service instance and builds it on first use, so importing
+    a service module does not connect to anything. Construction is thread-safe and
+    happens once; if it fails, the next use tries again.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def resolve(self):
+        """Returns the service instance, building it if this is the first use."""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    object.__setattr__(self, "_instance", self._factory())
+                instance = self._instance
+        return instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __repr__(self):
+        return f"<LazyService {self._instance!r}>" if self.initialized else "<LazyService (not built)>"
@@ -0,0 +1,110 @@
+import asyncio
+import time
+import config
+from .firebase_service import firebase_service
+from .lexical_index import lexical_index_service
+from .providers import LazyService
+from .telemetry import telemetry
+from .vector_db_service import vector_db_service
+
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], k: int, limit: int) -> list[dict]:
+    """
+    Merges ranked result lists by reciprocal rank fusion: a result scores the sum of
+    1 / (k + rank) over the lists it appears in. Scores are scaled so the best is 1.0,
+    and a result keeps its vector ("values") from whichever list has one.
+    """
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            scores[doc["id"]] = scores.get(doc["id"], 0.0) + 1.0 / (k + rank)
+            if doc["id"] not in docs or ("values" in doc and "values" not in docs[doc["id"]]):
+                docs[doc["id"]] = doc
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    if not ranked:
+        return []
+    best = scores[ranked[0]]
+    return [{**docs[doc_id], "score": scores[doc_id] / best} for doc_id in ranked]
+
+
+class HybridRetriever:
+    """
+    Retrieves candidate passages from both the vector store and the user's BM25 index
+    and fuses the two rankings. The lexical side needs no embedding, so when the vector
+    side is slow or failing and the lexical side found something, its results are used
+    alone; after such a miss the vector side is skipped for that user for a cool-down period.
+    """
+
+    def __init__(self, vector_db, lexical_index, firebase, rrf_k: int, vector_timeout: float, degraded_cooldown: float):
+        self.vector_db = vector_db
+        self.lexical_index = lexical_index
+        self.firebase = firebase
+        self.rrf_k = rrf_k
+        self.vector_timeout = vector_timeout
+        self.degraded_cooldown = degraded_cooldown
+        # User ID -> when their vector searches resume
+        self._degraded_until = {}
+
+    async def retrieve_async(self, query: str, user_id: str, k: int, filter: dict = None) -> tuple[list[dict], int]:
+        """
+        Returns (up to `k` candidate passages, the user's corpus version). Candidates
+        found by the vector search carry their vector under "values"; lexical-only ones don't.
+        """
+        started = time.monotonic()
+        corpus_version_task = asyncio.ensure_future(self.firebase.get_corpus_version_async(user_id))
+        vector_task = None
+        if self.lexical_index is None or started >= self._degraded_until.get(user_id, 0.0):
+            vector_task = asyncio.ensure_future(self._vector_search(query, user_id, k, filter))
+
+        lexical_hits = []
+        if self.lexical_index is not None:
+            try:
+                # The version is needed to reuse the cached index; the vector search runs meanwhile.
+                corpus_version = await corpus_version_task
+                with telemetry.span("retrieval.lexical"):
+                    lexical_hits = await self.lexical_index.search_async(user_id, query, k, filter, corpus_version)
+            except Exception as e:
+                print(f"Lexical retrieval failed for user {user_id}: {e}")
+
+        if vector_task is None and not lexical_hits:
+            vector_task = asyncio.ensure_future(self._vector_search(query, user_id, k, filter))
+        vector_hits = []
+        if vector_task is None:
+            telemetry.count("retrieval_lexical_only", reason="degraded")
+        else:
+            # Without lexical results there is nothing to fall back on, so wait as long as it takes.
+            timeout = max(0.0, started + self.vector_timeout - time.monotonic()) if lexical_hits else None
+            try:
+                vector_hits = await asyncio.wait_for(vector_task, timeout)
+            except Exception as e:
+                if not lexical_hits:
+                    raise
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                print(f"Vector retrieval {reason} for user {user_id}; using lexical results only: {e!r}")
+                telemetry.count("retrieval_lexical_only", reason=reason)
+                self._mark_degraded(user_id)
+
+        corpus_version = await corpus_version_task
+        if not lexical_hits:
+            return vector_hits, corpus_version
+        return reciprocal_rank_fusion([vector_hits, lexical_hits], self.rrf_k, k), corpus_version
+
+    def _mark_degraded(self, user_id: str):
+        now = time.monotonic()
+        # Drop expired cool-downs so the map only holds users currently skipping the vector side.
+        self._degraded_until = {uid: until for uid, until in self._degraded_until.items() if until > now}
+        self._degraded_until[user_id] = now + self.degraded_cooldown
+
+    async def _vector_search(self, query: str, user_id: str, k: int, filter: dict):
+        return await self.vector_db.retrieve_async(query, user_id=user_id, k=k, filter=filter, include_values=True)
+
+
+# A single, shared instance of the service, built on first use
+retrieval_service = LazyService(lambda: HybridRetriever(
+    vector_db=vector_db_service,
+    lexical_index=lexical_index_service if config.LEXICAL_INDEX_ENABLED else None,
+    firebase=firebase_service,
+    rrf_k=config.HYBRID_RRF_K,
+    vector_timeout=config.HYBRID_VECTOR_TIMEOUT_SECONDS,
+    degraded_cooldown=config.HYBRID_DEGRADED_COOLDOWN_SECONDS
+))
@@ -0,0 +1,233 @@
+import bisect
+import threading
+import time
+import config
+
+# Upper bounds, in seconds, of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+OTEL_EXPORTERS = ("", "otlp", "console")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """A Prometheus-style histogram with fixed buckets, one series per label set."""
+
+    def __init__(self, name: str, help: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple = ()):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum of observations
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = labels + (("le", bound if bound == "+Inf" else _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """A Prometheus-style counter, one series per label set."""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, labels: tuple = ()):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        lines.extend(f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in series)
+        return lines
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key: str, value):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """Times a block into the stage histogram, and mirrors it as an OpenTelemetry span if enabled."""
+
+    __slots__ = ("telemetry", "stage", "attributes", "started", "otel_context", "otel_span")
+
+    def __init__(self, telemetry, stage: str, attributes: dict):
+        self.telemetry = telemetry
+        self.stage = stage
+        self.attributes = attributes
+        self.otel_context = self.otel_span = None
+
+    def __enter__(self):
+        tracer = self.telemetry._get_tracer()
+        if tracer is not None:
+            self.otel_context = tracer.start_as_current_span(self.stage, attributes=self.attributes)
+            self.otel_span = self.otel_context.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.observe(self.stage, time.perf_counter() - self.started, error=exc_type is not None)
+        if self.otel_context is not None:
+            self.otel_context.__exit__(exc_type, exc, tb)
+        return False
+
+    def set(self, key: str, value):
+        """Adds an attribute to the OpenTelemetry span; metrics are not labelled by it."""
+        if self.otel_span is not None:
+            self.otel_span.set_attribute(key, value)
+
+
+class Telemetry:
+    """
+    In-process metrics for the request, ingestion and job scout paths: a latency
+    histogram per stage, token counts, and the services' own cache and queue
+    statistics, rendered in the Prometheus text format. Stages are timed with
+    `span`, which also produces OpenTelemetry spans when an exporter is configured.
+    When disabled, `span` returns a shared no-op and recording returns immediately.
+    """
+
+    def __init__(self, enabled: bool, otel_exporter: str = "", service_name: str = "backend", prefix: str = "careerpilot_"):
+        if otel_exporter not in OTEL_EXPORTERS:
+            raise ValueError(f"Unsupported OpenTelemetry exporter: {otel_exporter}")
+        self.enabled = enabled
+        self.otel_exporter = otel_exporter if enabled else ""
+        self.service_name = service_name
+        self.prefix = prefix
+        self.stage_seconds = Histogram(f"{prefix}stage_duration_seconds", "Time spent in each stage.", LATENCY_BUCKETS)
+        self.stage_errors = Counter(f"{prefix}stage_errors_total", "Stages that ended with an exception.")
+        self.tokens = Histogram(f"{prefix}generation_tokens", "Estimated tokens per generation.", TOKEN_BUCKETS)
+        self.events = Counter(f"{prefix}events_total", "Countable events, such as cache hits.")
+        self._collectors = []
+        self._tracer = None
+        self._lock = threading.Lock()
+
+    def span(self, stage: str, **attributes):
+        """Returns a context manager that times the enclosed block as `stage`."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage, attributes)
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        """Records a stage duration measured by the caller, e.g. across a streaming loop."""
+        if not self.enabled:
+            return
+        labels = (("stage", stage),)
+        self.stage_seconds.observe(seconds, labels)
+        if error:
+            self.stage_errors.inc(1, labels)
+
+    def record_tokens(self, kind: str, count: int):
+        if self.enabled:
+            self.tokens.observe(count, (("kind", kind),))
+
+    def count(self, event: str, value: float = 1, **labels):
+        if self.enabled:
+            self.events.inc(value, (("event", event),) + tuple(sorted(labels.items())))
+
+    def add_collector(self, name: str, collect):
+        """
+        Registers a callable returning a flat dict of numeric statistics (for example a
+        cache's `get_stats`). Each entry is exported as the gauge `<prefix><name>_<key>`.
+        """
+        self._collectors.append((name, collect))
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in (self.stage_seconds, self.stage_errors, self.tokens, self.events):
+            lines.extend(metric.render())
+        for name, collect in self._collectors:
+            try:
+                stats = collect() or {}
+            except Exception as e:
+                print(f"Telemetry collector {name} failed: {e}")
+                continue
+            for key, value in sorted(stats.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = f"{self.prefix}{name}_{key}"
+                    lines.append(f"# TYPE {metric} gauge")
+                    lines.append(f"{metric} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _get_tracer(self):
+        if not self.otel_exporter:
+            return None
+        if self._tracer is None:
+            with self._lock:
+                if self._tracer is None:
+                    # False marks a failed set-up, so it is not retried on every span.
+                    self._tracer = self._create_tracer() or False
+        return self._tracer or None
+
+    def _create_tracer(self):
+        # Imported here so OpenTelemetry is only needed when an exporter is configured.
+        try:
+            from opentelemetry import trace
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+            if self.otel_exporter == "otlp":
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                exporter = OTLPSpanExporter()
+            else:
+                exporter = ConsoleSpanExporter()
+        except ImportError as e:
+            print(f"OpenTelemetry export is disabled; the package is not installed: {e}")
+            return None
+        provider = TracerProvider(resource=Resource.create({"service.name": self.service_name}))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        return trace.get_tracer(__name__)
+
+
+# A single, shared instance of the telemetry registry
+telemetry = Telemetry(
+    enabled=config.TELEMETRY_ENABLED,
+    otel_exporter=config.TELEMETRY_OTEL_EXPORTER,
+    service_name=config.TELEMETRY_SERVICE_NAME
+)
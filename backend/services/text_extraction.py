@@ -0,0 +1,161 @@
+import atexit
+import importlib
+import io
+import multiprocessing
+import threading
+import config
+
+PDF = "application/pdf"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class DocumentTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured extraction limits."""
+
+
+# Each worker keeps the reader for the file it last worked on, so pages of one
+# document do not re-parse the PDF's cross-reference table every time.
+_worker_reader = (None, None)
+
+def _init_worker():
+    # Loads pypdf once per worker, not per page.
+    importlib.import_module("pypdf")
+
+def _worker_ready(_) -> bool:
+    return True
+
+def _extract_page(args) -> str:
+    global _worker_reader
+    import pypdf
+
+    path, index = args
+    if _worker_reader[0] != path:
+        _worker_reader = (path, pypdf.PdfReader(path))
+    return _worker_reader[1].pages[index].extract_text() or ""
+
+
+class PdfPagePool:
+    """
+    A lazily started pool of worker processes that extract PDF pages in parallel.
+    Pages come back in order; a page that takes longer than the timeout is skipped.
+    A stuck worker cannot be interrupted, so its pool is retired: extractions started
+    afterwards get a new pool, and the old one is terminated once the extractions
+    still using it have finished.
+    """
+
+    def __init__(self, workers: int, page_timeout: float):
+        self.workers = workers
+        self.page_timeout = page_timeout
+        self._pool = None
+        # Number of extractions using each pool, including retired ones
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._pool is None:
+                # forkserver avoids forking a parent that holds gRPC and HTTP client threads.
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                pool = multiprocessing.get_context(method).Pool(self.workers, initializer=_init_worker)
+                # Wait for workers to start so start-up time is not charged to the first page's timeout.
+                pool.map(_worker_ready, range(self.workers), chunksize=1)
+                self._pool = pool
+            self._users[self._pool] = self._users.get(self._pool, 0) + 1
+            return self._pool
+
+    def _release(self, pool, retire: bool = False):
+        with self._lock:
+            if retire and pool is self._pool:
+                self._pool = None
+            self._users[pool] -= 1
+            if self._users[pool] == 0 and pool is not self._pool:
+                del self._users[pool]
+                pool.terminate()
+
+    def terminate(self):
+        with self._lock:
+            for pool in self._users:
+                pool.terminate()
+            if self._pool is not None:
+                self._pool.terminate()
+            self._pool = None
+            self._users = {}
+
+    def extract_pages(self, path: str, page_count: int):
+        """Yields the text of pages 0..page_count-1 of the PDF at `path`."""
+        index = 0
+        while index < page_count:
+            pool = self._acquire()
+            timed_out = False
+            try:
+                results = pool.imap(_extract_page, [(path, i) for i in range(index, page_count)])
+                while index < page_count:
+                    # Measured from when the previous page arrived, so queueing is not charged to this page.
+                    text = results.next(timeout=self.page_timeout)
+                    index += 1
+                    yield text
+            except multiprocessing.TimeoutError:
+                print(f"Skipping page {index + 1} of {path}: extraction took over {self.page_timeout}s")
+                timed_out = True
+                index += 1
+            finally:
+                self._release(pool, retire=timed_out)
+
+
+pdf_page_pool = PdfPagePool(workers=config.EXTRACTION_WORKERS, page_timeout=config.EXTRACTION_PAGE_TIMEOUT_SECONDS)
+atexit.register(pdf_page_pool.terminate)
+
+
+# --- Extraction ---
+
+def _as_stream(data):
+    # BytesIO shares the buffer of a bytes object; other buffers (e.g. mmap) are already seekable.
+    return io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+
+def iter_pdf_pages(data, path: str = None, max_pages: int = None):
+    """
+    Yields the text of each page of a PDF given as bytes or a memory-mapped buffer.
+    If parallel extraction is enabled, large documents with a file on disk are extracted
+    in the worker pool; others, where inter-process overhead would cost more than it
+    saves, in the calling thread. Only pages extracted in the pool are subject to the
+    page timeout; a page extracted in the calling thread cannot be interrupted.
+    """
+    import pypdf
+
+    max_pages = max_pages or config.EXTRACTION_MAX_PAGES
+    reader = pypdf.PdfReader(_as_stream(data))
+    page_count = len(reader.pages)
+    if page_count > max_pages:
+        print(f"PDF has {page_count} pages; only the first {max_pages} are extracted.")
+        page_count = max_pages
+
+    if (config.EXTRACTION_PARALLEL_ENABLED and pdf_page_pool.workers > 1 and path
+            and page_count >= config.EXTRACTION_PARALLEL_MIN_PAGES):
+        yield from pdf_page_pool.extract_pages(path, page_count)
+        return
+    for index in range(page_count):
+        yield reader.pages[index].extract_text() or ""
+
+def iter_docx_paragraphs(data):
+    """Yields the non-empty paragraphs of a DOCX document."""
+    import docx
+
+    for para in docx.Document(_as_stream(data)).paragraphs:
+        if para.text.strip():
+            yield para.text
+
+def iter_document_text(data, content_type: str, path: str = None):
+    """
+    Yields a document's text piece by piece (PDF pages or DOCX paragraphs), so chunking
+    can start before the whole document is extracted. Joining the pieces with blank
+    lines gives the document's full text.
+    """
+    if len(data) > config.EXTRACTION_MAX_FILE_BYTES:
+        raise DocumentTooLargeError(
+            f"File is {len(data)} bytes; the limit is {config.EXTRACTION_MAX_FILE_BYTES} bytes"
+        )
+    if content_type == PDF:
+        return iter_pdf_pages(data, path)
+    if content_type == DOCX:
+        return iter_docx_paragraphs(data)
+    raise ValueError(f"Unsupported file type for text extraction: {content_type}")
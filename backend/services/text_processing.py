@@ -0,0 +1,98 @@
+import hashlib
+import math
+import re
+import unicodedata
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_CHUNK_SEPARATOR = "\n\n"
+
+# Rough characters-per-token ratio for English text with Gemini tokenizers
+CHARS_PER_TOKEN = 4
+
+def normalize_text(text: str) -> str:
+    """Normalizes Unicode forms and collapses whitespace so trivially different copies hash alike."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+def content_hash(data) -> str:
+    """Returns the SHA-256 hex digest of raw bytes, or of normalized text."""
+    if isinstance(data, str):
+        data = normalize_text(data).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def estimate_tokens(text: str) -> int:
+    """Cheaply estimates the number of model tokens in the given text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def split_paragraphs(text: str) -> list[str]:
+    """Splits text on blank lines, dropping empty paragraphs."""
+    return [para.strip() for para in _PARAGRAPH_BREAK.split(text) if para.strip()]
+
+def _split_words(text: str, max_tokens: int) -> list[str]:
+    pieces, current, current_len = [], [], 0
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    for word in text.split():
+        if current and current_len + len(word) + 1 > max_chars:
+            pieces.append(" ".join(current))
+            current, current_len = [], 0
+        current.append(word)
+        current_len += len(word) + 1
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def _split_to_budget(unit: str, max_tokens: int) -> list[str]:
+    """Splits a paragraph that exceeds the budget by lines, then sentences, then words."""
+    if estimate_tokens(unit) <= max_tokens:
+        return [unit]
+    for splitter in (lambda u: u.split("\n"), _SENTENCE_END.split):
+        parts = [part.strip() for part in splitter(unit) if part.strip()]
+        if len(parts) > 1:
+            return [piece for part in parts for piece in _split_to_budget(part, max_tokens)]
+    return _split_words(unit, max_tokens)
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 0) -> list[str]:
+    """
+    Splits text into chunks of at most `max_tokens` estimated tokens.
+    Paragraph boundaries are kept where possible, and consecutive chunks share
+    up to `overlap_tokens` worth of trailing paragraphs for context.
+    """
+    return list(chunk_stream([text], max_tokens, overlap_tokens))
+
+def chunk_stream(pieces, max_tokens: int, overlap_tokens: int = 0):
+    """
+    Like `chunk_text`, for text arriving as an iterable of pieces (e.g. pages).
+    Pieces are treated as separate paragraphs, and each chunk is yielded as soon
+    as it is complete, so chunking keeps pace with extraction.
+    """
+    units = (piece for text in pieces for para in split_paragraphs(text) for piece in _split_to_budget(para, max_tokens))
+
+    def joined_tokens(chars: int) -> int:
+        return math.ceil(chars / CHARS_PER_TOKEN)
+
+    # Budgets are checked against the chunk as joined, separators included.
+    separator = len(_CHUNK_SEPARATOR)
+    current, current_chars = [], 0
+    for unit in units:
+        if current and joined_tokens(current_chars + separator + len(unit)) > max_tokens:
+            yield _CHUNK_SEPARATOR.join(current)
+
+            # Carry the tail of the previous chunk forward as overlap.
+            carried, carried_chars = [], 0
+            for previous in reversed(current):
+                previous_chars = len(previous) + (separator if carried else 0)
+                if joined_tokens(carried_chars + previous_chars) > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_chars += previous_chars
+            current, current_chars = carried, carried_chars
+
+            while current and joined_tokens(current_chars + separator + len(unit)) > max_tokens:
+                removed = current.pop(0)
+                current_chars -= len(removed) + (separator if current else 0)
+
+        current_chars += len(unit) + (separator if current else 0)
+        current.append(unit)
+
+    if current:
+        yield _CHUNK_SEPARATOR.join(current)
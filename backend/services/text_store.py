@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import os
+import config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_EXTENSIONS = {"zstd": "zst", "gzip": "gz"}
+
+
+def compress_text(text: str) -> tuple[bytes, str]:
+    """Compresses text with zstd when available, falling back to gzip. Returns (data, encoding)."""
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=config.TEXT_STORE_ZSTD_LEVEL).compress(data), "zstd"
+    return gzip.compress(data, compresslevel=6), "gzip"
+
+def decompress_text(data: bytes, encoding: str) -> str:
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Text was stored with zstd, but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if encoding == "gzip":
+        return gzip.decompress(data).decode("utf-8")
+    raise ValueError(f"Unsupported text encoding: {encoding}")
+
+
+class TextStore:
+    """
+    Keeps extracted document text as compressed objects outside Firestore.
+    `put` returns a small reference dict that is stored in the document metadata;
+    the text itself is only read back when it is actually needed.
+    """
+
+    def put(self, user_id: str, document_id: str, text: str, kind: str = "txt") -> dict:
+        data, encoding = compress_text(text)
+        # The text hash in the name means a re-upload never overwrites text another document still references.
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        path = f"{user_id}/{document_id}-{text_hash}.{kind}.{_EXTENSIONS[encoding]}"
+        self._write(path, data)
+        return {"path": path, "encoding": encoding, "size": len(text), "stored_size": len(data)}
+
+    def get(self, ref: dict) -> str:
+        return decompress_text(self._read(ref["path"]), ref["encoding"])
+
+    def delete(self, ref: dict):
+        self._remove(ref["path"])
+
+    def _write(self, path: str, data: bytes):
+        raise NotImplementedError
+
+    def _read(self, path: str) -> bytes:
+        raise NotImplementedError
+
+    def _remove(self, path: str):
+        raise NotImplementedError
+
+
+class GCSTextStore(TextStore):
+    """Stores text objects in a Cloud Storage bucket under `prefix`."""
+
+    def __init__(self, bucket, prefix: str):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _write(self, path: str, data: bytes):
+        # Stored as opaque bytes: a gzip Content-Encoding would make GCS decompress on download.
+        self.bucket.blob(self.prefix + path).upload_from_string(data, content_type="application/octet-stream")
+
+    def _read(self, path: str) -> bytes:
+        return self.bucket.blob(self.prefix + path).download_as_bytes()
+
+    def _remove(self, path: str):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.bucket.blob(self.prefix + path).delete()
+        except NotFound:
+            pass
+
+
+class LocalTextStore(TextStore):
+    """Stores text objects as files under `directory`, for local runs and tests."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _write(self, path: str, data: bytes):
+        full_path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(full_path + ".tmp", full_path)
+
+    def _read(self, path: str) -> bytes:
+        with open(os.path.join(self.directory, path), "rb") as f:
+            return f.read()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(os.path.join(self.directory, path))
+        except FileNotFoundError:
+            pass
+
+
+def create_text_store(default_bucket=None, prefix: str = None) -> TextStore:
+    """
+    Builds the text store selected in config. `default_bucket` is used when no bucket is
+    configured; `prefix` keeps other kinds of objects apart from the extracted text.
+    """
+    backend = config.TEXT_STORE_BACKEND
+    prefix = prefix or config.TEXT_STORE_PREFIX
+    if backend == "local":
+        if prefix == config.TEXT_STORE_PREFIX:
+            return LocalTextStore(config.LOCAL_TEXT_STORE_DIR)
+        return LocalTextStore(os.path.join(config.LOCAL_TEXT_STORE_DIR, prefix.strip("/")))
+    if backend == "gcs":
+        bucket = default_bucket
+        if config.TEXT_STORE_BUCKET:
+            from firebase_admin import storage
+            bucket = storage.bucket(config.TEXT_STORE_BUCKET)
+        return GCSTextStore(bucket, prefix=prefix)
+    raise ValueError(f"Unsupported text store backend: {backend}")
@@ -1,35 +1,124 @@
 import os
-import pinecone
-from genkit.retrievers import pinecone as pinecone_retriever
-from . import config
+import config
+from .ai_service import ai_service
+from .executor import run_blocking
+from .index_versions import index_versions
+from .vector_store import VectorStore, PineconeVectorStore
+from .providers import LazyService
+from .telemetry import telemetry
+
+def create_vector_store() -> VectorStore:
+    """Builds the vector store backend selected in config."""
+    backend = config.VECTOR_STORE_BACKEND
+    if backend == "pinecone":
+        # Assumes PINECONE_API_KEY is set as an environment variable.
+        return PineconeVectorStore(api_key=os.getenv("PINECONE_API_KEY"), index_name=config.PINECONE_INDEX_NAME)
+    if backend == "local":
+        from .local_vector_store import LocalVectorStore
+        return LocalVectorStore(directory=config.LOCAL_VECTOR_STORE_DIR)
+    raise ValueError(f"Unsupported vector store backend: {backend}")
 
 class VectorDBService:
-    def __init__(self, api_key: str, index_name: str):
-        if not api_key:
-            raise ValueError("Pinecone API key is required.")
-        pinecone.init(api_key=api_key)
-        self.retriever = pinecone_retriever.PineconeRetriever(index_name=index_name)
+    def __init__(self, store: VectorStore, embedder, versions):
+        self.store = store
+        self.embedder = embedder
+        self.versions = versions
+
+    def namespace_for(self, user_id: str, version: str = None) -> str:
+        """
+        Each user's vectors live in their own namespace per index version, so queries only scan
+        that user's corpus. `version` is a version name and defaults to the active version; the
+        original version "" uses the bare user ID, where vectors from before versions are.
+        """
+        if not user_id:
+            raise ValueError("A user ID is required to address the vector store.")
+        if version is None:
+            version = self.versions.active().name
+        return f"{user_id}@{version}" if version else user_id
 
-    def index(self, documents: list[dict]):
+    @staticmethod
+    def build_filter(document_types: list[str] = None, uploaded_after: float = None,
+                     uploaded_before: float = None) -> dict:
         """
-        Indexes documents in Pinecone.
-        Each document should be a dict, e.g., {"content": "...", "metadata": {"id": "..."}}
+        Builds a metadata filter from optional document types (e.g. ["pdf"]) and
+        upload-time bounds in epoch seconds. Returns None when nothing is filtered.
         """
-        self.retriever.index(documents)
-        print(f"Successfully indexed {len(documents)} documents.")
+        conditions = {}
+        if document_types:
+            conditions["doc_type"] = {"$in": list(document_types)}
+        uploaded_at = {}
+        if uploaded_after is not None:
+            uploaded_at["$gte"] = uploaded_after
+        if uploaded_before is not None:
+            uploaded_at["$lte"] = uploaded_before
+        if uploaded_at:
+            conditions["uploaded_at"] = uploaded_at
+        return conditions or None
 
-    def retrieve(self, query: str, k: int = 3) -> list[dict]:
+    def upsert(self, vectors: list[dict], user_id: str, version: str = None):
         """
-        Retrieves relevant documents from Pinecone.
-        Returns a list of document dictionaries.
+        Upserts pre-computed vectors into the user's namespace for an index version (by default the active one).
+        Each vector should be a dict, e.g., {"id": "...", "values": [...], "metadata": {"text": "..."}}
         """
-        retrieved_docs = self.retriever.retrieve(query, k=k)
-        return [{"text": doc.text, "metadata": doc.metadata} for doc in retrieved_docs]
+        self.store.upsert(vectors, namespace=self.namespace_for(user_id, version))
+        print(f"Successfully upserted {len(vectors)} vectors.")
+
+    def delete(self, ids: list[str], user_id: str, version: str = None):
+        """Deletes vectors by ID from the user's namespace, in batches of the maximum size Pinecone accepts."""
+        namespace = self.namespace_for(user_id, version)
+        for start in range(0, len(ids), config.VECTOR_DELETE_BATCH_SIZE):
+            self.store.delete(ids[start:start + config.VECTOR_DELETE_BATCH_SIZE], namespace=namespace)
+
+    def fetch(self, ids: list[str], user_id: str, version: str = None) -> list[dict]:
+        """Fetches stored vectors by ID from the user's namespace, in batches of the maximum size Pinecone accepts."""
+        namespace = self.namespace_for(user_id, version)
+        vectors = []
+        for start in range(0, len(ids), config.VECTOR_FETCH_BATCH_SIZE):
+            vectors.extend(self.store.fetch(ids[start:start + config.VECTOR_FETCH_BATCH_SIZE], namespace=namespace))
+        return vectors
+
+    def delete_by_version(self, ids_by_version: dict, user_id: str):
+        """Deletes vectors given as {index version name: IDs}, e.g. as returned by `release_content`."""
+        for version, ids in ids_by_version.items():
+            self.delete(ids, user_id, version)
+
+    def retrieve(self, query: str, user_id: str, k: int = 3, filter: dict = None,
+                 include_values: bool = False) -> list[dict]:
+        """
+        Retrieves the user's most relevant document chunks, optionally restricted by a metadata filter.
+        Returns a list of document dictionaries, with each chunk's vector under "values" if requested.
+        """
+        # The query has to be embedded by the model the active version's vectors came from.
+        version = self.versions.active()
+        with telemetry.span("retrieval.embed_query"):
+            query_vector = self.embedder.embed_text(query, model=version.embedder)
+        with telemetry.span("retrieval.vector_query", top_k=k):
+            matches = self.store.query(
+                query_vector, top_k=k, namespace=self.namespace_for(user_id, version.name), filter=filter,
+                include_values=include_values
+            )
+        docs = []
+        for match in matches:
+            doc = {
+                "id": match["id"],
+                "text": match["metadata"].get("text", ""),
+                "metadata": match["metadata"],
+                "score": match["score"],
+            }
+            if include_values:
+                doc["values"] = match["values"]
+            docs.append(doc)
+        return docs
+
+    async def retrieve_async(self, query: str, user_id: str, k: int = 3, filter: dict = None,
+                             include_values: bool = False) -> list[dict]:
+        """Async counterpart of `retrieve`, run on the shared service executor."""
+        return await run_blocking(self.retrieve, query, user_id, k=k, filter=filter, include_values=include_values)
 
-# A single, shared instance of the service
-# This uses the configuration from the config.py file
-# and assumes PINECONE_API_KEY is set as an environment variable.
-vector_db_service = VectorDBService(
-    api_key=os.getenv("PINECONE_API_KEY"),
-    index_name=config.PINECONE_INDEX_NAME
-)
+# A single, shared instance of the service, built on first use
+# This uses the vector store backend configured in the config.py file.
+vector_db_service = LazyService(lambda: VectorDBService(
+    store=create_vector_store(),
+    embedder=ai_service,
+    versions=index_versions
+))
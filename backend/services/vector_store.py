@@ -0,0 +1,99 @@
+def matches_filter(metadata: dict, filter: dict) -> bool:
+    """Evaluates a Pinecone-style metadata filter against one vector's metadata."""
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(key)
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                ok = {"$gt": value > operand, "$gte": value >= operand,
+                      "$lt": value < operand, "$lte": value <= operand}[op]
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            if not ok:
+                return False
+    return True
+
+
+class VectorStore:
+    """
+    Interface implemented by the vector store backends used by VectorDBService.
+    Vectors are dicts of the form {"id": "...", "values": [...], "metadata": {...}}.
+    Filters use Pinecone's metadata filter syntax, e.g. {"doc_type": {"$eq": "pdf"}}.
+    """
+
+    def upsert(self, vectors: list[dict], namespace: str = ""):
+        raise NotImplementedError
+
+    def delete(self, ids: list[str], namespace: str = ""):
+        raise NotImplementedError
+
+    def fetch(self, ids: list[str], namespace: str = "") -> list[dict]:
+        """Returns the stored vectors with the given IDs; IDs that do not exist are left out."""
+        raise NotImplementedError
+
+    def query(self, vector: list[float], top_k: int, namespace: str = "", filter: dict = None,
+              include_values: bool = False) -> list[dict]:
+        """Returns up to `top_k` matches as dicts with "id", "score", "metadata" (and "values" if requested)."""
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    """Vector store backed by a hosted Pinecone index."""
+
+    def __init__(self, api_key: str, index_name: str):
+        if not api_key:
+            raise ValueError("Pinecone API key is required.")
+        # Imported here so the local backend does not need the Pinecone client installed.
+        import pinecone
+        pinecone.init(api_key=api_key)
+        self.index_client = pinecone.Index(index_name)
+
+    def upsert(self, vectors: list[dict], namespace: str = ""):
+        self.index_client.upsert(vectors=vectors, namespace=namespace)
+
+    def delete(self, ids: list[str], namespace: str = ""):
+        self.index_client.delete(ids=ids, namespace=namespace)
+
+    def fetch(self, ids: list[str], namespace: str = "") -> list[dict]:
+        results = self.index_client.fetch(ids=ids, namespace=namespace)
+        return [
+            {"id": vector["id"], "values": vector["values"], "metadata": vector.get("metadata") or {}}
+            for vector in results["vectors"].values()
+        ]
+
+    def query(self, vector: list[float], top_k: int, namespace: str = "", filter: dict = None,
+              include_values: bool = False) -> list[dict]:
+        results = self.index_client.query(
+            vector=vector,
+            top_k=top_k,
+            namespace=namespace,
+            filter=filter,
+            include_metadata=True,
+            include_values=include_values,
+        )
+        matches = []
+        for match in results["matches"]:
+            result = {"id": match["id"], "score": match["score"], "metadata": match["metadata"] or {}}
+            if include_values:
+                result["values"] = match["values"]
+            matches.append(result)
+        return matches
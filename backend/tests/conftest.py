@@ -0,0 +1,25 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes  # noqa: E402
+
+# Services are built against the in-process fakes, without simulated latency.
+FAKES = fakes.install(fakes.Latencies(
+    firestore=0, storage=0, embed=0, vector_query=0, model_first_token=0, model_chunk_interval=0, google_api=0
+))
+
+
+@pytest.fixture
+def fake_env():
+    return FAKES
+
+
+@pytest.fixture
+def user_id():
+    """A fresh user, so tests sharing the fake services do not see each other's data."""
+    return f"user-{uuid.uuid4().hex[:12]}"
@@ -0,0 +1,19 @@
+import sys
+
+from benchmarks.fakes import fake_embedding
+from services.ai_service import AIService
+
+
+def test_embeds_a_text_per_call_when_the_client_has_no_embed_many(fake_env, monkeypatch):
+    monkeypatch.delattr(sys.modules["genkit"], "embed_many")
+    service = AIService(embedder="embedder", generator="generator")
+    calls_before = fake_env.genkit.embed_calls
+    assert service.embed_texts(["one", "two"]) == [fake_embedding("one"), fake_embedding("two")]
+    assert fake_env.genkit.embed_calls - calls_before == 2
+
+
+def test_embeds_a_batch_in_one_call_with_embed_many(fake_env):
+    service = AIService(embedder="embedder", generator="generator")
+    calls_before = fake_env.genkit.embed_calls
+    assert service.embed_texts(["one", "two"]) == [fake_embedding("one"), fake_embedding("two")]
+    assert fake_env.genkit.embed_calls - calls_before == 1
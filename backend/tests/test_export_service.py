@@ -0,0 +1,36 @@
+import asyncio
+
+from services.export_service import DONE, PENDING, ExportService, InMemoryExportStore
+
+
+class BlockingGcp:
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def create_google_doc_async(self, title, cover_letter, resume_summary):
+        await self.release.wait()
+        return f"https://docs.google.com/document/d/{title}"
+
+
+def test_job_submitted_to_a_full_queue_is_recovered_later():
+    async def run():
+        gcp = BlockingGcp()
+        service = ExportService(gcp, InMemoryExportStore(max_jobs=10, lease_seconds=600), workers=1,
+                                queue_size=1, lease_seconds=600, recovery_interval=3600)
+        running = await service.submit("u", "running", "letter", "resume")
+        await asyncio.sleep(0)
+        queued = await service.submit("u", "queued", "letter", "resume")
+        deferred = await service.submit("u", "deferred", "letter", "resume")
+        assert (await service.get_status("u", deferred))["status"] == PENDING
+        assert service.get_stats()["deferred"] == 1
+
+        gcp.release.set()
+        for export_id in (running, queued):
+            assert (await service.wait_for("u", export_id, timeout=1))["status"] == DONE
+        assert await service.recover() == 1
+        status = await service.wait_for("u", deferred, timeout=1)
+        await service.stop()
+        return status
+
+    status = asyncio.run(run())
+    assert status["status"] == DONE and status["document_url"].endswith("/deferred")
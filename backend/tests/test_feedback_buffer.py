@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from services.feedback_buffer import FeedbackBuffer, FeedbackBufferFullError
+from services.firebase_service import FirebaseService
+from services.text_processing import content_hash
+
+
+class RecordingFirebase:
+    def __init__(self):
+        self.batches = []
+
+    async def store_feedback_batch_async(self, entries, contents):
+        self.batches.append((entries, contents))
+        return len(contents)
+
+
+def make_buffer(firebase, max_pending=100, enqueue_timeout=1.0):
+    return FeedbackBuffer(firebase, batch_size=10, flush_interval=60, max_pending=max_pending,
+                          enqueue_timeout=enqueue_timeout, known_content_max_entries=100)
+
+
+def feedback_payload(job_description, cover_letter, resume):
+    """The content hashes a final_result carries, and the texts the client sends back with them."""
+    texts = {"job_description": job_description, "cover_letter": cover_letter, "resume": resume}
+    return {"content_hashes": {name: content_hash(text) for name, text in texts.items()}, "texts": texts}
+
+
+def test_texts_are_written_once_per_generation():
+    async def run():
+        firebase = RecordingFirebase()
+        buffer = make_buffer(firebase)
+        payload = feedback_payload("job", "cover letter", "resume")
+        await buffer.submit("great", **payload)
+        await buffer.flush()
+        await buffer.submit("still great", **payload)
+        await buffer.stop()
+        return firebase.batches
+
+    (first_entries, first_contents), (entries, contents) = asyncio.run(run())
+    assert sorted(first_contents.values()) == ["cover letter", "job", "resume"]
+    assert first_entries[0]["cover_letter_hash"] == content_hash("cover letter")
+    assert len(entries) == 1 and contents == {}
+
+
+def test_texts_must_match_their_hashes():
+    payload = feedback_payload("job", "cover letter", "resume")
+    payload["texts"]["cover_letter"] = "edited cover letter"
+    with pytest.raises(ValueError):
+        asyncio.run(make_buffer(RecordingFirebase()).submit("great", **payload))
+
+
+def test_texts_already_stored_are_not_written_again(fake_env):
+    firebase = FirebaseService()
+    contents = {content_hash(text): text for text in ("job", "cover letter")}
+    assert firebase.store_feedback_batch([{"feedback": "great"}], contents) == 2
+    # Another instance, which has not seen these hashes, only writes the new text.
+    contents[content_hash("resume")] = "resume"
+    assert firebase.store_feedback_batch([{"feedback": "fine"}], contents) == 1
+
+
+def test_stop_writes_everything_queued():
+    async def run():
+        firebase = RecordingFirebase()
+        buffer = make_buffer(firebase)
+        for i in range(25):
+            await buffer.submit(f"feedback {i}", **feedback_payload("job", f"letter {i}", f"resume {i}"))
+        await buffer.stop()
+        return firebase.batches, buffer.get_stats()
+
+    batches, stats = asyncio.run(run())
+    assert sum(len(entries) for entries, _ in batches) == 25
+    assert sum(len(contents) for _, contents in batches) == 51
+    assert stats["pending"] == 0
+
+
+def test_full_queue_rejects_after_the_timeout():
+    class StuckFirebase:
+        async def store_feedback_batch_async(self, entries, contents):
+            await asyncio.sleep(60)
+
+    async def run():
+        buffer = make_buffer(StuckFirebase(), max_pending=1, enqueue_timeout=0.05)
+        await buffer.submit("first", **feedback_payload("job", "letter", "resume"))
+        try:
+            await buffer.submit("second", **feedback_payload("job", "letter", "resume"))
+        except FeedbackBufferFullError:
+            return True
+        finally:
+            buffer._task.cancel()
+        return False
+
+    assert asyncio.run(run())
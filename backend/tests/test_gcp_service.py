@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from googleapiclient.errors import HttpError
+
+import config
+from services.gcp_service import GCPService
+
+
+class Checkpoints:
+    def __init__(self, history_id):
+        self.saved = None
+        self._checkpoint = {"history_id": history_id}
+
+    def get_job_scout_checkpoint(self, account):
+        return self._checkpoint
+
+    def save_job_scout_checkpoint(self, account, history_id):
+        self.saved = history_id
+
+
+def run_scout(monkeypatch, error) -> Checkpoints:
+    """Runs the job scout over two new alerts, where every request for the second fails with `error`."""
+    service = GCPService(project_id="test-project")
+    gmail = MagicMock()
+    gmail.users().history().list().execute.return_value = {
+        "history": [{"messagesAdded": [{"message": {"id": "m1"}}, {"message": {"id": "m2"}}]}],
+        "historyId": "200",
+    }
+    monkeypatch.setattr(service.clients, "get", lambda api, version: gmail)
+    monkeypatch.setattr(service, "_build_job_event", lambda message: {"id": message["id"]})
+
+    sender = config.JOB_SCOUT_SENDERS[0]
+    def run_batched(api, version, items, make_request, conflict_ok=False):
+        results = {key: {"id": key, "labelIds": ["UNREAD", "INBOX"],
+                         "payload": {"headers": [{"name": "From", "value": sender}]}}
+                   for key, _ in items if key != "m2"}
+        return results, {key: error for key, _ in items if key == "m2"}
+    monkeypatch.setattr(service, "_run_batched", run_batched)
+
+    checkpoints = Checkpoints("100")
+    service.run_job_scout(checkpoints)
+    return checkpoints
+
+
+def test_permanently_failed_message_does_not_block_checkpoint(monkeypatch):
+    assert run_scout(monkeypatch, HttpError(SimpleNamespace(status=404))).saved == "200"
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_transient_failure_keeps_checkpoint(monkeypatch, status):
+    assert run_scout(monkeypatch, HttpError(SimpleNamespace(status=status))).saved is None
+
+
+
+def test_history_sync_finds_alerts_outside_the_inbox_like_the_full_search(monkeypatch):
+    service = GCPService(project_id="test-project")
+    gmail = MagicMock()
+    gmail.users().history().list().execute.return_value = {
+        "history": [{"messagesAdded": [{"message": {"id": message_id}} for message_id in ("filed", "spam", "read", "other")]}],
+        "historyId": "200",
+    }
+    monkeypatch.setattr(service.clients, "get", lambda api, version: gmail)
+    monkeypatch.setattr(service, "_build_job_event", lambda message: {"id": message["id"]})
+
+    sender = config.JOB_SCOUT_SENDERS[0]
+    messages = {
+        # Filed under a label by a filter that skips the inbox
+        "filed": (["UNREAD", "Label_7"], sender),
+        "spam": (["UNREAD", "SPAM"], sender),
+        "read": (["Label_7"], sender),
+        "other": (["UNREAD", "INBOX"], "someone@example.com"),
+    }
+    requested = []
+    def run_batched(api, version, items, make_request, conflict_ok=False):
+        requested.append((api, [key for key, _ in items]))
+        return {key: {"id": key, "labelIds": messages[key][0],
+                      "payload": {"headers": [{"name": "From", "value": messages[key][1]}]}}
+                for key, _ in items}, {}
+    monkeypatch.setattr(service, "_run_batched", run_batched)
+
+    service.run_job_scout(Checkpoints("100"))
+    assert "labelId" not in gmail.users().history().list.call_args.kwargs
+    assert requested[1:] == [("gmail", ["filed"]), ("calendar", ["filed"])]
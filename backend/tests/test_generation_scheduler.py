@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from services.generation_scheduler import GenerationScheduler, SchedulerBusyError
+
+
+def make_scheduler(**limits):
+    return GenerationScheduler(**{"max_concurrent": 4, "max_per_user": 4, "rate_per_minute": 0,
+                                  "burst": 1, "max_queue": 10, **limits})
+
+
+async def collect(scheduler, key, user_id, produce):
+    return [event async for event in scheduler.submit(key, user_id, produce)]
+
+
+def test_zero_rate_means_no_rate_limit():
+    async def run():
+        scheduler = make_scheduler(rate_per_minute=0, burst=0)
+
+        async def produce():
+            yield "final_result", "done"
+        return await asyncio.gather(*(collect(scheduler, key, "user", produce) for key in range(3)))
+
+    assert asyncio.run(run()) == [[("final_result", "done")]] * 3
+
+
+@pytest.mark.parametrize("limits", [{"rate_per_minute": -1}, {"rate_per_minute": 60, "burst": 0}])
+def test_invalid_rate_limits_are_rejected(limits):
+    with pytest.raises(ValueError):
+        make_scheduler(**limits)
+
+
+def test_identical_requests_share_one_generation():
+    calls = []
+
+    async def run():
+        scheduler = make_scheduler()
+
+        async def produce():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            yield "final_result", "shared"
+        return await asyncio.gather(*(collect(scheduler, "same", f"user-{i}", produce) for i in range(3)))
+
+    assert asyncio.run(run()) == [[("final_result", "shared")]] * 3
+    assert len(calls) == 1
+
+
+def test_queue_positions_are_reported_and_full_queue_rejects():
+    async def run():
+        scheduler = make_scheduler(max_concurrent=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def produce():
+            await release.wait()
+            yield "final_result", "ok"
+        first = asyncio.ensure_future(collect(scheduler, "a", "u1", produce))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(collect(scheduler, "b", "u2", produce))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusyError):
+            await collect(scheduler, "c", "u3", produce)
+        release.set()
+        return await first, await second
+
+    first, second = asyncio.run(run())
+    assert first == [("final_result", "ok")]
+    assert second == [("queue", {"position": 1}), ("final_result", "ok")]
@@ -0,0 +1,122 @@
+import io
+import random
+
+import pytest
+
+import config
+from benchmarks import fakes
+from services.ai_service import ai_service
+from services.firebase_service import FirebaseService, firebase_service
+from services.index_versions import IndexVersion, IndexVersionRegistry, index_versions
+from services.ingestion_service import IngestionService
+from services.lexical_index import LexicalIndexService
+from services.text_extraction import DOCX
+from services.vector_db_service import VectorDBService, vector_db_service
+
+docx = pytest.importorskip("docx")
+
+
+class CountingIngestionService(IngestionService):
+    embedded = 0
+
+    def _embed_batch_with_retry(self, texts, model=None):
+        self.embedded += len(texts)
+        return super()._embed_batch_with_retry(texts, model)
+
+
+def make_ingestion(firebase, vector_db, versions):
+    return CountingIngestionService(
+        ai=ai_service, firebase=firebase, vector_db=vector_db, versions=versions,
+        embed_batch_size=config.EMBED_BATCH_SIZE, max_concurrency=2, max_retries=0,
+        upsert_batch_size=config.VECTOR_UPSERT_BATCH_SIZE,
+    )
+
+
+@pytest.fixture
+def ingestion():
+    return make_ingestion(firebase_service, vector_db_service, index_versions)
+
+
+def paragraphs(seed: int, count: int = 3, words: int = 300) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(f"word{rng.randrange(5000)}" for _ in range(words)) + "." for _ in range(count)]
+
+
+def docx_bytes(texts: list[str]) -> bytes:
+    document = docx.Document()
+    for text in texts:
+        document.add_paragraph(text)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def stored_vector_ids(user_id: str, document_id: str) -> tuple[list[str], list[str]]:
+    """Returns (the chunk IDs a document lists, those of them that exist in the vector store)."""
+    listed = firebase_service._user_documents(user_id).document(document_id).get().to_dict().get("chunk_ids", [])
+    return listed, [vector["id"] for vector in vector_db_service.fetch(listed, user_id)]
+
+
+def test_reupload_after_promotion_keeps_linked_documents_vectors(ingestion, user_id):
+    original = paragraphs(1)
+    edited = original[:2] + paragraphs(2, count=1)
+    original_bytes = docx_bytes(original)
+
+    p1 = ingestion.ingest_upload(user_id, f"users/{user_id}/p1.docx", original_bytes, DOCX)
+    p2 = ingestion.ingest_upload(user_id, f"users/{user_id}/p2.docx", original_bytes, DOCX)
+    embedded_before_edit = ingestion.embedded
+
+    # Re-uploading edited content to p1 promotes p2 to own the original content.
+    assert ingestion.ingest_upload(user_id, f"users/{user_id}/p1.docx", docx_bytes(edited), DOCX) == p1
+    edited_listed, _ = stored_vector_ids(user_id, p1)
+    assert ingestion.embedded - embedded_before_edit < len(edited_listed), "unchanged chunks should be reused"
+
+    firebase_service.storage.blob(f"users/{user_id}/p1.docx").upload_from_string(b"")
+    ingestion.delete_document(user_id, p1)
+
+    listed, stored = stored_vector_ids(user_id, p2)
+    assert listed and stored == listed
+    assert all(chunk_id.startswith(f"{p2}#") for chunk_id in listed)
+    assert firebase_service.get_document_text(user_id, p2) == "\n\n".join(original)
+
+
+def test_edited_copy_under_a_new_name_only_embeds_changed_chunks(ingestion, user_id):
+    original = paragraphs(4)
+    edited = original[:3] + paragraphs(5, count=1)
+    first = ingestion.ingest_upload(user_id, f"users/{user_id}/cv.docx", docx_bytes(original), DOCX)
+    embedded_before_copy = ingestion.embedded
+
+    copy = ingestion.ingest_upload(user_id, f"users/{user_id}/cv (edited).docx", docx_bytes(edited), DOCX)
+    listed, stored = stored_vector_ids(user_id, copy)
+    first_listed, _ = stored_vector_ids(user_id, first)
+    shared = {chunk_id.split("#", 1)[1] for chunk_id in listed} & {chunk_id.split("#", 1)[1] for chunk_id in first_listed}
+    assert shared and ingestion.embedded - embedded_before_copy == len(listed) - len(shared)
+    # The copy owns its vectors, so deleting the first document leaves them in place.
+    assert stored == listed and all(chunk_id.startswith(f"{copy}#") for chunk_id in listed)
+    firebase_service.storage.blob(f"users/{user_id}/cv.docx").upload_from_string(b"")
+    ingestion.delete_document(user_id, first)
+    assert stored_vector_ids(user_id, copy)[1] == listed
+
+
+def test_rebuild_indexes_lexical_shards_for_the_new_version(user_id):
+    # Index versions are project-wide, so this test gets a Firestore of its own.
+    firebase = FirebaseService()
+    firebase.db = fakes.FakeFirestore(0)
+    versions = IndexVersionRegistry(firebase, refresh_seconds=0)
+    vector_db = VectorDBService(store=vector_db_service.store, embedder=ai_service, versions=versions)
+    ingestion = make_ingestion(firebase, vector_db, versions)
+    lexical = LexicalIndexService(firebase, versions, max_users=10, ttl_seconds=60)
+
+    texts = paragraphs(3)
+    document_id = ingestion.ingest_upload(user_id, f"users/{user_id}/cv.docx", docx_bytes(texts), DOCX)
+    query = texts[1][:200]
+    original_ids = firebase._user_documents(user_id).document(document_id).get().to_dict()["chunk_ids"]
+    assert {hit["id"] for hit in lexical.search(user_id, query, k=5, corpus_version=0)} <= set(original_ids)
+
+    rechunked = IndexVersion("rechunked", versions.active().embedder, 120, 20)
+    assert ingestion.rebuild_index(rechunked, page_size=10, workers=2) == 1
+
+    new_ids = firebase._user_documents(user_id).document(document_id).get().to_dict()["version_chunk_ids"]["rechunked"]
+    assert not set(new_ids) & set(original_ids)
+    hits = lexical.search(user_id, query, k=5, corpus_version=0)
+    assert hits and {hit["id"] for hit in hits} <= set(new_ids)
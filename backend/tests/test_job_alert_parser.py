@@ -0,0 +1,57 @@
+import base64
+import datetime
+
+from services.job_alert_parser import parse_closing_date, parse_job_alert
+
+
+def encode(text):
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def message(subject, sender="SEEK <noreply@seek.com.au>", plain=None, html=None):
+    parts = []
+    if plain is not None:
+        parts.append({"mimeType": "text/plain", "body": {"data": encode(plain)}})
+    if html is not None:
+        parts.append({"mimeType": "text/html", "body": {"data": encode(html)}})
+    return {"payload": {
+        "mimeType": "multipart/alternative",
+        "headers": [{"name": "Subject", "value": subject}, {"name": "From", "value": sender}],
+        "parts": parts,
+    }}
+
+
+def test_parses_title_employer_date_and_link_from_plain_text():
+    alert = parse_job_alert(message(
+        "Fwd: New job: Support Worker at Anglicare",
+        plain="A new role for you.\nApplications close 3rd March 2025\nhttps://www.seek.com.au/job/12345?ref=alert\n",
+    ))
+    assert alert == {
+        "title": "Support Worker",
+        "employer": "Anglicare",
+        "closing_date": datetime.date(2025, 3, 3),
+        "url": "https://www.seek.com.au/job/12345?ref=alert",
+    }
+
+
+def test_falls_back_to_html_body_and_sender_name():
+    alert = parse_job_alert(message(
+        "Job Alert: Community Development Officer",
+        sender="Ethical Jobs <alerts@ethicaljobs.com.au>",
+        html="<p>Closing date: 14/03/2025</p><a href='x'>https://www.ethicaljobs.com.au/members/job/1</a>",
+    ))
+    assert alert["title"] == "Community Development Officer"
+    assert alert["employer"] == "Ethical Jobs"
+    assert alert["closing_date"] == datetime.date(2025, 3, 14)
+    assert alert["url"] == "https://www.ethicaljobs.com.au/members/job/1"
+
+
+def test_employer_line_in_body_beats_sender():
+    alert = parse_job_alert(message("Case Manager", plain="Employer: Uniting\nNo closing date given."))
+    assert (alert["title"], alert["employer"], alert["closing_date"], alert["url"]) == ("Case Manager", "Uniting", None, None)
+
+
+def test_closing_dates_are_read_day_first():
+    assert parse_closing_date("Closes: 05/04/2025") == datetime.date(2025, 4, 5)
+    assert parse_closing_date("Applications close on Friday, March 7, 2025") == datetime.date(2025, 3, 7)
+    assert parse_closing_date("closing date 31/02/2025") is None
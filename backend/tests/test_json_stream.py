@@ -0,0 +1,30 @@
+import json
+
+from services.json_stream import JsonFieldStreamer
+
+
+def stream(text: str, piece_size: int) -> dict:
+    streamer = JsonFieldStreamer()
+    fields = {}
+    for start in range(0, len(text), piece_size):
+        for key, delta in streamer.feed(text[start:start + piece_size]):
+            fields[key] = fields.get(key, "") + delta
+    return fields
+
+
+def test_fields_match_json_loads_for_any_split():
+    answer = {"cover_letter_text": 'Dear "team",\n\tI’m keen \U0001F680 \\ / done', "resume_text": "Skills: Python"}
+    text = "```json\n" + json.dumps(answer) + "\n```"
+    for piece_size in (1, 2, 3, 7, len(text)):
+        assert stream(text, piece_size) == answer
+
+
+def test_nested_values_are_not_streamed():
+    text = '{"cover_letter_text": "Hi", "extra": {"cover_letter_text": "nested"}, "resume_text": "CV"}'
+    assert stream(text, 4) == {"cover_letter_text": "Hi", "resume_text": "CV"}
+
+
+def test_malformed_unicode_escape_becomes_replacement_character():
+    text = '{"cover_letter_text": "a\\uZZb\\u12", "resume_text": "\\u+1ab"}'
+    for piece_size in (1, 5, len(text)):
+        assert stream(text, piece_size) == {"cover_letter_text": "a\ufffdZZb\ufffd", "resume_text": "\ufffd+1ab"}
@@ -0,0 +1,111 @@
+import threading
+
+import numpy as np
+
+from services.local_vector_store import LocalVectorStore, _ReadWriteLock
+from services.vector_store import matches_filter
+
+
+def make_vectors(count, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    doc_types = ["pdf", "docx", None]
+    vectors = []
+    for i in range(count):
+        metadata = {"document_id": f"d{i % 7}", "uploaded_at": 1000 + i}
+        if doc_types[i % 3]:
+            metadata["doc_type"] = doc_types[i % 3]
+        if i % 5 == 0:
+            metadata["tags"] = ["a", "b"]
+        vectors.append({"id": f"v{i}", "values": rng.normal(size=dim).tolist(), "metadata": metadata})
+    return vectors
+
+
+FILTERS = [
+    {"doc_type": "pdf"},
+    {"doc_type": {"$ne": "pdf"}},
+    {"doc_type": {"$in": ["pdf", "docx"]}},
+    {"doc_type": {"$nin": ["docx"]}},
+    {"uploaded_at": {"$gte": 1010, "$lt": 1030}},
+    {"uploaded_at": {"$gt": 1040}, "doc_type": {"$eq": "docx"}},
+    {"$or": [{"document_id": "d1"}, {"uploaded_at": {"$lte": 1003}}]},
+    {"$and": [{"doc_type": {"$in": ["pdf"]}}, {"document_id": {"$nin": ["d0", "d2"]}}]},
+    {"tags": {"$eq": ["a", "b"]}},
+    {"missing": {"$gt": 0}},
+    {"doc_type": {"$in": []}},
+]
+
+
+def test_filtered_query_matches_per_row_filter(tmp_path):
+    vectors = make_vectors(60)
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert(vectors[:40], namespace="u")
+    store.upsert(vectors[40:], namespace="u")
+    store.delete(["v3", "v4"], namespace="u")
+    live = [vector for vector in vectors if vector["id"] not in ("v3", "v4")]
+    for filter in FILTERS:
+        expected = {vector["id"] for vector in live if matches_filter(vector["metadata"], filter)}
+        matches = store.query(vectors[0]["values"], top_k=100, namespace="u", filter=filter)
+        assert {match["id"] for match in matches} == expected, filter
+
+
+def test_query_ranks_by_cosine_and_survives_reload_and_compaction(tmp_path):
+    vectors = make_vectors(20)
+    store = LocalVectorStore(str(tmp_path), compaction_threshold=1.0)
+    store.upsert(vectors, namespace="u")
+    store.upsert([{**vectors[5], "metadata": {"doc_type": "txt"}}], namespace="u")
+    store.delete(["v6"], namespace="u")
+
+    top = store.query(vectors[5]["values"], top_k=3, namespace="u")
+    assert top[0]["id"] == "v5" and top[0]["score"] > 0.999
+    assert store.query(vectors[5]["values"], top_k=5, namespace="u", filter={"doc_type": "txt"})[0]["id"] == "v5"
+
+    reloaded = LocalVectorStore(str(tmp_path))
+    reloaded.compact(namespace="u")
+    ids = {match["id"] for match in reloaded.query(vectors[0]["values"], top_k=100, namespace="u")}
+    assert ids == {vector["id"] for vector in vectors} - {"v6"}
+    assert [match["id"] for match in reloaded.query(vectors[5]["values"], top_k=1, namespace="u",
+                                                    filter={"doc_type": "txt"})] == ["v5"]
+    assert reloaded.query(vectors[0]["values"], top_k=5, namespace="other") == []
+
+
+def test_fetch_returns_stored_vectors(tmp_path):
+    vectors = make_vectors(3)
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert(vectors, namespace="u")
+    fetched = store.fetch(["v2", "missing", "v0"], namespace="u")
+    assert [vector["id"] for vector in fetched] == ["v2", "v0"]
+    assert fetched[0]["metadata"] == vectors[2]["metadata"]
+    expected = np.asarray(vectors[2]["values"]) / np.linalg.norm(vectors[2]["values"])
+    assert np.allclose(fetched[0]["values"], expected, atol=1e-6)
+
+
+def test_read_write_lock_shares_reads_and_excludes_writers():
+    lock = _ReadWriteLock()
+    lock.acquire_read()
+    second_reader = threading.Thread(target=lambda: (lock.acquire_read(), lock.release_read()))
+    second_reader.start()
+    second_reader.join(timeout=1)
+    assert not second_reader.is_alive()
+
+    written = threading.Event()
+
+    def write():
+        with lock.writing():
+            written.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    assert not written.wait(0.1)
+    lock.release_read()
+    assert written.wait(1)
+    writer.join()
+
+
+def test_namespaces_with_the_same_safe_name_stay_apart(tmp_path):
+    vectors = make_vectors(2)
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert([vectors[0]], namespace="a@b")
+    store.upsert([vectors[1]], namespace="a_b")
+    for reloaded in (store, LocalVectorStore(str(tmp_path))):
+        assert [match["id"] for match in reloaded.query(vectors[0]["values"], top_k=5, namespace="a@b")] == ["v0"]
+        assert [match["id"] for match in reloaded.query(vectors[0]["values"], top_k=5, namespace="a_b")] == ["v1"]
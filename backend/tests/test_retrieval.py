@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from services.lexical_index import LexicalIndex, build_shard
+from services.retrieval_service import HybridRetriever, reciprocal_rank_fusion
+
+
+def hit(chunk_id, **extra):
+    return {"id": chunk_id, "text": chunk_id, "metadata": {}, "score": 0.0, **extra}
+
+
+def test_rrf_merges_rankings_and_keeps_vectors():
+    fused = reciprocal_rank_fusion(
+        [[hit("a", values=[1.0]), hit("b", values=[0.0])], [hit("b"), hit("c")]], k=60, limit=3
+    )
+    assert [doc["id"] for doc in fused] == ["b", "a", "c"]
+    assert fused[0]["score"] == 1.0 and fused[0]["values"] == [0.0]
+    assert "values" not in fused[2]
+
+
+def test_bm25_ranks_matching_chunks_and_applies_filters():
+    shards = [
+        json.loads(build_shard([("d1#1", "Python developer with Django experience"),
+                                ("d1#2", "Led a team of nurses")], {"doc_type": "pdf"})),
+        json.loads(build_shard([("d2#1", "Python, Python and more Python")], {"doc_type": "docx"})),
+    ]
+    index = LexicalIndex(shards)
+    assert [doc["id"] for doc in index.search("python django", k=5)] == ["d1#1", "d2#1"]
+    assert [doc["id"] for doc in index.search("python", k=5, filter={"doc_type": "pdf"})] == ["d1#1"]
+    assert index.search("the and of", k=5) == []
+
+
+class Firebase:
+    async def get_corpus_version_async(self, user_id):
+        return 1
+
+
+class Lexical:
+    async def search_async(self, user_id, query, k, filter, corpus_version):
+        return [hit(f"{user_id}-lexical")]
+
+
+class VectorDB:
+    def __init__(self, failing_users):
+        self.failing_users = failing_users
+        self.calls = []
+
+    async def retrieve_async(self, query, user_id, k, filter, include_values):
+        self.calls.append(user_id)
+        if user_id in self.failing_users:
+            raise RuntimeError("vector store unavailable")
+        return [hit(f"{user_id}-vector", values=[1.0])]
+
+
+def test_vector_cooldown_only_applies_to_the_failing_user():
+    vector_db = VectorDB(failing_users={"alice"})
+    retriever = HybridRetriever(vector_db, Lexical(), Firebase(), rrf_k=60, vector_timeout=1.0, degraded_cooldown=60)
+
+    async def run():
+        await retriever.retrieve_async("query", "alice", k=5)
+        alice, _ = await retriever.retrieve_async("query", "alice", k=5)
+        bob, _ = await retriever.retrieve_async("query", "bob", k=5)
+        return alice, bob
+
+    alice, bob = asyncio.run(run())
+    assert [doc["id"] for doc in alice] == ["alice-lexical"]
+    assert {doc["id"] for doc in bob} == {"bob-vector", "bob-lexical"}
+    assert vector_db.calls == ["alice", "bob"]
@@ -0,0 +1,40 @@
+import time
+
+import config
+from services import text_extraction
+from services.text_extraction import PdfPagePool, iter_pdf_pages
+
+pypdf = __import__("pytest").importorskip("pypdf")
+
+from benchmarks.run import synthetic_pdf  # noqa: E402
+
+
+def slow_extract_page(args):
+    path, index = args
+    if path == "stuck.pdf" and index == 1:
+        time.sleep(5)
+    return f"page {index}"
+
+
+def test_pool_is_not_used_unless_enabled(monkeypatch, tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(synthetic_pdf(3))
+    monkeypatch.setattr(config, "EXTRACTION_PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(text_extraction.pdf_page_pool, "extract_pages", lambda *args: iter(["from the pool"]))
+    assert "from the pool" not in list(iter_pdf_pages(path.read_bytes(), path=str(path)))
+
+
+def test_timeout_retires_only_the_stuck_pool(monkeypatch):
+    monkeypatch.setattr(text_extraction, "_extract_page", slow_extract_page)
+    pool = PdfPagePool(workers=2, page_timeout=1)
+    try:
+        running = pool.extract_pages("other.pdf", 2)
+        assert next(running) == "page 0"
+        first_pool = pool._pool
+
+        assert list(pool.extract_pages("stuck.pdf", 3)) == ["page 0", "page 2"]
+        # The extraction already running on the retired pool finishes on it.
+        assert list(running) == ["page 1"]
+        assert first_pool not in pool._users and pool._pool is not first_pool
+    finally:
+        pool.terminate()
@@ -0,0 +1,38 @@
+from services.text_processing import chunk_stream, chunk_text, content_hash, estimate_tokens
+
+
+def paragraphs(count, words=30):
+    return "\n\n".join(" ".join(f"p{i}w{j}" for j in range(words)) for i in range(count))
+
+
+def test_chunks_stay_within_budget_and_keep_every_paragraph():
+    text = paragraphs(20)
+    chunks = chunk_text(text, max_tokens=200)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 200 for chunk in chunks)
+    assert "\n\n".join(chunks).split("\n\n") == text.split("\n\n")
+
+
+def test_consecutive_chunks_share_trailing_paragraphs_as_overlap():
+    chunks = chunk_text(paragraphs(20), max_tokens=200, overlap_tokens=80)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split("\n\n")[0] == previous.split("\n\n")[-1]
+        assert estimate_tokens(current) <= 200
+
+
+def test_oversized_paragraph_is_split_by_sentences_then_words():
+    sentences = " ".join(f"Sentence number {i} is here." for i in range(50))
+    assert all(estimate_tokens(chunk) <= 40 for chunk in chunk_text(sentences, max_tokens=40))
+    one_long_line = " ".join(["word"] * 500)
+    chunks = chunk_text(one_long_line, max_tokens=25)
+    assert all(estimate_tokens(chunk) <= 25 for chunk in chunks)
+    assert " ".join(chunks).split() == one_long_line.split()
+
+
+def test_streamed_pieces_chunk_like_the_joined_text():
+    pages = [paragraphs(3), paragraphs(4), "", paragraphs(2)]
+    streamed = list(chunk_stream(pages, max_tokens=150, overlap_tokens=40))
+    assert streamed == chunk_text("\n\n".join(pages), max_tokens=150, overlap_tokens=40)
+    # Same input, same chunks, so content hashes (and vector IDs) are stable across uploads.
+    again = list(chunk_stream(pages, max_tokens=150, overlap_tokens=40))
+    assert [content_hash(chunk) for chunk in again] == [content_hash(chunk) for chunk in streamed]
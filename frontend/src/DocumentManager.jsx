@@ -5,6 +5,7 @@ import { apiService } from './services/api';
 
 function DocumentManager({ user }) {
   const [documents, setDocuments] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
 
@@ -14,13 +15,15 @@ function DocumentManager({ user }) {
     }
   }, [user]);
 
-  const fetchDocuments = async () => {
+  // Loads the first page, or with a cursor, the page after it.
+  const fetchDocuments = async (cursor = null) => {
     setLoading(true);
     setError(null);
     try {
       const token = await user.getIdToken();
-      const userDocuments = await apiService.getDocuments(token);
-      setDocuments(userDocuments);
+      const page = await apiService.getDocuments(token, cursor);
+      setDocuments(prev => (cursor ? [...prev, ...page.documents] : page.documents));
+      setNextCursor(page.nextCursor);
     } catch (err) {
       setError('Failed to fetch documents.');
       console.error(err);
@@ -66,6 +69,11 @@ function DocumentManager({ user }) {
       ) : (
         !loading && <div>You have no uploaded documents.</div>
       )}
+      {nextCursor && (
+        <button onClick={() => fetchDocuments(nextCursor)} disabled={loading}>
+          Load more
+        </button>
+      )}
     </div>
   );
 }
@@ -40,7 +40,8 @@ function GenerationForm({ user }) {
             setLoading(false);
         },
         (finalData) => {
-            setFinalContent(finalData);
+            // Keep the job description it was generated for, in case the form is edited.
+            setFinalContent({ ...finalData, job_description: jobDescription });
             setLoading(false);
         }
       );
@@ -57,8 +58,12 @@ function GenerationForm({ user }) {
       const token = await user.getIdToken();
       await apiService.submitFeedback(
         feedback,
-        jobDescription,
-        JSON.stringify(finalContent), // Or a more specific part of the content
+        finalContent.content_hashes,
+        {
+          job_description: finalContent.job_description,
+          cover_letter: finalContent.cover_letter_text,
+          resume: finalContent.resume_text,
+        },
         token
       );
       alert('Thank you for your feedback!');
@@ -73,12 +73,12 @@ export const apiService = {
   /**
    * Submits feedback for a generated document.
    * @param {string} feedback - The user's feedback ("good" or "bad").
-   * @param {string} jobDescription - The job description used for generation.
-   * @param {string} generatedContent - The generated content.
+   * @param {object} contentHashes - The `content_hashes` of the generation's final result.
+   * @param {object} texts - The generation's job_description, cover_letter and resume texts.
    * @param {string} token - The user's Firebase ID token.
    * @returns {Promise<any>} - The response from the server.
    */
-  async submitFeedback(feedback, jobDescription, generatedContent, token) {
+  async submitFeedback(feedback, contentHashes, texts, token) {
     const response = await fetch(`${API_BASE_URL}/feedback`, {
       method: 'POST',
       headers: {
@@ -87,8 +87,8 @@ export const apiService = {
       },
       body: JSON.stringify({
         feedback,
-        job_description: jobDescription,
-        generated_content: generatedContent,
+        content_hashes: contentHashes,
+        texts,
       }),
     });
 
@@ -101,12 +101,16 @@ export const apiService = {
   },
 
   /**
-   * Gets the user's documents.
+   * Gets one page of the user's documents, newest first.
    * @param {string} token - The user's Firebase ID token.
-   * @returns {Promise<any>} - The user's documents.
+   * @param {string|null} cursor - The `nextCursor` of the previous page, or null for the first page.
+   * @returns {Promise<{documents: any[], nextCursor: string|null}>} - The page, and the cursor of the next one if there is one.
    */
-  async getDocuments(token) {
-    const response = await fetch(`${API_BASE_URL}/documents`, {
+  async getDocuments(token, cursor = null) {
+    const url = cursor
+      ? `${API_BASE_URL}/documents?cursor=${encodeURIComponent(cursor)}`
+      : `${API_BASE_URL}/documents`;
+    const response = await fetch(url, {
       headers: {
         'Authorization': `Bearer ${token}`,
       },
@@ -116,7 +120,10 @@ export const apiService = {
       throw new Error('Failed to fetch documents.');
     }
 
-    return response.json();
+    return {
+      documents: await response.json(),
+      nextCursor: response.headers.get('X-Next-Cursor'),
+    };
   },
 
   /**